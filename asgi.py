@@ -0,0 +1,6 @@
+import os
+from aura import create_app
+from aura.asgi import create_asgi_app
+
+# Optional ASGI entry point: uvicorn asgi:app (requirements-asgi.txt)
+app = create_asgi_app(create_app(os.environ.get("FLASK_ENV", "production")))
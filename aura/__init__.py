@@ -1,6 +1,8 @@
 import logging
 from flask import Flask
+from jinja2 import FileSystemBytecodeCache
 from .extensions import db
+from .routing import init_routing
 from config import config_map
 from .cli import register_cli
 import os
@@ -24,25 +26,65 @@ def create_app(config_name='default'):
     if os.environ.get('HTTPS', '').lower() == 'true':
         app.config['SESSION_COOKIE_SECURE'] = True
 
+    if app.config.get('PROXY_FIX_HOPS'):
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        hops = app.config['PROXY_FIX_HOPS']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
+
+    init_routing(app)
     db.init_app(app)
+    from .utils.sql import configure_sqlite
+    with app.app_context():
+        for engine in db.engines.values():
+            configure_sqlite(engine, app.config.get('SQLITE_PRAGMAS'))
 
     from .blueprints.auth import auth_bp
     from .blueprints.contracts import contracts_bp
+    from .blueprints.clients import clients_bp
     from .blueprints.milestones import milestones_bp
     from .blueprints.dashboard import dashboard_bp
     from .blueprints.pdf_bp import pdf_bp
+    from .blueprints.api import api_bp
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(contracts_bp)
+    app.register_blueprint(clients_bp)
     app.register_blueprint(milestones_bp)
     app.register_blueprint(dashboard_bp)
     app.register_blueprint(pdf_bp)
+    app.register_blueprint(api_bp)
 
     register_cli(app)
 
+    from .assets import init_assets
+    from .compression import init_compression
+    from .diagnostics import init_diagnostics
+    from .events import init_events
+    from .pdf_pool import init_pdf_pool
+    from .ratelimit import init_login_limiter
+    from .utils.passwords import init_password_hasher
+    from .utils.clock import init_clock
+    init_assets(app)
+    init_compression(app)
+    init_events(app)
+    init_pdf_pool(app)
+    init_login_limiter(app)
+    init_password_hasher(app)
+    init_clock(app)
+    init_diagnostics(app)
+
+    # Persist compiled templates in the instance folder so new workers load
+    # bytecode instead of re-parsing every template.
+    if app.config.get('JINJA_BYTECODE_CACHE'):
+        cache_dir = os.path.join(app.instance_path, 'jinja_cache')
+        os.makedirs(cache_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+
     # Register template globals
     from .utils.money import format_amount
+    from .utils.fragments import init_fragment_cache
     app.jinja_env.globals['format_amount'] = format_amount
+    init_fragment_cache(app)
 
     # Only initialise the database schema and bootstrap an admin user when
     # explicitly requested via INIT_DB=true.  This prevents crash-loops on
@@ -53,13 +95,15 @@ def create_app(config_name='default'):
     #
     # Usage:
     #   • First deploy / schema migration: set INIT_DB=true in Render
+    #     (or run `flask aura migrate` from a one-off shell)
     #     environment, deploy once, then remove / set back to false.
     #   • Normal deploys: leave INIT_DB unset or INIT_DB=false — the app
     #     starts cleanly even if Postgres is temporarily unavailable.
     if os.environ.get('INIT_DB', '').lower() == 'true':
         with app.app_context():
             try:
-                db.create_all()
+                from .migrations import run_migrations
+                run_migrations(db.engine)
 
                 # Auto-create admin user in fresh deployments
                 from .models import User
@@ -74,12 +118,10 @@ def create_app(config_name='default'):
                     ).scalar_one_or_none()
 
                     if not existing:
-                        import secrets
-                        from .blueprints.auth import _hash_password, _PBKDF2_ITERATIONS
-                        salt = secrets.token_hex(16)
-                        hashed = _hash_password(admin_password, salt, _PBKDF2_ITERATIONS)
+                        from .utils.passwords import new_password_hash
+                        hashed, salt, iterations = new_password_hash(admin_password)
                         admin = User(username=admin_username, password_hash=hashed, salt=salt,
-                                     password_iterations=_PBKDF2_ITERATIONS)
+                                     password_iterations=iterations)
                         db.session.add(admin)
                         db.session.commit()
                         _log.info("Admin user '%s' created.", admin_username)
@@ -0,0 +1,328 @@
+"""Optional ASGI serving mode (``uvicorn asgi:app``).
+
+The read-heavy GET views run as async handlers on an async database driver
+(aiosqlite or asyncpg).  These are the dashboard, the contract and client
+lists, the change feed, the health check and the statement PDFs.  While one
+of them waits on the database, the worker keeps serving other requests
+instead of holding a thread.  Statement PDFs are rendered by the warm pool of
+:mod:`aura.pdf_pool` (or inline on an executor thread), so ReportLab never
+blocks the event loop.
+
+Every other route runs in the unchanged Flask app on a thread pool
+(``ASGI_WSGI_THREADS``) through a2wsgi.  That covers forms, POSTs, the SSE
+stream and milestone reminders.
+
+The async handlers still run inside a Flask request context.  The session
+cookie, the ``before_request``/``after_request`` hooks (replica routing,
+diagnostics, compression), error handlers and templates behave exactly as
+they do under Gunicorn.  Only the SQL goes through the async engine.
+
+Needs the packages in ``requirements-asgi.txt``.
+"""
+import asyncio
+import io
+from contextlib import asynccontextmanager
+from functools import wraps
+from uuid import uuid4
+from a2wsgi import WSGIMiddleware
+from a2wsgi.wsgi import build_environ
+from flask import (
+    abort, current_app, g, jsonify, redirect, render_template, request, session, url_for,
+)
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+from .blueprints.api import changes_payload, changes_select, feed_lag_seconds, parse_changes_args
+from .blueprints.contracts import active_contracts_select
+from .blueprints.dashboard import render_dashboard, resolve_base, summarise_rows
+from .blueprints.pdf_bp import (
+    filename_slug, outstanding_milestones_select, pdf_response, statement_rows,
+)
+from .diagnostics import diagnostics
+from .extensions import db
+from .fx import rate_select
+from .models import ALLOWED_CURRENCIES, Client, Contract
+from .pdf_pool import PdfPoolUnavailable, pdf_pool
+from .pdf_render import render_statement
+from .reporting import (
+    client_rollups_select, contract_breakdown_select, fold_status_counts, snapshot_trend_select,
+    status_counts_select,
+)
+from .routing import replica_engine
+from .utils.clock import as_of
+from .utils.sql import configure_sqlite
+
+_EXTENSION_KEY = 'aura_async'
+
+_ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg'}
+
+
+def async_database_url(url):
+    """Return (url, connect_args) for the async driver matching a sync database URL."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in _ASYNC_DRIVERS:
+        raise ValueError(f'No async driver for {backend!r} databases.')
+    url = url.set(drivername=_ASYNC_DRIVERS[backend])
+    connect_args = {}
+    if backend == 'postgresql':
+        query = dict(url.query)
+        if 'sslmode' in query:
+            # asyncpg spells libpq's sslmode as ssl.
+            query['ssl'] = query.pop('sslmode')
+        url = url.set(query=query)
+        if (url.host or '').endswith('pooler.supabase.com'):
+            # The transaction-mode pooler hands each transaction a different
+            # backend, so prepared statements must be neither cached nor reused.
+            connect_args = {
+                'statement_cache_size': 0,
+                'prepared_statement_cache_size': 0,
+                'prepared_statement_name_func': lambda: f'__asyncpg_{uuid4()}__',
+            }
+    return url, connect_args
+
+
+def _async_engine(app, sync_engine):
+    url, connect_args = async_database_url(sync_engine.url)
+    engine = create_async_engine(url, connect_args=connect_args,
+                                 **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    configure_sqlite(engine.sync_engine, app.config.get('SQLITE_PRAGMAS'))
+    diagnostics(app).attach(engine.sync_engine)
+    return engine
+
+
+class AsyncBackend:
+    """Async engines mirroring the app's primary (and replica)."""
+
+    def __init__(self, app):
+        self.app = app
+        with app.app_context():
+            self.engine = _async_engine(app, db.engine)
+            replica = replica_engine(app)
+            self.replica = _async_engine(app, replica) if replica is not None else None
+
+    def session(self):
+        """An AsyncSession on the replica when the request opted in (see aura.routing)."""
+        engine = self.replica if self.replica is not None and g.get('_aura_use_replica') else self.engine
+        return AsyncSession(engine, expire_on_commit=False)
+
+    async def render_pdf(self, fn, *args):
+        """Render off the event loop: an executor thread waits on the warm pool."""
+        render = pdf_pool(self.app).render
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, render, fn, *args)
+        except PdfPoolUnavailable:
+            abort(503, 'The PDF could not be rendered right now; please try again.')
+
+    async def close(self):
+        pdf_pool(self.app).close()
+        for engine in filter(None, (self.engine, self.replica)):
+            await engine.dispose()
+
+
+def async_backend(app=None):
+    return (app or current_app).extensions[_EXTENSION_KEY]
+
+
+# -- Flask bridge --------------------------------------------------------------
+
+def _asgi_response(response):
+    out = Response(response.get_data(), status_code=response.status_code)
+    # Werkzeug's header list, as is: keeps repeated headers such as Set-Cookie.
+    out.raw_headers = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                       for name, value in response.headers.items()]
+    return out
+
+
+def flask_view(view):
+    """Serve the async ``view(**path_params)`` inside a Flask request context.
+
+    The same steps as ``Flask.full_dispatch_request``: ``before_request``
+    hooks, the view, error handlers, then ``after_request`` hooks and the
+    session cookie; teardown runs when the context is popped.
+    """
+    @wraps(view)
+    async def endpoint(asgi_request):
+        app = asgi_request.app.state.flask_app
+        with app.request_context(build_environ(asgi_request.scope, io.BytesIO())):
+            try:
+                try:
+                    if request.routing_exception is not None:
+                        app.raise_routing_exception(request)
+                    rv = app.preprocess_request()
+                    if rv is None:
+                        rv = await view(**asgi_request.path_params)
+                except Exception as exc:
+                    rv = app.handle_user_exception(exc)
+                response = app.finalize_request(rv)
+            except Exception as exc:
+                response = app.handle_exception(exc)
+            return _asgi_response(response)
+    return endpoint
+
+
+def login_required(view):
+    """Async counterpart of auth.login_required."""
+    @wraps(view)
+    async def decorated(**kwargs):
+        if 'user_id' not in session:
+            return redirect(url_for('auth.login'))
+        return await view(**kwargs)
+    return decorated
+
+
+def api_login_required(view):
+    """Async counterpart of api.api_login_required."""
+    @wraps(view)
+    async def decorated(**kwargs):
+        if 'user_id' not in session:
+            return jsonify(error='authentication required'), 401
+        return await view(**kwargs)
+    return decorated
+
+
+# -- async views -----------------------------------------------------------------
+
+async def _rates_to(s, base, on):
+    """Async :func:`aura.fx.rates_to`."""
+    rates = {}
+    for cur in ALLOWED_CURRENCIES:
+        rates[cur] = 1.0 if cur == base else await s.scalar(rate_select(cur, base, on))
+    return rates
+
+
+@flask_view
+async def health():
+    try:
+        async with async_backend().engine.connect() as conn:
+            await conn.execute(select(1))
+    except SQLAlchemyError:
+        return jsonify(status='unavailable', database=False), 503
+    return jsonify(status='ok', database=True)
+
+
+@flask_view
+@api_login_required
+async def changes():
+    try:
+        since, limit = parse_changes_args(request.args)
+    except ValueError:
+        return jsonify(error='since and limit must be integers'), 400
+    async with async_backend().session() as s:
+        rows = (await s.scalars(
+            changes_select(session['user_id'], since, limit, feed_lag_seconds()))).all()
+    return jsonify(changes_payload(rows, since, limit))
+
+
+@flask_view
+@login_required
+async def dashboard():
+    user_id = session['user_id']
+    today = as_of()
+    base = resolve_base(request.args.get('base'))
+    async with async_backend().session() as s:
+        rates = await _rates_to(s, base, today)
+        rows = (await s.execute(contract_breakdown_select(user_id, today, rates))).all()
+        trend = (await s.execute(snapshot_trend_select(user_id, today))).all()
+    return render_dashboard(base, summarise_rows(rows, base), trend)
+
+
+@flask_view
+@login_required
+async def list_contracts():
+    async with async_backend().session() as s:
+        contracts = (await s.scalars(active_contracts_select(session['user_id']))).all()
+        ids = [c.id for c in contracts]
+        counts = fold_status_counts(ids, await s.execute(status_counts_select(ids))) if ids else {}
+    return render_template('contracts/list.html', contracts=contracts, archived_view=False,
+                           status_counts=counts)
+
+
+@flask_view
+@login_required
+async def list_clients():
+    async with async_backend().session() as s:
+        rollups = (await s.execute(client_rollups_select(session['user_id'], as_of()))).all()
+    return render_template('clients/list.html', rollups=rollups)
+
+
+async def _statement(client_label, scope, filename, **filters):
+    today = as_of()
+    async with async_backend().session() as s:
+        milestones = (await s.scalars(
+            outstanding_milestones_select(session['user_id'], today, **filters))).all()
+    rows, totals = statement_rows(milestones, today)
+    pdf = await async_backend().render_pdf(render_statement, client_label, scope, rows, totals, today)
+    return pdf_response(pdf, filename)
+
+
+@flask_view
+@login_required
+async def contract_statement(contract_id):
+    async with async_backend().session() as s:
+        contract = await s.scalar(select(Contract).where(
+            Contract.id == contract_id, Contract.user_id == session['user_id']))
+    if contract is None:
+        abort(404)
+    return await _statement(contract.client_name, f'Contract: {contract.contract_name}',
+                            f'statement_contract_{contract.id}.pdf', contract_id=contract.id)
+
+
+@flask_view
+@login_required
+async def client_statement_by_id(client_id):
+    async with async_backend().session() as s:
+        client = await s.scalar(select(Client).where(
+            Client.id == client_id, Client.user_id == session['user_id']))
+    if client is None:
+        abort(404)
+    return await _statement(client.name, 'All contracts',
+                            f'statement_{filename_slug(client.name)}.pdf', client_id=client.id)
+
+
+@flask_view
+@login_required
+async def client_statement():
+    client_name = request.args.get('client', '').strip()
+    if not client_name:
+        abort(400, 'Missing client.')
+    async with async_backend().session() as s:
+        found = await s.scalar(select(Contract.id).where(
+            Contract.user_id == session['user_id'], Contract.client_name == client_name).limit(1))
+    if found is None:
+        abort(404)
+    return await _statement(client_name, 'All contracts',
+                            f'statement_{filename_slug(client_name)}.pdf', client_name=client_name)
+
+
+ASYNC_ROUTES = [
+    Route('/api/health', health),
+    Route('/api/changes', changes),
+    Route('/', dashboard),
+    Route('/dashboard', dashboard),
+    Route('/contracts', list_contracts),
+    Route('/clients', list_clients),
+    Route('/contracts/{contract_id:int}/statement', contract_statement),
+    Route('/clients/{client_id:int}/statement', client_statement_by_id),
+    Route('/statements', client_statement),
+]
+
+
+def create_asgi_app(flask_app):
+    """Wrap ``flask_app``: async handlers for ASYNC_ROUTES, Flask for everything else."""
+    flask_app.extensions[_EXTENSION_KEY] = AsyncBackend(flask_app)
+
+    @asynccontextmanager
+    async def lifespan(_):
+        pdf_pool(flask_app).start()
+        yield
+        await async_backend(flask_app).close()
+
+    wsgi = WSGIMiddleware(flask_app, workers=flask_app.config.get('ASGI_WSGI_THREADS', 10))
+    app = Starlette(routes=[*ASYNC_ROUTES, Mount('', app=wsgi)], lifespan=lifespan)
+    app.state.flask_app = flask_app
+    return app
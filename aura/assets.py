@@ -0,0 +1,139 @@
+"""Fingerprinted, pre-compressed static assets.
+
+``url_for('static', filename='css/style.css')`` renders as
+``/static/css/style.<hash>.css`` where ``<hash>`` is derived from the file
+contents.  Because the URL changes whenever the file does, fingerprinted
+responses are sent with a far-future ``immutable`` Cache-Control and
+browsers never revalidate them.  When ``flask aura compress-static`` has
+written ``.br`` / ``.gz`` variants, the best one the client accepts is
+served with the matching ``Content-Encoding``.  Variants are named after the
+fingerprint (``css/style.<hash>.css.gz``), so one compressed from an older
+version of the file is never served for the current one.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from flask import current_app, request, send_from_directory
+
+try:  # Optional: brotli variants are only produced when the package is installed.
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+_COMPRESSED_SUFFIXES = ('.br', '.gz')
+_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+_HASHED_RE = re.compile(r'^(?P<stem>.+)\.(?P<digest>[0-9a-f]{12})(?P<ext>\.[^./]+)$')
+_EXTENSION_KEY = 'aura_static_manifest'
+
+
+def _fingerprint(rel, path):
+    """Return ``rel`` with the file's content hash before the extension."""
+    with open(path, 'rb') as fh:
+        digest = hashlib.sha256(fh.read()).hexdigest()[:12]
+    stem, ext = os.path.splitext(rel)
+    return f'{stem}.{digest}{ext}'
+
+
+def _iter_assets(folder):
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if name.endswith(_COMPRESSED_SUFFIXES):
+                continue
+            path = os.path.join(root, name)
+            yield os.path.relpath(path, folder).replace(os.sep, '/'), path
+
+
+class StaticManifest:
+    """Content-hash mapping between logical and fingerprinted static paths."""
+
+    def __init__(self, folder):
+        self.hashed = {}
+        self.original = {}
+        for rel, path in _iter_assets(folder):
+            fingerprinted = _fingerprint(rel, path)
+            self.hashed[rel] = fingerprinted
+            self.original[fingerprinted] = rel
+
+
+def serve_static(filename):
+    """Replacement for Flask's static view with fingerprints and encodings."""
+    manifest = current_app.extensions[_EXTENSION_KEY]
+    original = manifest.original.get(filename)
+    immutable = original is not None
+    if original is None:
+        # A stale fingerprint (e.g. a cached page after a deploy) still gets
+        # the current file, just without the long-lived caching.
+        match = _HASHED_RE.match(filename)
+        original = match.group('stem') + match.group('ext') if match else filename
+
+    folder = current_app.static_folder
+    path, encoding = original, None
+    current = manifest.hashed.get(original)
+    for name, suffix in _ENCODINGS:
+        if (current and request.accept_encodings[name]
+                and os.path.isfile(os.path.join(folder, current + suffix))):
+            path, encoding = current + suffix, name
+            break
+
+    mimetype = mimetypes.guess_type(original)[0] or 'application/octet-stream'
+    response = send_from_directory(folder, path, mimetype=mimetype,
+                                   max_age=current_app.get_send_file_max_age(original))
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    if immutable:
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+def _remove_variants(path):
+    """Delete every compressed variant of ``path``, of any fingerprint."""
+    directory, basename = os.path.split(path)
+    stem, ext = os.path.splitext(basename)
+    for name in os.listdir(directory):
+        if not name.endswith(_COMPRESSED_SUFFIXES):
+            continue
+        base = os.path.splitext(name)[0]
+        match = _HASHED_RE.match(base)
+        if base == basename or (match and (match.group('stem'), match.group('ext')) == (stem, ext)):
+            os.remove(os.path.join(directory, name))
+
+
+def compress_static_files(folder):
+    """Write ``.gz`` (and ``.br`` when available) variants; return files written.
+
+    Variants compressed from earlier versions of a file are removed.
+    """
+    written = []
+    for rel, path in _iter_assets(folder):
+        with open(path, 'rb') as fh:
+            data = fh.read()
+        target = os.path.join(folder, _fingerprint(rel, path))
+        _remove_variants(path)
+        variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(data, quality=11)))
+        for suffix, payload in variants:
+            if len(payload) >= len(data):
+                continue
+            with open(target + suffix, 'wb') as fh:
+                fh.write(payload)
+            written.append(target + suffix)
+    return written
+
+
+def init_assets(app):
+    """Fingerprint static URLs and serve them with immutable caching."""
+    if not app.config.get('STATIC_FINGERPRINT') or not app.static_folder:
+        return
+    app.extensions[_EXTENSION_KEY] = StaticManifest(app.static_folder)
+    app.view_functions['static'] = serve_static
+
+    @app.url_defaults
+    def _fingerprint_static_urls(endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            manifest = app.extensions[_EXTENSION_KEY]
+            values['filename'] = manifest.hashed.get(values['filename'], values['filename'])
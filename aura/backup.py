@@ -0,0 +1,323 @@
+"""Online backup and restore (``flask aura backup`` / ``flask aura restore``).
+
+Two formats:
+
+* ``sqlite`` — a copy of the live SQLite file made with SQLite's online
+  backup API.  Pages are copied in batches of ``pages``, pausing ``sleep``
+  seconds between batches.  In WAL mode the copy runs inside one read
+  transaction, so it is a consistent snapshot and writers are never
+  blocked.  Without that snapshot SQLite restarts the copy every time
+  another connection writes, and under steady traffic it would never
+  finish.  In rollback-journal mode each batch holds the read lock only
+  briefly, and the copy gives up after ``MAX_RESTARTS`` restarts.  The copy
+  is checked with ``PRAGMA integrity_check`` and a ``.sha256`` file is
+  written next to it.
+* ``ndjson`` — gzip-compressed newline-delimited JSON for PostgreSQL (it
+  works on any backend).  A header line is followed by one line per table
+  and one per row.  A footer line carries the row counts and the SHA-256
+  of every line before it.  Rows are streamed, so memory use stays flat.
+
+A restore verifies the checksum before it writes anything.  An NDJSON
+restore replaces every table's rows inside one transaction, so a failure
+leaves the database as it was.
+"""
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from datetime import date, datetime
+import sqlalchemy as sa
+from .extensions import db
+from .migrations import run_migrations, schema_migrations
+
+FORMAT_NAME = 'aura-backup'
+FORMAT_VERSION = 1
+_BATCH = 1000
+MAX_RESTARTS = 20
+
+
+class BackupError(Exception):
+    """A backup file is missing, corrupt or of an unknown format."""
+
+
+def _tables():
+    """Tables in dependency order, the migration ledger first."""
+    return [schema_migrations, *db.metadata.sorted_tables]
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# -- SQLite online backup ------------------------------------------------------
+
+def backup_sqlite(engine, dest, pages=256, sleep=0.005, progress=None):
+    """Copy the live SQLite database behind ``engine`` to ``dest``; return stats.
+
+    ``progress(copied, total)`` is called after every batch.
+    """
+    state = {'steps': 0, 'restarts': 0, 'remaining': None, 'max_step': 0.0,
+             'last': time.perf_counter()}
+
+    def on_step(status, remaining, total):
+        now = time.perf_counter()
+        state['max_step'] = max(state['max_step'], now - state['last'])
+        if state['remaining'] is not None and remaining > state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] > MAX_RESTARTS:
+                raise BackupError('Backup kept restarting under concurrent writes; '
+                                  'enable WAL (SQLITE_PRAGMAS) or retry when quieter.')
+        state['steps'] += 1
+        state['remaining'] = remaining
+        state['total'] = total
+        if progress is not None:
+            progress(total - remaining, total)
+        if remaining and sleep:
+            # Let writers in between batches.
+            time.sleep(sleep)
+        state['last'] = time.perf_counter()
+
+    if os.path.exists(dest):
+        raise BackupError(f'{dest} already exists.')
+    started = time.perf_counter()
+    raw = engine.raw_connection()
+    source = raw.driver_connection
+    target = sqlite3.connect(dest)
+    snapshot = source.execute('PRAGMA journal_mode').fetchone()[0].lower() == 'wal'
+    try:
+        if snapshot:
+            source.execute('BEGIN')
+            source.execute('SELECT 1 FROM sqlite_master LIMIT 1').fetchall()
+        try:
+            source.backup(target, pages=pages, progress=on_step)
+        finally:
+            if snapshot:
+                source.execute('ROLLBACK')
+        check = target.execute('PRAGMA integrity_check').fetchone()[0]
+        page_size = target.execute('PRAGMA page_size').fetchone()[0]
+        page_count = target.execute('PRAGMA page_count').fetchone()[0]
+        if check != 'ok':
+            raise BackupError(f'Backup failed integrity_check: {check}')
+    except BaseException:
+        target.close()
+        os.remove(dest)
+        raise
+    finally:
+        target.close()
+        raw.close()
+    elapsed = time.perf_counter() - started
+    with open(dest + '.sha256', 'w') as f:
+        f.write(f'{_file_sha256(dest)}  {os.path.basename(dest)}\n')
+    size = page_size * page_count
+    return {'format': 'sqlite', 'path': dest, 'bytes': size, 'pages': page_count,
+            'steps': state['steps'], 'restarts': state['restarts'], 'snapshot': snapshot,
+            'seconds': elapsed,
+            'mb_per_second': size / 1e6 / elapsed if elapsed else 0.0,
+            'max_stall_ms': state['max_step'] * 1000.0}
+
+
+def verify_sqlite(path):
+    checksum_file = path + '.sha256'
+    if os.path.exists(checksum_file):
+        with open(checksum_file) as f:
+            expected = f.read().split()[0]
+        if _file_sha256(path) != expected:
+            raise BackupError(f'{path} does not match {checksum_file}.')
+    try:
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            check = conn.execute('PRAGMA integrity_check').fetchone()[0]
+        finally:
+            conn.close()
+    except sqlite3.DatabaseError as exc:
+        raise BackupError(f'{path} is not a SQLite database: {exc}')
+    if check != 'ok':
+        raise BackupError(f'{path} failed integrity_check: {check}')
+
+
+def restore_sqlite(engine, source):
+    """Replace the database behind ``engine`` with the SQLite file ``source``."""
+    verify_sqlite(source)
+    started = time.perf_counter()
+    src = sqlite3.connect(f'file:{source}?mode=ro', uri=True)
+    engine.dispose()  # no pooled connection keeps reading the old pages
+    raw = engine.raw_connection()
+    try:
+        # One step: the live file switches over atomically for other readers.
+        src.backup(raw.driver_connection, pages=-1)
+    finally:
+        raw.close()
+        src.close()
+    return {'format': 'sqlite', 'path': source, 'seconds': time.perf_counter() - started}
+
+
+# -- portable NDJSON -----------------------------------------------------------
+
+def _encode(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _decoder(column):
+    python_type = None
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        pass
+    if python_type is datetime:
+        return lambda v: datetime.fromisoformat(v) if v is not None else None
+    if python_type is date:
+        return lambda v: date.fromisoformat(v) if v is not None else None
+    return lambda v: v
+
+
+def backup_ndjson(engine, dest, progress=None):
+    """Stream every table into a gzip NDJSON file at ``dest``; return stats.
+
+    On PostgreSQL all tables are read in one REPEATABLE READ snapshot.  For a
+    live SQLite database prefer :func:`backup_sqlite`, which is consistent.
+    """
+    if os.path.exists(dest):
+        raise BackupError(f'{dest} already exists.')
+    started = time.perf_counter()
+    digest = hashlib.sha256()
+    counts = {}
+    max_batch = 0.0
+    with gzip.open(dest, 'wt', encoding='utf-8') as out:
+        def write(obj):
+            line = json.dumps(obj, separators=(',', ':')) + '\n'
+            digest.update(line.encode('utf-8'))
+            out.write(line)
+
+        write({'format': FORMAT_NAME, 'version': FORMAT_VERSION,
+               'dialect': engine.dialect.name, 'created_at': datetime.utcnow().isoformat()})
+        conn = engine.connect()
+        if engine.dialect.name == 'postgresql':
+            # One snapshot for every table, without blocking writers.
+            conn = conn.execution_options(isolation_level='REPEATABLE READ')
+        with conn:
+            existing = set(sa.inspect(conn).get_table_names())
+            for table in _tables():
+                if table.name not in existing:
+                    continue
+                columns = [c.name for c in table.columns]
+                write({'table': table.name, 'columns': columns})
+                result = conn.execution_options(stream_results=True, yield_per=_BATCH).execute(
+                    sa.select(*table.columns).order_by(*table.primary_key.columns))
+                counts[table.name] = 0
+                fetch_started = time.perf_counter()
+                for batch in result.partitions():
+                    max_batch = max(max_batch, time.perf_counter() - fetch_started)
+                    for row in batch:
+                        write([_encode(v) for v in row])
+                    counts[table.name] += len(batch)
+                    if progress is not None:
+                        progress(table.name, counts[table.name])
+                    fetch_started = time.perf_counter()
+        out.write(json.dumps({'end': True, 'rows': counts, 'sha256': digest.hexdigest()}) + '\n')
+    elapsed = time.perf_counter() - started
+    rows = sum(counts.values())
+    return {'format': 'ndjson', 'path': dest, 'bytes': os.path.getsize(dest), 'rows': rows,
+            'tables': counts, 'seconds': elapsed,
+            'rows_per_second': rows / elapsed if elapsed else 0.0,
+            'max_stall_ms': max_batch * 1000.0}
+
+
+def _read_ndjson(source):
+    """Yield (kind, payload) from ``source``, verifying the footer checksum last."""
+    digest = hashlib.sha256()
+    footer = None
+    try:
+        with gzip.open(source, 'rt', encoding='utf-8') as f:
+            for number, line in enumerate(f):
+                item = json.loads(line)
+                if isinstance(item, dict) and item.get('end'):
+                    footer = item
+                    break
+                digest.update(line.encode('utf-8'))
+                if number == 0:
+                    if not (isinstance(item, dict) and item.get('format') == FORMAT_NAME):
+                        raise BackupError(f'{source} is not an AURA backup.')
+                    if item.get('version') != FORMAT_VERSION:
+                        raise BackupError(f'Unsupported backup version {item.get("version")}.')
+                    continue
+                yield ('table', item) if isinstance(item, dict) else ('row', item)
+    except (OSError, EOFError, ValueError) as exc:
+        raise BackupError(f'{source} is unreadable: {exc}')
+    if footer is None:
+        raise BackupError(f'{source} is truncated (no footer).')
+    if footer.get('sha256') != digest.hexdigest():
+        raise BackupError(f'{source} failed its checksum.')
+
+
+def verify_ndjson(source):
+    """Check an NDJSON backup end to end without touching the database; return row counts."""
+    counts, current = {}, None
+    for kind, item in _read_ndjson(source):
+        if kind == 'table':
+            current = item['table']
+            counts[current] = 0
+        else:
+            counts[current] += 1
+    return counts
+
+
+def restore_ndjson(engine, source, progress=None):
+    """Replace every table's rows with the backup's, in one transaction."""
+    verify_ndjson(source)  # fail before deleting anything
+    started = time.perf_counter()
+    run_migrations(engine)
+    tables = {t.name: t for t in _tables()}
+    counts = {}
+    with engine.begin() as conn:
+        if engine.dialect.name == 'sqlite':
+            conn.exec_driver_sql('PRAGMA defer_foreign_keys=ON')
+        for table in reversed(_tables()):
+            conn.execute(table.delete())
+        table, columns, decoders, batch = None, None, None, []
+
+        def flush():
+            if batch:
+                conn.execute(table.insert(), batch)
+                counts[table.name] += len(batch)
+                if progress is not None:
+                    progress(table.name, counts[table.name])
+                batch.clear()
+
+        for kind, item in _read_ndjson(source):
+            if kind == 'table':
+                flush()
+                table = tables.get(item['table'])
+                if table is None:
+                    raise BackupError(f'Backup has unknown table {item["table"]!r}.')
+                columns = item['columns']
+                decoders = [_decoder(table.c[name]) for name in columns]
+                counts[table.name] = 0
+            else:
+                batch.append({name: decode(value)
+                              for name, decode, value in zip(columns, decoders, item)})
+                if len(batch) >= _BATCH:
+                    flush()
+        flush()
+        if engine.dialect.name == 'postgresql':
+            for t in tables.values():
+                pk = list(t.primary_key.columns)
+                if len(pk) == 1 and pk[0].autoincrement is not False and t is not schema_migrations:
+                    conn.execute(sa.text(
+                        f"SELECT setval(pg_get_serial_sequence('{t.name}', '{pk[0].name}'), "
+                        f"COALESCE((SELECT MAX({pk[0].name}) FROM {t.name}), 0) + 1, false)"))
+    rows = sum(counts.values())
+    elapsed = time.perf_counter() - started
+    return {'format': 'ndjson', 'path': source, 'rows': rows, 'tables': counts,
+            'seconds': elapsed, 'rows_per_second': rows / elapsed if elapsed else 0.0}
+
+
+def detect_format(path):
+    return 'ndjson' if path.endswith(('.ndjson.gz', '.jsonl.gz')) else 'sqlite'
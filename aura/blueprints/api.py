@@ -0,0 +1,120 @@
+import json
+from functools import wraps
+from flask import Blueprint, current_app, jsonify, request, session
+from sqlalchemy import func, select
+from sqlalchemy.exc import SQLAlchemyError
+from ..extensions import db
+from ..diagnostics import diagnostics
+from ..models import ChangeLog
+from ..pdf_pool import pdf_pool
+from ..ratelimit import login_limiter
+from ..utils.passwords import password_hasher
+from ..utils.sql import seconds_ago
+
+api_bp = Blueprint('api', __name__, url_prefix='/api')
+
+_DEFAULT_BATCH = 500
+_MAX_BATCH = 5000
+
+
+def api_login_required(f):
+    """Like auth.login_required, but answers 401 JSON instead of redirecting."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if 'user_id' not in session:
+            return jsonify(error='authentication required'), 401
+        return f(*args, **kwargs)
+    return decorated
+
+
+def parse_changes_args(args):
+    """Return (since, limit) from the query string; raises ValueError if not integers."""
+    since = int(args.get('since', 0))
+    limit = int(args.get('limit', _DEFAULT_BATCH))
+    return since, max(1, min(limit, _MAX_BATCH))
+
+
+def feed_lag_seconds():
+    """How long a change is held back from the feed (CHANGE_FEED_LAG_SECONDS).
+
+    On PostgreSQL an id is taken at insert but becomes visible at commit, so
+    id N+1 can commit while N is still in flight; a cursor that passed N+1
+    would never see N.  SQLite serialises writers, so ids commit in order.
+    """
+    lag = current_app.config.get('CHANGE_FEED_LAG_SECONDS')
+    if lag in (None, ''):
+        return 0.0 if db.engine.dialect.name == 'sqlite' else 5.0
+    return float(lag)
+
+
+def changes_select(user_id, since, limit, lag=0):
+    """SELECT of up to ``limit + 1`` changes after ``since``; the extra row flags ``has_more``.
+
+    With ``lag``, the batch stops before the first change younger than
+    ``lag`` seconds, so every row below the returned cursor has committed.
+    """
+    query = select(ChangeLog).where(ChangeLog.user_id == user_id, ChangeLog.id > since)
+    if lag:
+        horizon = (
+            select(func.min(ChangeLog.id))
+            .where(ChangeLog.user_id == user_id, ChangeLog.id > since,
+                   ChangeLog.created_at >= seconds_ago(lag))
+            .scalar_subquery()
+        )
+        query = query.where(ChangeLog.id < func.coalesce(horizon, ChangeLog.id + 1))
+    return query.order_by(ChangeLog.id).limit(limit + 1)
+
+
+def changes_payload(rows, since, limit):
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        'changes': [{
+            'cursor': row.id,
+            'entity': row.entity,
+            'id': row.entity_id,
+            'contract_id': row.contract_id,
+            'action': row.action,
+            'data': json.loads(row.payload) if row.payload else None,
+            'at': row.created_at.isoformat() if row.created_at else None,
+        } for row in rows],
+        'next_cursor': rows[-1].id if rows else since,
+        'has_more': has_more,
+    }
+
+
+@api_bp.route('/changes')
+@api_login_required
+def changes():
+    """Return the caller's changes after ``since`` in cursor order.
+
+    Clients store ``next_cursor`` and pass it back as ``since``; while
+    ``has_more`` is true another batch is immediately available.
+    """
+    try:
+        since, limit = parse_changes_args(request.args)
+    except ValueError:
+        return jsonify(error='since and limit must be integers'), 400
+    rows = db.session.execute(
+        changes_select(session['user_id'], since, limit, feed_lag_seconds())).scalars().all()
+    return jsonify(changes_payload(rows, since, limit))
+
+
+@api_bp.route('/health')
+def health():
+    """Liveness plus a database round trip; 503 when the database is unreachable."""
+    try:
+        db.session.execute(select(1))
+    except SQLAlchemyError:
+        return jsonify(status='unavailable', database=False), 503
+    return jsonify(status='ok', database=True)
+
+
+@api_bp.route('/metrics')
+@api_login_required
+def metrics():
+    """Process-local operational counters."""
+    return jsonify(login_throttle=login_limiter().snapshot(),
+                   password_hashing=password_hasher().snapshot(),
+                   diagnostics=diagnostics().snapshot(),
+                   pdf_pool=pdf_pool().snapshot())
@@ -1,32 +1,16 @@
-import hashlib
-import hmac
-import os
 import re
-import secrets
 from functools import wraps
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
 from ..extensions import db
 from ..models import User
+from ..ratelimit import login_limiter
+from ..utils.passwords import new_password_hash, password_hasher
 
 auth_bp = Blueprint('auth', __name__)
 
-_PBKDF2_ITERATIONS = 260000
 _USERNAME_RE = re.compile(r'^[A-Za-z0-9_.-]{3,80}$')
 
 
-def _hash_password(password, salt, iterations):
-    """Hash password using PBKDF2-HMAC-SHA256 (iterations>1) or plain SHA-256 (iterations==1)."""
-    if iterations > 1:
-        return hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), iterations).hex()
-    return hashlib.sha256((salt + password).encode()).hexdigest()
-
-
-def _verify_password(password, user):
-    """Constant-time password verification."""
-    expected = _hash_password(password, user.salt, user.password_iterations)
-    return hmac.compare_digest(expected, user.password_hash)
-
-
 def login_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -57,10 +41,9 @@ def register():
             for e in errors:
                 flash(e, 'danger')
             return render_template('auth/register.html', username=username)
-        salt = secrets.token_hex(16)
-        password_hash = _hash_password(password, salt, _PBKDF2_ITERATIONS)
+        password_hash, salt, iterations = new_password_hash(password)
         user = User(username=username, password_hash=password_hash, salt=salt,
-                    password_iterations=_PBKDF2_ITERATIONS)
+                    password_iterations=iterations)
         db.session.add(user)
         db.session.commit()
         flash('Registration successful. Please log in.', 'success')
@@ -73,8 +56,13 @@ def login():
     if request.method == 'POST':
         username = request.form.get('username', '').strip()
         password = request.form.get('password', '')
+        # Throttle before the lookup and the PBKDF2 work it would trigger.
+        if login_limiter().check(request.remote_addr, username):
+            flash('Too many login attempts. Please wait a minute and try again.', 'danger')
+            return render_template('auth/login.html'), 429
         user = User.query.filter_by(username=username).first()
-        if user and _verify_password(password, user):
+        if user and password_hasher().verify(password, user):
+            password_hasher().rehash_if_needed(user, password)
             session['user_id'] = user.id
             flash('Logged in successfully.', 'success')
             return redirect(url_for('dashboard.index'))
@@ -0,0 +1,31 @@
+from flask import Blueprint, render_template, session
+from sqlalchemy import select
+from ..extensions import db
+from ..models import Client, Contract
+from ..reporting import client_rollups_select
+from ..utils.clock import as_of
+from .auth import login_required
+
+clients_bp = Blueprint('clients', __name__)
+
+
+@clients_bp.route('/clients')
+@login_required
+def list_clients():
+    rollups = db.session.execute(client_rollups_select(session['user_id'], as_of())).all()
+    return render_template('clients/list.html', rollups=rollups)
+
+
+@clients_bp.route('/clients/<int:client_id>')
+@login_required
+def view_client(client_id):
+    user_id = session['user_id']
+    client = Client.query.filter_by(id=client_id, user_id=user_id).first_or_404()
+    rollups = db.session.execute(
+        client_rollups_select(user_id, as_of(), client_id=client.id)).all()
+    contracts = db.session.scalars(
+        select(Contract).where(Contract.client_id == client.id, Contract.user_id == user_id)
+        .order_by(Contract.created_at.desc())
+    ).all()
+    return render_template('clients/detail.html', client=client, rollups=rollups,
+                           contracts=contracts)
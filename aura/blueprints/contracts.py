@@ -1,7 +1,12 @@
-from datetime import date
+from datetime import date, datetime
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
+from sqlalchemy import select
 from ..extensions import db
-from ..models import Contract, ALLOWED_CURRENCIES
+from ..models import Client, Contract, Milestone, ALLOWED_CURRENCIES, MILESTONE_PAID
+from ..reporting import status_counts
+from ..changes import record_contract_change
+from ..clients import get_or_create_client
+from ..bulk import clone_contract as bulk_clone_contract, delete_contract as bulk_delete_contract
 from .auth import login_required
 
 contracts_bp = Blueprint('contracts', __name__)
@@ -45,12 +50,33 @@ def _validate_contract_form(form):
     return errors, client_name, contract_name, start_date, total_value, payment_term_days, currency
 
 
+def _client_names(user_id):
+    return db.session.scalars(
+        select(Client.name).where(Client.user_id == user_id).order_by(Client.name)
+    ).all()
+
+
+def active_contracts_select(user_id):
+    return (select(Contract).where(Contract.user_id == user_id, Contract.archived.is_(False))
+            .order_by(Contract.created_at.desc()))
+
+
 @contracts_bp.route('/contracts')
 @login_required
 def list_contracts():
+    contracts = db.session.scalars(active_contracts_select(session['user_id'])).all()
+    counts = status_counts([c.id for c in contracts])
+    return render_template('contracts/list.html', contracts=contracts, archived_view=False,
+                           status_counts=counts)
+
+@contracts_bp.route('/contracts/archive')
+@login_required
+def archived_contracts():
     user_id = session['user_id']
-    contracts = Contract.query.filter_by(user_id=user_id).order_by(Contract.created_at.desc()).all()
-    return render_template('contracts/list.html', contracts=contracts)
+    contracts = Contract.query.filter_by(user_id=user_id, archived=True).order_by(Contract.archived_at.desc()).all()
+    counts = status_counts([c.id for c in contracts])
+    return render_template('contracts/list.html', contracts=contracts, archived_view=True,
+                           status_counts=counts)
 
 @contracts_bp.route('/contracts/new', methods=['GET', 'POST'])
 @login_required
@@ -61,9 +87,11 @@ def new_contract():
             for e in errors:
                 flash(e, 'danger')
         else:
+            client = get_or_create_client(session['user_id'], client_name)
             contract = Contract(
                 user_id=session['user_id'],
-                client_name=client_name,
+                client=client,
+                client_name=client.name,
                 contract_name=contract_name,
                 start_date=start_date,
                 total_value=total_value,
@@ -71,10 +99,13 @@ def new_contract():
                 currency=currency,
             )
             db.session.add(contract)
+            db.session.flush()
+            record_contract_change(contract, 'create')
             db.session.commit()
             flash('Contract created.', 'success')
             return redirect(url_for('contracts.list_contracts'))
-    return render_template('contracts/form.html', contract=None, allowed_currencies=ALLOWED_CURRENCIES)
+    return render_template('contracts/form.html', contract=None, allowed_currencies=ALLOWED_CURRENCIES,
+                           client_names=_client_names(session['user_id']))
 
 @contracts_bp.route('/contracts/<int:contract_id>/edit', methods=['GET', 'POST'])
 @login_required
@@ -86,28 +117,79 @@ def edit_contract(contract_id):
             for e in errors:
                 flash(e, 'danger')
         else:
-            contract.client_name = client_name
+            client = get_or_create_client(session['user_id'], client_name)
+            contract.client = client
+            contract.client_name = client.name
             contract.contract_name = contract_name
             contract.start_date = start_date
             contract.total_value = total_value
             contract.payment_term_days = payment_term_days
             contract.currency = currency
+            record_contract_change(contract, 'update')
             db.session.commit()
             flash('Contract updated.', 'success')
             return redirect(url_for('contracts.view_contract', contract_id=contract.id))
-    return render_template('contracts/form.html', contract=contract, allowed_currencies=ALLOWED_CURRENCIES)
+    return render_template('contracts/form.html', contract=contract, allowed_currencies=ALLOWED_CURRENCIES,
+                           client_names=_client_names(session['user_id']))
 
 @contracts_bp.route('/contracts/<int:contract_id>/delete', methods=['POST'])
 @login_required
 def delete_contract(contract_id):
     contract = Contract.query.filter_by(id=contract_id, user_id=session['user_id']).first_or_404()
-    db.session.delete(contract)
-    db.session.commit()
+    # Set-based: never loads the contract's milestones or payments.
+    bulk_delete_contract(contract.id)
     flash('Contract deleted.', 'info')
     return redirect(url_for('contracts.list_contracts'))
 
+@contracts_bp.route('/contracts/<int:contract_id>/clone', methods=['GET', 'POST'])
+@login_required
+def clone_contract(contract_id):
+    contract = Contract.query.filter_by(id=contract_id, user_id=session['user_id']).first_or_404()
+    if request.method == 'POST':
+        contract_name = request.form.get('contract_name', '').strip()
+        try:
+            start_date = date.fromisoformat(request.form.get('start_date', ''))
+        except ValueError:
+            flash('Invalid start date.', 'danger')
+        else:
+            # Set-based: milestones are copied with one INSERT ... SELECT.
+            clone = bulk_clone_contract(contract, start_date, contract_name or None)
+            flash('Contract cloned.', 'success')
+            return redirect(url_for('contracts.view_contract', contract_id=clone.id))
+    return render_template('contracts/clone.html', contract=contract, today=date.today())
+
+@contracts_bp.route('/contracts/<int:contract_id>/archive', methods=['POST'])
+@login_required
+def archive_contract(contract_id):
+    contract = Contract.query.filter_by(id=contract_id, user_id=session['user_id']).first_or_404()
+    # Archived contracts leave the dashboard and client totals, so only a
+    # settled contract may go: archiving must never hide money still owed.
+    outstanding = db.session.scalar(select(Milestone.id).where(
+        Milestone.contract_id == contract.id, Milestone.status != MILESTONE_PAID).limit(1))
+    if outstanding is not None:
+        flash('Only contracts whose milestones are all paid can be archived.', 'danger')
+        return redirect(url_for('contracts.view_contract', contract_id=contract.id))
+    contract.archived = True
+    contract.archived_at = datetime.utcnow()
+    record_contract_change(contract, 'archive')
+    db.session.commit()
+    flash('Contract archived.', 'info')
+    return redirect(url_for('contracts.list_contracts'))
+
+@contracts_bp.route('/contracts/<int:contract_id>/unarchive', methods=['POST'])
+@login_required
+def unarchive_contract(contract_id):
+    contract = Contract.query.filter_by(id=contract_id, user_id=session['user_id']).first_or_404()
+    contract.archived = False
+    contract.archived_at = None
+    record_contract_change(contract, 'unarchive')
+    db.session.commit()
+    flash('Contract restored from the archive.', 'info')
+    return redirect(url_for('contracts.view_contract', contract_id=contract.id))
+
 @contracts_bp.route('/contracts/<int:contract_id>')
 @login_required
 def view_contract(contract_id):
     contract = Contract.query.filter_by(id=contract_id, user_id=session['user_id']).first_or_404()
+    # ``today`` bounds the delivery/payment forms; overdue flags use ``as_of``.
     return render_template('contracts/detail.html', contract=contract, today=date.today())
@@ -1,59 +1,215 @@
-from flask import Blueprint, render_template, session
+import json
+import queue
+import time
+from flask import Blueprint, Response, abort, current_app, jsonify, render_template, request, session
+from ..events import publisher
 from ..extensions import db
-from ..models import Contract, Milestone, Payment
+from ..fx import rates_to
+from ..models import ALLOWED_CURRENCIES
+from ..reporting import contract_breakdown_select, snapshot_trend
 from .auth import login_required
+from ..utils.clock import as_of
 from ..utils.money import format_amount
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
-@dashboard_bp.route('/')
-@dashboard_bp.route('/dashboard')
-@login_required
-def index():
-    user_id = session['user_id']
+_TREND_WIDTH = 600
+_TREND_HEIGHT = 120
+_TREND_SERIES = ('received', 'pending', 'overdue')
+_TOTAL_KEYS = ('received', 'pending', 'overdue')
 
-    contracts = Contract.query.filter_by(user_id=user_id).order_by(Contract.created_at.desc()).all()
 
-    # Compute totals grouped by currency
-    currency_totals = {}  # currency -> {received, pending, overdue}
+def _trend_charts(rows):
+    """Turn snapshot rows into per-currency SVG polyline point strings."""
+    by_currency = {}
+    for row in rows:
+        by_currency.setdefault(row.currency, []).append(row)
+    charts = []
+    for cur, points in sorted(by_currency.items()):
+        first, last = points[0].snapshot_date, points[-1].snapshot_date
+        span = max((last - first).days, 1)
+        peak = max(max(getattr(p, k) for k in _TREND_SERIES) for p in points) or 1.0
+        series = []
+        for key in _TREND_SERIES:
+            coords = ' '.join(
+                f'{(p.snapshot_date - first).days / span * _TREND_WIDTH:.1f},'
+                f'{_TREND_HEIGHT - getattr(p, key) / peak * _TREND_HEIGHT:.1f}'
+                for p in points
+            )
+            series.append({'name': key, 'points': coords})
+        charts.append({
+            'currency': cur,
+            'start': first,
+            'end': last,
+            'peak': format_amount(peak, cur),
+            'series': series,
+        })
+    return charts
+
+def _format_totals(totals, currency):
+    return {key: format_amount(totals[key], currency) for key in _TOTAL_KEYS}
+
 
+def resolve_base(value):
+    base = (value or '').upper()
+    return base if base in ALLOWED_CURRENCIES else current_app.config['BASE_CURRENCY']
+
+
+def _summarise(user_id, as_of, base):
+    """Return (contract_breakdown, currency_summary, consolidated_summary)."""
+    rates = rates_to(base, as_of)
+
+    # One grouped query yields every active contract with its sums, both in
+    # the contract currency and converted to the base currency.
+    rows = db.session.execute(contract_breakdown_select(user_id, as_of, rates)).all()
+    return summarise_rows(rows, base)
+
+
+def summarise_rows(rows, base):
+    """Return (contract_breakdown, currency_summary, consolidated_summary) for breakdown rows."""
+    currency_totals = {}  # currency -> {received, pending, overdue}
+    consolidated = dict.fromkeys(_TOTAL_KEYS, 0.0)
+    missing_rates = set()
     contract_breakdown = []
-    for c in contracts:
+    for row in rows:
+        c = row.Contract
         cur = c.currency or 'INR'
-        if cur not in currency_totals:
-            currency_totals[cur] = {'received': 0.0, 'pending': 0.0, 'overdue': 0.0}
-        c_received = 0.0
-        c_pending = 0.0
-        c_overdue = 0.0
-        for m in c.milestones:
-            if m.payment:
-                c_received += m.payment.amount_received
-                currency_totals[cur]['received'] += m.payment.amount_received
-            elif m.invoice_eligible:
-                c_pending += m.payment_amount
-                currency_totals[cur]['pending'] += m.payment_amount
-                if m.is_overdue:
-                    c_overdue += m.payment_amount
-                    currency_totals[cur]['overdue'] += m.payment_amount
+        totals = currency_totals.setdefault(cur, dict.fromkeys(_TOTAL_KEYS, 0.0))
+        for key in _TOTAL_KEYS:
+            totals[key] += getattr(row, key)
+            converted = getattr(row, f'{key}_base')
+            if converted is None:
+                if getattr(row, key):
+                    missing_rates.add(cur)
+            else:
+                consolidated[key] += converted
         contract_breakdown.append({
             'contract': c,
-            'received': c_received,
-            'pending': c_pending,
-            'overdue': c_overdue,
+            'received': row.received,
+            'pending': row.pending,
+            'overdue': row.overdue,
             'currency': cur,
         })
 
     # Build formatted currency summary list
     currency_summary = []
     for cur, totals in sorted(currency_totals.items()):
-        currency_summary.append({
-            'currency': cur,
-            'received': format_amount(totals['received'], cur),
-            'pending': format_amount(totals['pending'], cur),
-            'overdue': format_amount(totals['overdue'], cur),
+        currency_summary.append({'currency': cur, **_format_totals(totals, cur)})
+
+    consolidated_summary = None
+    if contract_breakdown:
+        consolidated_summary = {
+            'base': base,
+            'missing_rates': sorted(missing_rates),
+            **_format_totals(consolidated, base),
+        }
+    return contract_breakdown, currency_summary, consolidated_summary
+
+
+def _contract_payload(contract_id, row):
+    return {
+        'id': contract_id,
+        'overdue_flag': row['overdue'] > 0,
+        **{key: format_amount(row[key], row['currency']) for key in _TOTAL_KEYS},
+    }
+
+
+def notify_dashboard(user_id, contract_id):
+    """Push fresh totals and the changed contract row to the user's open streams.
+
+    Called after a delivery or payment is committed; does nothing (and runs
+    no query) when the user has no dashboard stream open in this process.
+    """
+    events = publisher()
+    bases = events.topics(user_id)
+    if not bases:
+        return
+    today = as_of()
+    messages = {}
+    for base in bases:
+        breakdown, currency_summary, consolidated_summary = _summarise(user_id, today, base)
+        row = next((item for item in breakdown if item['contract'].id == contract_id), None)
+        messages[base] = json.dumps({
+            'totals': currency_summary,
+            'consolidated': consolidated_summary,
+            'contract': _contract_payload(contract_id, row) if row else None,
         })
+    events.publish(user_id, messages)
+
+
+@dashboard_bp.route('/')
+@dashboard_bp.route('/dashboard')
+@login_required
+def index():
+    user_id = session['user_id']
+    today = as_of()
+    base = resolve_base(request.args.get('base'))
+    return render_dashboard(base, _summarise(user_id, today, base),
+                            snapshot_trend(user_id, today))
 
+
+def render_dashboard(base, summary, trend_rows):
+    """Render the dashboard page from a summary tuple and snapshot trend rows."""
+    contract_breakdown, currency_summary, consolidated_summary = summary
+    trend_charts = _trend_charts(trend_rows)
     return render_template('dashboard/index.html',
         currency_summary=currency_summary,
+        consolidated_summary=consolidated_summary,
+        allowed_currencies=ALLOWED_CURRENCIES,
         contract_breakdown=contract_breakdown,
+        base_currency=base,
+        trend_charts=trend_charts,
+        trend_width=_TREND_WIDTH,
+        trend_height=_TREND_HEIGHT,
     )
+
+
+@dashboard_bp.route('/dashboard/stream')
+@login_required
+def stream():
+    """Server-Sent Events stream of dashboard updates for the current user."""
+    if request.method == 'HEAD':
+        # A HEAD never reads the body, so it must not take a stream slot.
+        abort(405, valid_methods=['GET'])
+    user_id = session['user_id']
+    base = resolve_base(request.args.get('base'))
+    heartbeat = current_app.config['SSE_HEARTBEAT_SECONDS']
+    max_seconds = current_app.config['SSE_MAX_SECONDS']
+    events = publisher()
+    q = events.subscribe(user_id, base, current_app.config['SSE_MAX_STREAMS'],
+                         current_app.config['SSE_MAX_STREAMS_PER_USER'])
+    if q is None:
+        # Every stream holds a worker thread; past the cap the page polls
+        # /dashboard/totals instead (see static/js/main.js).
+        return Response('Too many live dashboard streams.\n', status=503, mimetype='text/plain',
+                        headers={'Retry-After': str(current_app.config['SSE_POLL_SECONDS'])})
+    # Nothing below needs the database; make sure no connection stays checked out.
+    db.session.remove()
+
+    def generate():
+        deadline = time.monotonic() + max_seconds
+        yield 'retry: 5000\n\n'
+        while time.monotonic() < deadline:
+            try:
+                message = q.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            yield f'event: update\ndata: {message}\n\n'
+
+    response = Response(generate(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # The server closes every response, also one whose body was never read
+    # (a client gone before the first chunk); that frees the slot.
+    response.call_on_close(lambda: events.unsubscribe(user_id, q))
+    return response
+
+
+@dashboard_bp.route('/dashboard/totals')
+@login_required
+def totals():
+    """The totals a stream would push, for pages polling instead of streaming."""
+    base = resolve_base(request.args.get('base'))
+    breakdown, currency_summary, consolidated_summary = _summarise(session['user_id'], as_of(), base)
+    return jsonify(totals=currency_summary, consolidated=consolidated_summary,
+                   contracts=[_contract_payload(item['contract'].id, item) for item in breakdown])
@@ -1,8 +1,12 @@
 from datetime import date
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
 from ..extensions import db
-from ..models import Contract, Milestone, Payment
+from ..models import Contract, Milestone, MilestoneSchedule, Payment
 from .auth import login_required
+from ..changes import record_milestone_change
+from .dashboard import notify_dashboard
+from ..schedules import (AMOUNT_MODES, FREQUENCIES, MAX_PERIODS, generate_milestones,
+                         plan_schedule, regenerate_milestones)
 
 milestones_bp = Blueprint('milestones', __name__)
 
@@ -63,6 +67,8 @@ def new_milestone(contract_id):
                 penalty_unit=penalty_unit,
             )
             db.session.add(milestone)
+            db.session.flush()
+            record_milestone_change(milestone, session['user_id'], 'create')
             db.session.commit()
             flash('Milestone added.', 'success')
             return redirect(url_for('contracts.view_contract', contract_id=contract.id))
@@ -88,6 +94,7 @@ def edit_milestone(milestone_id):
             milestone.penalty_enabled = penalty_enabled
             milestone.penalty_rate_percent = penalty_rate_percent
             milestone.penalty_unit = penalty_unit
+            record_milestone_change(milestone, session['user_id'], 'update')
             db.session.commit()
             flash('Milestone updated.', 'success')
             return redirect(url_for('contracts.view_contract', contract_id=contract.id))
@@ -100,6 +107,9 @@ def deliver_milestone(milestone_id):
         Milestone.id == milestone_id,
         Contract.user_id == session['user_id']
     ).first_or_404()
+    if milestone.actual_delivery_date:
+        flash('Delivery already recorded for this milestone.', 'warning')
+        return redirect(url_for('contracts.view_contract', contract_id=milestone.contract_id))
     actual_delivery_date_str = request.form.get('actual_delivery_date', '')
     try:
         actual_delivery_date = date.fromisoformat(actual_delivery_date_str)
@@ -114,7 +124,10 @@ def deliver_milestone(milestone_id):
         return redirect(url_for('contracts.view_contract', contract_id=milestone.contract_id))
     milestone.actual_delivery_date = actual_delivery_date
     milestone.invoice_eligible = True
+    milestone.refresh_status()
+    record_milestone_change(milestone, session['user_id'], 'deliver')
     db.session.commit()
+    notify_dashboard(session['user_id'], milestone.contract_id)
     flash('Delivery recorded. Milestone is now invoice eligible.', 'success')
     return redirect(url_for('contracts.view_contract', contract_id=milestone.contract_id))
 
@@ -140,13 +153,14 @@ def record_payment(milestone_id):
     if milestone.payment:
         flash('Payment already recorded for this milestone.', 'warning')
         return redirect(url_for('contracts.view_contract', contract_id=milestone.contract_id))
-    payment = Payment(
-        milestone_id=milestone.id,
+    milestone.payment = Payment(
         received_date=received_date,
         amount_received=amount_received,
     )
-    db.session.add(payment)
+    milestone.refresh_status()
+    record_milestone_change(milestone, session['user_id'], 'pay')
     db.session.commit()
+    notify_dashboard(session['user_id'], milestone.contract_id)
     flash('Payment recorded.', 'success')
     return redirect(url_for('contracts.view_contract', contract_id=milestone.contract_id))
 
@@ -158,7 +172,127 @@ def delete_milestone(milestone_id):
         Contract.user_id == session['user_id']
     ).first_or_404()
     contract_id = milestone.contract_id
+    record_milestone_change(milestone, session['user_id'], 'delete')
     db.session.delete(milestone)
     db.session.commit()
     flash('Milestone deleted.', 'info')
     return redirect(url_for('contracts.view_contract', contract_id=contract_id))
+
+
+def _validate_schedule_form(form):
+    """Validate and parse schedule form fields. Returns (errors, values)."""
+    errors = []
+    values = {
+        'name': form.get('name', '').strip(),
+        'frequency': form.get('frequency', 'monthly'),
+        'amount_mode': form.get('amount_mode', 'per_period'),
+        'penalty_enabled': bool(form.get('penalty_enabled')),
+        'penalty_unit': form.get('penalty_unit', 'day').strip(),
+        'count': None,
+        'end_date': None,
+    }
+    if not values['name']:
+        errors.append('Schedule name is required.')
+    if values['frequency'] not in FREQUENCIES:
+        errors.append('Frequency must be weekly, monthly or quarterly.')
+    if values['amount_mode'] not in AMOUNT_MODES:
+        errors.append('Amount mode must be "per_period" or "split".')
+    try:
+        values['start_date'] = date.fromisoformat(form.get('start_date', ''))
+    except ValueError:
+        errors.append('Invalid start date.')
+        values['start_date'] = None
+    count_str = form.get('count', '').strip()
+    end_date_str = form.get('end_date', '').strip()
+    if bool(count_str) == bool(end_date_str):
+        errors.append('Give either a number of milestones or an end date.')
+    elif count_str:
+        try:
+            values['count'] = int(count_str)
+            if not 1 <= values['count'] <= MAX_PERIODS:
+                errors.append(f'Number of milestones must be between 1 and {MAX_PERIODS}.')
+        except ValueError:
+            errors.append('Number of milestones must be a whole number.')
+    else:
+        try:
+            values['end_date'] = date.fromisoformat(end_date_str)
+            if values['start_date'] and values['end_date'] < values['start_date']:
+                errors.append('End date cannot be earlier than the start date.')
+        except ValueError:
+            errors.append('Invalid end date.')
+    try:
+        values['amount'] = float(form.get('amount', ''))
+        if values['amount'] <= 0:
+            errors.append('Amount must be positive.')
+    except ValueError:
+        errors.append('Amount must be a number.')
+        values['amount'] = None
+    try:
+        values['penalty_rate_percent'] = float(form.get('penalty_rate_percent', '0'))
+        if values['penalty_rate_percent'] < 0:
+            errors.append('Penalty rate must be non-negative.')
+    except ValueError:
+        errors.append('Penalty rate must be a number.')
+        values['penalty_rate_percent'] = 0.0
+    if values['penalty_unit'] not in ('day', 'month'):
+        errors.append('Penalty unit must be "day" or "month".')
+        values['penalty_unit'] = 'day'
+    return errors, values
+
+
+def _schedule_form(contract, schedule):
+    """Shared GET/POST handling for new and edited schedules.
+
+    ``action=preview`` renders the planned milestones without writing
+    anything; saving a new schedule inserts them all in one statement, and
+    saving an edit replaces only its future, undelivered, unpaid milestones.
+    """
+    preview = None
+    if request.method == 'POST':
+        errors, values = _validate_schedule_form(request.form)
+        if errors:
+            for e in errors:
+                flash(e, 'danger')
+        else:
+            draft = schedule or MilestoneSchedule(contract_id=contract.id)
+            if request.form.get('action') == 'preview':
+                # A transient copy, so previewing an edit never dirties the session.
+                preview = plan_schedule(MilestoneSchedule(
+                    id=draft.id, contract_id=contract.id, **values))
+                if not preview:
+                    flash('This schedule produces no milestones.', 'warning')
+            else:
+                for key, value in values.items():
+                    setattr(draft, key, value)
+                user_id = session['user_id']
+                if schedule is None:
+                    db.session.add(draft)
+                    db.session.flush()
+                    added = generate_milestones(draft, user_id)
+                    message = f'Schedule created with {added} milestone(s).'
+                else:
+                    removed, added = regenerate_milestones(draft, user_id)
+                    message = f'Schedule updated: {removed} future milestone(s) replaced by {added}.'
+                db.session.commit()
+                flash(message, 'success')
+                return redirect(url_for('contracts.view_contract', contract_id=contract.id))
+    return render_template('milestones/schedule.html', contract=contract, schedule=schedule,
+                           form=request.form if request.method == 'POST' else None,
+                           preview=preview, frequencies=FREQUENCIES)
+
+
+@milestones_bp.route('/contracts/<int:contract_id>/schedules/new', methods=['GET', 'POST'])
+@login_required
+def new_schedule(contract_id):
+    contract = Contract.query.filter_by(id=contract_id, user_id=session['user_id']).first_or_404()
+    return _schedule_form(contract, None)
+
+
+@milestones_bp.route('/schedules/<int:schedule_id>/edit', methods=['GET', 'POST'])
+@login_required
+def edit_schedule(schedule_id):
+    schedule = MilestoneSchedule.query.join(Contract).filter(
+        MilestoneSchedule.id == schedule_id,
+        Contract.user_id == session['user_id']
+    ).first_or_404()
+    return _schedule_form(schedule.contract, schedule)
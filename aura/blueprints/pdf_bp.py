@@ -1,20 +1,64 @@
-import io
-from datetime import date
+import logging
+import re
 from flask import Blueprint, session, make_response, request, abort
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from ..models import Milestone, Contract
-from ..utils.money import format_amount_pdf as format_amount
+from sqlalchemy import or_, select
+from sqlalchemy.orm import contains_eager
+from ..extensions import db
+from ..models import (
+    Client, Milestone, Contract, Payment,
+    MILESTONE_DELIVERED, MILESTONE_INVOICE_ELIGIBLE, MILESTONE_PAID,
+    penalty_for, penalty_units,
+)
+from ..pdf_pool import PdfPoolUnavailable, pdf_pool
+from ..pdf_render import render_reminder, render_statement
+from ..utils.clock import as_of
 from .auth import login_required
 
+_log = logging.getLogger(__name__)
+
 pdf_bp = Blueprint('pdf', __name__)
 
 VALID_MODES = ('normal', 'upcoming', 'overdue', 'penalty')
 
 
+def reminder_record(milestone, mode, today):
+    """Plain data for :func:`aura.pdf_render.render_reminder`, read from the ORM objects."""
+    contract = milestone.contract
+    due_date = milestone.due_date
+    paid = milestone.paid_by(today)
+    is_overdue = bool(due_date and today > due_date and not paid)
+    days_overdue = (today - due_date).days if is_overdue else 0
+    penalty_applies = mode == 'penalty' and is_overdue and milestone.penalty_enabled
+    return {
+        'mode': mode,
+        'as_of': today,
+        'client_name': contract.client_name,
+        'contract_name': contract.contract_name,
+        'milestone_name': milestone.name,
+        'currency': contract.currency or 'INR',
+        'amount': milestone.payment_amount,
+        'delivered': milestone.actual_delivery_date,
+        'due_date': due_date,
+        'is_overdue': is_overdue,
+        'days_overdue': days_overdue,
+        'status_label': 'Paid' if paid else ('Overdue' if is_overdue else 'Pending'),
+        'penalty_unit': milestone.penalty_unit,
+        'penalty_rate_percent': milestone.penalty_rate_percent,
+        'penalty_units': penalty_units(milestone.penalty_unit, days_overdue) if penalty_applies else 0,
+        'penalty_amount': penalty_for(milestone.payment_amount, milestone.penalty_rate_percent,
+                                      milestone.penalty_unit, days_overdue) if penalty_applies else 0.0,
+    }
+
+
+def render_pdf(fn, *args):
+    """Render with the warm pool (or inline); 503 when no worker could finish in time."""
+    try:
+        return pdf_pool().render(fn, *args)
+    except PdfPoolUnavailable as exc:
+        _log.warning('PDF render failed: %s', exc)
+        abort(503, 'The PDF could not be rendered right now; please try again.')
+
+
 @pdf_bp.route('/milestones/<int:milestone_id>/pdf')
 @login_required
 def generate_pdf(milestone_id):
@@ -29,109 +73,112 @@ def generate_pdf(milestone_id):
         Milestone.id == milestone_id,
         Contract.user_id == session['user_id']
     ).first_or_404()
-    contract = milestone.contract
-    currency = contract.currency or 'INR'
-
-    today = date.today()
-    due_date = milestone.due_date
-    due_date_str = due_date.isoformat() if due_date else 'N/A'
-    delivery_str = milestone.actual_delivery_date.isoformat() if milestone.actual_delivery_date else 'N/A'
-
-    days_overdue = 0
-    is_overdue = False
-    if due_date and today > due_date and not milestone.payment:
-        is_overdue = True
-        days_overdue = (today - due_date).days
-
-    # Penalty calculation
-    penalty_amount = 0.0
-    penalty_units = 0
-    not_overdue_note = ''
-    if mode == 'penalty':
-        if is_overdue and milestone.penalty_enabled:
-            if milestone.penalty_unit == 'month':
-                penalty_units = -(-days_overdue // 30)
-            else:
-                penalty_units = days_overdue
-            penalty_amount = round(
-                milestone.payment_amount * (milestone.penalty_rate_percent / 100) * penalty_units, 2
-            )
-        elif not is_overdue:
-            not_overdue_note = f'Not overdue as of {today.isoformat()}. Penalty = 0.'
-
-    total_payable = milestone.payment_amount + penalty_amount
-
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter,
-                            rightMargin=inch, leftMargin=inch,
-                            topMargin=inch, bottomMargin=inch)
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle('Title', parent=styles['Title'], fontSize=18, spaceAfter=20)
-    heading_style = ParagraphStyle('Heading', parent=styles['Heading2'], fontSize=12, spaceAfter=6)
-    body_style = styles['Normal']
-
-    # Choose title based on mode
-    if mode == 'normal':
-        doc_title = 'Payment Reminder Notice'
-    elif mode == 'overdue':
-        doc_title = 'Overdue Payment Reminder'
-    else:  # penalty
-        doc_title = 'Overdue Payment Reminder with Penalty'
-
-    story = []
-    story.append(Paragraph(doc_title, title_style))
-    story.append(Spacer(1, 0.2 * inch))
-    story.append(Paragraph(f'<b>Client:</b> {contract.client_name}', body_style))
-    story.append(Paragraph(f'<b>Contract:</b> {contract.contract_name}', body_style))
-    story.append(Paragraph(f'<b>Milestone:</b> {milestone.name}', body_style))
-    story.append(Paragraph(f'<b>Actual Delivery Date:</b> {delivery_str}', body_style))
-    story.append(Paragraph(f'<b>Due Date:</b> {due_date_str}', body_style))
-    story.append(Spacer(1, 0.2 * inch))
-
-    amount_str = format_amount(milestone.payment_amount, currency)
-    story.append(Paragraph(f'<b>Amount Due:</b> {amount_str}', body_style))
-
-    status_label = 'Paid' if milestone.payment else ('Overdue' if is_overdue else 'Pending')
-    story.append(Paragraph(f'<b>Status:</b> {status_label}', body_style))
-
-    if mode in ('overdue', 'penalty') and is_overdue:
-        story.append(Paragraph(f'<b>Days Overdue:</b> {days_overdue}', body_style))
-
-    if mode == 'penalty':
-        if not_overdue_note:
-            story.append(Spacer(1, 0.2 * inch))
-            story.append(Paragraph(f'<i>{not_overdue_note}</i>', body_style))
-        else:
-            unit_label = 'month(s)' if milestone.penalty_unit == 'month' else 'day(s)'
-            story.append(Paragraph(f'<b>Penalty Rate:</b> {milestone.penalty_rate_percent}% per {milestone.penalty_unit}', body_style))
-            story.append(Paragraph(f'<b>Penalty Units:</b> {penalty_units} {unit_label}', body_style))
-            story.append(Paragraph(f'<b>Penalty Amount:</b> {format_amount(penalty_amount, currency)}', body_style))
-            story.append(Paragraph(f'<b>Total Payable:</b> {format_amount(total_payable, currency)}', body_style))
-
-    story.append(Spacer(1, 0.3 * inch))
-
-    reminder_text = (
-        f'This is a formal payment reminder for the above-referenced milestone. '
-        f'According to the terms of the contract, payment of <b>{amount_str}</b> '
-        f'was due on <b>{due_date_str}</b>. '
-    )
-    if days_overdue > 0:
-        reminder_text += (
-            f'This payment is now <b>{days_overdue} days overdue</b>. '
-            f'Please arrange payment at your earliest convenience to avoid further delays.'
-        )
-    else:
-        reminder_text += 'Please ensure payment is made by the due date.'
-    story.append(Paragraph(reminder_text, body_style))
-    story.append(Spacer(1, 0.3 * inch))
-    story.append(Paragraph(f'Generated on: {today.isoformat()}', body_style))
-
-    doc.build(story)
-    buffer.seek(0)
+    pdf = render_pdf(render_reminder, reminder_record(milestone, mode, as_of()))
 
     mode_suffix = f'_{mode}' if mode != 'normal' else ''
-    filename = f'payment_reminder_{milestone_id}{mode_suffix}.pdf'
-    response = make_response(buffer.read())
+    return pdf_response(pdf, f'payment_reminder_{milestone_id}{mode_suffix}.pdf')
+
+
+def outstanding_milestones_select(user_id, as_of, contract_id=None, client_id=None,
+                                  client_name=None):
+    """SELECT of milestones delivered but unpaid as of ``as_of``, eager-loading contract and payment."""
+    stmt = (
+        select(Milestone)
+        .join(Milestone.contract)
+        .outerjoin(Milestone.payment)
+        .options(contains_eager(Milestone.contract), contains_eager(Milestone.payment))
+        .where(Contract.user_id == user_id,
+               Milestone.status.in_((MILESTONE_DELIVERED, MILESTONE_INVOICE_ELIGIBLE,
+                                     MILESTONE_PAID)),
+               Milestone.actual_delivery_date <= as_of,
+               or_(Payment.id.is_(None), Payment.received_date > as_of))
+        .order_by(Contract.contract_name, Contract.id, Milestone.actual_delivery_date,
+                  Milestone.id)
+    )
+    if contract_id is not None:
+        stmt = stmt.where(Contract.id == contract_id)
+    if client_id is not None:
+        stmt = stmt.where(Contract.client_id == client_id)
+    if client_name is not None:
+        stmt = stmt.where(Contract.client_name == client_name)
+    return stmt
+
+
+def _outstanding_milestones(user_id, as_of, **filters):
+    """Milestones delivered but unpaid as of ``as_of``, with their contracts, in one query."""
+    return db.session.scalars(outstanding_milestones_select(user_id, as_of, **filters)).all()
+
+
+def statement_rows(milestones, as_of):
+    """Return (rows, totals) for a statement; totals are per currency.
+
+    Only plain attributes are read, so no lazy loads are issued per row.
+    """
+    rows, totals = [], {}
+    for m in milestones:
+        contract = m.contract
+        currency = contract.currency or 'INR'
+        due = m.due_date
+        days_overdue = max(0, (as_of - due).days) if due else 0
+        penalty = (penalty_for(m.payment_amount, m.penalty_rate_percent, m.penalty_unit, days_overdue)
+                   if m.penalty_enabled else 0.0)
+        rows.append({
+            'contract': contract.contract_name, 'milestone': m.name, 'currency': currency,
+            'delivered': m.actual_delivery_date, 'due': due, 'days_overdue': days_overdue,
+            'amount': m.payment_amount, 'penalty': penalty,
+        })
+        total = totals.setdefault(currency, {'amount': 0.0, 'penalty': 0.0, 'overdue': 0.0})
+        total['amount'] += m.payment_amount
+        total['penalty'] += penalty
+        if days_overdue:
+            total['overdue'] += m.payment_amount
+    return rows, totals
+
+
+def pdf_response(pdf_bytes, filename):
+    response = make_response(pdf_bytes)
     response.headers['Content-Type'] = 'application/pdf'
     response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
+
+
+def filename_slug(text):
+    return re.sub(r'[^A-Za-z0-9]+', '_', text).strip('_').lower() or 'client'
+
+
+@pdf_bp.route('/contracts/<int:contract_id>/statement')
+@login_required
+def contract_statement(contract_id):
+    contract = Contract.query.filter_by(id=contract_id, user_id=session['user_id']).first_or_404()
+    today = as_of()
+    rows, totals = statement_rows(
+        _outstanding_milestones(session['user_id'], today, contract_id=contract.id), today)
+    pdf = render_pdf(render_statement, contract.client_name,
+                     f'Contract: {contract.contract_name}', rows, totals, today)
+    return pdf_response(pdf, f'statement_contract_{contract.id}.pdf')
+
+
+@pdf_bp.route('/clients/<int:client_id>/statement')
+@login_required
+def client_statement_by_id(client_id):
+    client = Client.query.filter_by(id=client_id, user_id=session['user_id']).first_or_404()
+    today = as_of()
+    rows, totals = statement_rows(
+        _outstanding_milestones(session['user_id'], today, client_id=client.id), today)
+    pdf = render_pdf(render_statement, client.name, 'All contracts', rows, totals, today)
+    return pdf_response(pdf, f'statement_{filename_slug(client.name)}.pdf')
+
+
+@pdf_bp.route('/statements')
+@login_required
+def client_statement():
+    client_name = request.args.get('client', '').strip()
+    if not client_name:
+        abort(400, 'Missing client.')
+    if not Contract.query.filter_by(user_id=session['user_id'], client_name=client_name).first():
+        abort(404)
+    today = as_of()
+    rows, totals = statement_rows(
+        _outstanding_milestones(session['user_id'], today, client_name=client_name), today)
+    pdf = render_pdf(render_statement, client_name, 'All contracts', rows, totals, today)
+    return pdf_response(pdf, f'statement_{filename_slug(client_name)}.pdf')
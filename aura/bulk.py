@@ -0,0 +1,141 @@
+"""Set-based bulk operations for AURA.
+
+Each helper issues a fixed number of SQL statements however many rows it
+touches, instead of loading ORM objects one by one.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import and_, delete, exists, insert, literal, null, select, update
+from .changes import (CONTRACT, MILESTONE, milestone_row_payload, record_changes,
+                      record_contract_change)
+from .extensions import db
+from .models import (ChangeLog, Client, Contract, Milestone, Payment, ReceivablesSnapshot, User,
+                     MILESTONE_PENDING)
+from .utils.sql import date_add_days
+
+
+def archive_settled_contracts(older_than_days, today=None):
+    """Archive contracts whose milestones are all paid, the last payment being
+    more than ``older_than_days`` old.  Returns the number of contracts archived."""
+    today = today or datetime.utcnow().date()
+    cutoff = today - timedelta(days=older_than_days)
+    has_milestones = exists().where(Milestone.contract_id == Contract.id)
+    has_unpaid = exists(
+        select(Milestone.id)
+        .outerjoin(Payment, Payment.milestone_id == Milestone.id)
+        .where(Milestone.contract_id == Contract.id, Payment.id.is_(None))
+    )
+    has_recent_payment = exists(
+        select(Payment.id)
+        .join(Milestone, Payment.milestone_id == Milestone.id)
+        .where(Milestone.contract_id == Contract.id, Payment.received_date > cutoff)
+    )
+    stamp = datetime.utcnow()
+    result = db.session.execute(
+        update(Contract)
+        .where(and_(Contract.archived.is_(False), has_milestones,
+                    ~has_unpaid, ~has_recent_payment))
+        .values(archived=True, archived_at=stamp)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        insert(ChangeLog).from_select(
+            ['user_id', 'entity', 'entity_id', 'contract_id', 'action', 'payload'],
+            select(Contract.user_id, literal(CONTRACT), Contract.id, Contract.id,
+                   literal('archive'), literal('{"archived": true}'))
+            .where(Contract.archived.is_(True), Contract.archived_at == stamp)
+        )
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def _delete_contracts_where(condition):
+    """Delete matching contracts with their milestones and payments; return the count.
+
+    Children are deleted explicitly, child-first, so this is correct even on
+    a database whose foreign keys predate ON DELETE CASCADE.
+    """
+    contract_ids = select(Contract.id).where(condition)
+    milestone_ids = select(Milestone.id).where(Milestone.contract_id.in_(contract_ids))
+    db.session.execute(delete(Payment).where(Payment.milestone_id.in_(milestone_ids)))
+    db.session.execute(delete(Milestone).where(Milestone.contract_id.in_(contract_ids)))
+    return db.session.execute(delete(Contract).where(condition)).rowcount
+
+
+def delete_contract(contract_id):
+    """Delete one contract and everything under it in four statements."""
+    db.session.execute(
+        insert(ChangeLog).from_select(
+            ['user_id', 'entity', 'entity_id', 'contract_id', 'action', 'payload'],
+            select(Contract.user_id, literal(CONTRACT), Contract.id, Contract.id,
+                   literal('delete'), null())
+            .where(Contract.id == contract_id)
+        )
+    )
+    count = _delete_contracts_where(Contract.id == contract_id)
+    db.session.commit()
+    return count
+
+
+def delete_user(user_id):
+    """Delete a user and all of their data; return the number of contracts removed.
+
+    Eight statements regardless of how much the user owns.
+    """
+    count = _delete_contracts_where(Contract.user_id == user_id)
+    db.session.execute(delete(Client).where(Client.user_id == user_id))
+    db.session.execute(delete(ReceivablesSnapshot).where(ReceivablesSnapshot.user_id == user_id))
+    db.session.execute(delete(ChangeLog).where(ChangeLog.user_id == user_id))
+    db.session.execute(delete(User).where(User.id == user_id))
+    db.session.commit()
+    return count
+
+
+# Milestone columns copied (or reset) by clone_contract.
+_CLONED_MILESTONE_COLUMNS = ('name', 'planned_delivery_date', 'payment_amount', 'invoice_eligible',
+                             'penalty_enabled', 'penalty_rate_percent', 'penalty_unit', 'status')
+
+
+def clone_contract(contract, start_date, contract_name=None):
+    """Copy ``contract`` and its milestones to a new contract starting on ``start_date``.
+
+    Planned dates keep their offset from the start date.  Deliveries,
+    payments and schedule links are not copied, so every cloned milestone
+    is pending.  The milestones are copied with one INSERT ... SELECT and
+    logged with one bulk insert, however many there are.  Returns the clone.
+    """
+    clone = Contract(
+        user_id=contract.user_id,
+        client_id=contract.client_id,
+        client_name=contract.client_name,
+        contract_name=contract_name or f'{contract.contract_name} (copy)',
+        start_date=start_date,
+        total_value=contract.total_value,
+        payment_term_days=contract.payment_term_days,
+        currency=contract.currency,
+    )
+    db.session.add(clone)
+    db.session.flush()
+    record_contract_change(clone, 'create')
+    shift = (start_date - contract.start_date).days
+    db.session.execute(
+        insert(Milestone).from_select(
+            ['contract_id', *_CLONED_MILESTONE_COLUMNS],
+            select(literal(clone.id), Milestone.name,
+                   date_add_days(Milestone.planned_delivery_date, shift),
+                   Milestone.payment_amount, literal(False), Milestone.penalty_enabled,
+                   Milestone.penalty_rate_percent, Milestone.penalty_unit,
+                   literal(MILESTONE_PENDING))
+            .where(Milestone.contract_id == contract.id)
+            .order_by(Milestone.id)
+        )
+    )
+    rows = db.session.execute(
+        select(Milestone.id, Milestone.contract_id,
+               *(getattr(Milestone, name) for name in _CLONED_MILESTONE_COLUMNS))
+        .where(Milestone.contract_id == clone.id)
+    ).mappings()
+    record_changes([(clone.user_id, MILESTONE, row['id'], 'create', clone.id,
+                     milestone_row_payload(row['id'], row)) for row in rows])
+    db.session.commit()
+    return clone
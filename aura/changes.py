@@ -0,0 +1,108 @@
+"""Change-feed recording for incremental client sync.
+
+Every mutation adds a :class:`~aura.models.ChangeLog` row in the same
+transaction as the change itself, so the feed can never disagree with the
+data.  ``/api/changes`` serves the rows in cursor (id) order.
+"""
+import json
+from sqlalchemy import insert
+from .extensions import db
+from .models import ChangeLog
+
+CONTRACT = 'contract'
+MILESTONE = 'milestone'
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def contract_payload(contract):
+    return {
+        'id': contract.id,
+        'client_id': contract.client_id,
+        'client_name': contract.client_name,
+        'contract_name': contract.contract_name,
+        'start_date': _iso(contract.start_date),
+        'total_value': contract.total_value,
+        'payment_term_days': contract.payment_term_days,
+        'currency': contract.currency,
+        'archived': bool(contract.archived),
+    }
+
+
+def milestone_payload(milestone):
+    payment = milestone.payment
+    return {
+        'id': milestone.id,
+        'contract_id': milestone.contract_id,
+        'name': milestone.name,
+        'planned_delivery_date': _iso(milestone.planned_delivery_date),
+        'payment_amount': milestone.payment_amount,
+        'actual_delivery_date': _iso(milestone.actual_delivery_date),
+        'invoice_eligible': bool(milestone.invoice_eligible),
+        'penalty_enabled': milestone.penalty_enabled,
+        'penalty_rate_percent': milestone.penalty_rate_percent,
+        'penalty_unit': milestone.penalty_unit,
+        'status': milestone.status,
+        'payment': {
+            'received_date': _iso(payment.received_date),
+            'amount_received': payment.amount_received,
+        } if payment else None,
+    }
+
+
+def milestone_row_payload(milestone_id, row):
+    """Payload for a milestone bulk-inserted from a column dict (no payment yet)."""
+    return {
+        'id': milestone_id,
+        'contract_id': row['contract_id'],
+        'name': row['name'],
+        'planned_delivery_date': _iso(row['planned_delivery_date']),
+        'payment_amount': row['payment_amount'],
+        'actual_delivery_date': _iso(row.get('actual_delivery_date')),
+        'invoice_eligible': bool(row.get('invoice_eligible')),
+        'penalty_enabled': row['penalty_enabled'],
+        'penalty_rate_percent': row['penalty_rate_percent'],
+        'penalty_unit': row['penalty_unit'],
+        'status': row['status'],
+        'payment': None,
+    }
+
+
+def record_changes(entries):
+    """Bulk-insert change-log rows from (user_id, entity, entity_id, action, contract_id, payload)."""
+    if not entries:
+        return
+    db.session.execute(insert(ChangeLog), [
+        {'user_id': user_id, 'entity': entity, 'entity_id': entity_id, 'action': action,
+         'contract_id': contract_id,
+         'payload': json.dumps(payload) if payload is not None else None}
+        for user_id, entity, entity_id, action, contract_id, payload in entries
+    ])
+
+
+def record_change(user_id, entity, entity_id, action, contract_id=None, payload=None):
+    """Stage a change-log row in the current session (committed with the change)."""
+    entry = ChangeLog(
+        user_id=user_id,
+        entity=entity,
+        entity_id=entity_id,
+        contract_id=contract_id,
+        action=action,
+        payload=json.dumps(payload) if payload is not None else None,
+    )
+    db.session.add(entry)
+    return entry
+
+
+def record_contract_change(contract, action):
+    payload = contract_payload(contract) if action != 'delete' else None
+    return record_change(contract.user_id, CONTRACT, contract.id, action,
+                         contract_id=contract.id, payload=payload)
+
+
+def record_milestone_change(milestone, user_id, action):
+    payload = milestone_payload(milestone) if action != 'delete' else None
+    return record_change(user_id, MILESTONE, milestone.id, action,
+                         contract_id=milestone.contract_id, payload=payload)
@@ -1,22 +1,13 @@
 import click
-import hashlib
 import os
-import secrets
+from datetime import date
 from flask.cli import AppGroup
 from .extensions import db
 from .models import User
+from .utils.passwords import calibrate, configured_iterations, new_password_hash
 
 aura_cli = AppGroup('aura')
 
-_PBKDF2_ITERATIONS = 260000
-
-
-def _hash_password(password, salt, iterations):
-    if iterations > 1:
-        return hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), iterations).hex()
-    return hashlib.sha256((salt + password).encode()).hexdigest()
-
-
 @aura_cli.command('init-user')
 @click.argument('username')
 @click.password_option()
@@ -27,13 +18,246 @@ def init_user(username, password):
         if User.query.filter_by(username=username).first():
             click.echo(f'User "{username}" already exists.')
             return
-        salt = secrets.token_hex(16)
-        password_hash = _hash_password(password, salt, _PBKDF2_ITERATIONS)
+        password_hash, salt, iterations = new_password_hash(password)
         user = User(username=username, password_hash=password_hash, salt=salt,
-                    password_iterations=_PBKDF2_ITERATIONS)
+                    password_iterations=iterations)
         db.session.add(user)
         db.session.commit()
         click.echo(f'User "{username}" created successfully.')
 
+@aura_cli.command('snapshot')
+@click.option('--date', 'snapshot_date', default=None,
+              help='Snapshot date (YYYY-MM-DD); defaults to today.')
+def snapshot(snapshot_date):
+    """Record today's per-user, per-currency receivables totals (idempotent per day)."""
+    from .reporting import write_snapshot
+    try:
+        as_of = date.fromisoformat(snapshot_date) if snapshot_date else date.today()
+    except ValueError:
+        raise click.BadParameter('Expected YYYY-MM-DD.', param_hint='--date')
+    count = write_snapshot(as_of)
+    click.echo(f'Snapshot for {as_of.isoformat()} written ({count} rows).')
+
+
+@aura_cli.command('archive-contracts')
+@click.option('--older-than', 'older_than', type=int, default=None,
+              help='Days since the final payment (default: ARCHIVE_AFTER_DAYS).')
+def archive_contracts(older_than):
+    """Archive fully paid contracts whose last payment is older than N days."""
+    from flask import current_app
+    from .bulk import archive_settled_contracts
+    if older_than is None:
+        older_than = current_app.config['ARCHIVE_AFTER_DAYS']
+    count = archive_settled_contracts(older_than)
+    click.echo(f'Archived {count} contract(s) settled more than {older_than} days ago.')
+
+
+@aura_cli.command('compress-static')
+def compress_static():
+    """Write pre-compressed .gz/.br variants of the static assets."""
+    from flask import current_app
+    from .assets import brotli, compress_static_files
+    written = compress_static_files(current_app.static_folder)
+    click.echo(f'Wrote {len(written)} compressed file(s).')
+    if brotli is None:
+        click.echo('brotli is not installed; only gzip variants were written.')
+
+
+@aura_cli.command('check-status')
+@click.option('--fix', is_flag=True, help='Rewrite drifted statuses from the source fields.')
+def check_status(fix):
+    """Verify milestone.status against delivery, eligibility and payment data."""
+    from .reporting import repair_statuses, status_mismatches
+    from .routing import reading_from_replica
+    with reading_from_replica():
+        mismatches = status_mismatches(limit=20)
+    if not mismatches:
+        click.echo('All milestone statuses are consistent.')
+        return
+    for milestone_id, stored, expected in mismatches:
+        click.echo(f'Milestone {milestone_id}: stored {stored!r}, expected {expected!r}')
+    if fix:
+        count = repair_statuses()
+        click.echo(f'Repaired {count} milestone status(es).')
+    else:
+        raise click.ClickException('Milestone statuses are inconsistent; re-run with --fix.')
+
+
+@aura_cli.command('load-fx-rates')
+@click.argument('csv_path', type=click.Path(exists=True, dir_okay=False))
+def load_fx_rates(csv_path):
+    """Load FX rates from a CSV (date,currency,base_currency,rate)."""
+    from .fx import load_rates_csv
+    try:
+        count = load_rates_csv(csv_path)
+    except ValueError as exc:
+        raise click.ClickException(str(exc))
+    click.echo(f'Loaded {count} FX rate(s).')
+
+
+@aura_cli.command('delete-user')
+@click.argument('username')
+@click.confirmation_option(prompt='Delete this user and all of their contracts?')
+def delete_user(username):
+    """Delete a user and all of their data."""
+    from .bulk import delete_user as bulk_delete_user
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f'No user "{username}".')
+    count = bulk_delete_user(user.id)
+    click.echo(f'Deleted user "{username}" and {count} contract(s).')
+
+
+@aura_cli.command('clone-contract')
+@click.argument('contract_id', type=int)
+@click.option('--start-date', 'start_date', required=True, help='Start date of the copy (YYYY-MM-DD).')
+@click.option('--name', 'contract_name', default=None, help='Name of the copy (default: "<name> (copy)").')
+def clone_contract(contract_id, start_date, contract_name):
+    """Copy a contract and its milestones, shifting dates to a new start date."""
+    from .bulk import clone_contract as bulk_clone_contract
+    from .models import Contract
+    try:
+        start = date.fromisoformat(start_date)
+    except ValueError:
+        raise click.BadParameter('Expected YYYY-MM-DD.', param_hint='--start-date')
+    contract = db.session.get(Contract, contract_id)
+    if contract is None:
+        raise click.ClickException(f'No contract {contract_id}.')
+    clone = bulk_clone_contract(contract, start, contract_name)
+    click.echo(f'Cloned contract {contract_id} as {clone.id} "{clone.contract_name}" '
+               f'starting {start.isoformat()}.')
+
+
+@aura_cli.command('optimize')
+@click.option('--vacuum', is_flag=True,
+              help='Full VACUUM (rewrites the file; blocks writers while it runs).')
+def optimize(vacuum):
+    """Refresh query-planner statistics and reclaim free space."""
+    from .utils.sql import optimize_database
+    summary = optimize_database(db.engine, vacuum=vacuum)
+    if summary['dialect'] != 'sqlite':
+        click.echo(f'{"VACUUM ANALYZE" if vacuum else "ANALYZE"} done ({summary["dialect"]}).')
+        return
+    click.echo(f'ANALYZE and PRAGMA optimize done ({summary["pages"]} pages, '
+               f'journal_mode={summary["journal_mode"]}, auto_vacuum={summary["auto_vacuum"]}).')
+    click.echo(f'Free pages: {summary["free_pages_before"]} -> {summary["free_pages_after"]}.')
+
+
+@aura_cli.command('backup')
+@click.argument('dest', required=False)
+@click.option('--format', 'fmt', type=click.Choice(['sqlite', 'ndjson']), default=None,
+              help='Default: sqlite for a SQLite database, ndjson otherwise.')
+@click.option('--pages', default=256, show_default=True,
+              help='SQLite pages copied per batch.')
+@click.option('--sleep-ms', default=5.0, show_default=True,
+              help='Pause between SQLite batches so writers get the lock.')
+def backup(dest, fmt, pages, sleep_ms):
+    """Back up the live database without stopping the app."""
+    from datetime import datetime
+    from flask import current_app
+    from .backup import BackupError, backup_ndjson, backup_sqlite
+    engine = db.engine
+    fmt = fmt or ('sqlite' if engine.dialect.name == 'sqlite' else 'ndjson')
+    if fmt == 'sqlite' and engine.dialect.name != 'sqlite':
+        raise click.BadParameter('The sqlite format needs a SQLite database.', param_hint='--format')
+    if dest is None:
+        directory = os.path.join(current_app.instance_path, 'backups')
+        os.makedirs(directory, exist_ok=True)
+        stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S')
+        dest = os.path.join(directory, f'aura-{stamp}.' + ('db' if fmt == 'sqlite' else 'ndjson.gz'))
+    try:
+        if fmt == 'sqlite':
+            marks = set()
+
+            def progress(copied, total):
+                tenth = copied * 10 // total if total else 10
+                if tenth not in marks:
+                    marks.add(tenth)
+                    click.echo(f'  {copied}/{total} pages')
+            stats = backup_sqlite(engine, dest, pages=pages, sleep=sleep_ms / 1000.0,
+                                  progress=progress)
+            click.echo(f'Backed up {stats["pages"]} pages ({stats["bytes"] / 1e6:.1f} MB) to {dest} '
+                       f'in {stats["seconds"]:.2f}s ({stats["mb_per_second"]:.1f} MB/s, '
+                       f'{stats["steps"]} batches, {stats["restarts"]} restart(s), '
+                       f'longest lock {stats["max_stall_ms"]:.1f} ms).')
+        else:
+            stats = backup_ndjson(engine, dest)
+            click.echo(f'Backed up {stats["rows"]} rows ({stats["bytes"] / 1e6:.1f} MB) to {dest} '
+                       f'in {stats["seconds"]:.2f}s ({stats["rows_per_second"]:.0f} rows/s, '
+                       f'longest fetch {stats["max_stall_ms"]:.1f} ms).')
+    except BackupError as exc:
+        raise click.ClickException(str(exc))
+
+
+@aura_cli.command('restore')
+@click.argument('source', type=click.Path(exists=True, dir_okay=False))
+@click.option('--verify-only', is_flag=True, help='Check the backup without restoring it.')
+@click.option('--yes', is_flag=True, help='Do not ask for confirmation.')
+def restore(source, verify_only, yes):
+    """Verify a backup and replace the database's contents with it."""
+    from .backup import (BackupError, detect_format, restore_ndjson, restore_sqlite,
+                         verify_ndjson, verify_sqlite)
+    engine = db.engine
+    fmt = detect_format(source)
+    try:
+        if verify_only:
+            if fmt == 'sqlite':
+                verify_sqlite(source)
+                click.echo(f'{source}: OK')
+            else:
+                counts = verify_ndjson(source)
+                click.echo(f'{source}: OK ({sum(counts.values())} rows in {len(counts)} tables)')
+            return
+        if fmt == 'sqlite' and engine.dialect.name != 'sqlite':
+            raise click.ClickException('A SQLite backup can only be restored into SQLite; '
+                                       'use an .ndjson.gz backup.')
+        if not yes:
+            click.confirm('Replace ALL data in the configured database with this backup?',
+                          abort=True)
+        db.session.remove()
+        if fmt == 'sqlite':
+            stats = restore_sqlite(engine, source)
+            click.echo(f'Restored {source} in {stats["seconds"]:.2f}s.')
+        else:
+            stats = restore_ndjson(engine, source)
+            click.echo(f'Restored {stats["rows"]} rows from {source} in {stats["seconds"]:.2f}s '
+                       f'({stats["rows_per_second"]:.0f} rows/s).')
+    except BackupError as exc:
+        raise click.ClickException(str(exc))
+
+
+@aura_cli.command('calibrate-hash')
+@click.option('--target-ms', default=250.0, show_default=True, type=float,
+              help='Desired time for one password hash on an idle core.')
+def calibrate_hash(target_ms):
+    """Measure PBKDF2 speed and recommend PASSWORD_HASH_ITERATIONS."""
+    iterations, ms_per_10k = calibrate(target_ms)
+    current = configured_iterations()
+    click.echo(f'PBKDF2-HMAC-SHA256: {ms_per_10k:.2f} ms per 10,000 iterations.')
+    click.echo(f'Current PASSWORD_HASH_ITERATIONS={current} '
+               f'(~{current * ms_per_10k / 10000:.0f} ms per login).')
+    click.echo(f'Recommended for {target_ms:.0f} ms: PASSWORD_HASH_ITERATIONS={iterations}')
+    if iterations < current:
+        click.echo('Note: below the current setting; existing hashes are only ever upgraded.')
+
+
+@aura_cli.command('migrate')
+@click.option('--status', 'show_status', is_flag=True, help='List migrations without applying.')
+@click.option('--target', type=int, default=None, help='Stop after this version.')
+def migrate(show_status, target):
+    """Apply pending schema migrations."""
+    from .migrations import MIGRATIONS, applied_versions, run_migrations
+    if show_status:
+        applied = applied_versions(db.engine)
+        for version, description, _ in MIGRATIONS:
+            mark = 'applied' if version in applied else 'pending'
+            click.echo(f'{version:>4}  {mark:<8} {description}')
+        return
+    done = run_migrations(db.engine, target=target)
+    for version, description in done:
+        click.echo(f'Applied {version}: {description}')
+    click.echo(f'{len(done)} migration(s) applied.')
+
+
 def register_cli(app):
     app.cli.add_command(aura_cli)
@@ -0,0 +1,77 @@
+"""Client records behind ``Contract.client_id``.
+
+Contracts keep ``client_name`` for display, but grouping and rollups use
+the integer ``client_id``.  Names are matched on a normalised key, so
+"Acme Corp", "acme corp." and "ACME  Corp" resolve to the same client.
+"""
+import re
+from collections import Counter
+import sqlalchemy as sa
+from sqlalchemy.exc import IntegrityError
+from .extensions import db
+from .models import Client, Contract
+
+_PUNCTUATION_RE = re.compile(r'[.,;:]+')
+
+
+def client_name_key(name):
+    """Return the matching key for a client name."""
+    return ' '.join(_PUNCTUATION_RE.sub(' ', name).split()).casefold()
+
+
+def get_or_create_client(user_id, name):
+    """Return the user's client matching ``name``, creating it if needed.
+
+    Call it before making other changes in the session: losing the insert
+    race rolls the session back.
+    """
+    key = client_name_key(name)
+    client = Client.query.filter_by(user_id=user_id, name_key=key).first()
+    if client is not None:
+        return client
+    client = Client(user_id=user_id, name=' '.join(name.split()), name_key=key)
+    db.session.add(client)
+    try:
+        db.session.flush()
+    except IntegrityError:
+        # Another request created it between our lookup and insert.  A plain
+        # rollback rather than a SAVEPOINT, which pysqlite does not handle.
+        db.session.rollback()
+        client = Client.query.filter_by(user_id=user_id, name_key=key).one()
+    return client
+
+
+def backfill_clients(conn):
+    """Create clients for contracts without one and link them; return contracts linked.
+
+    Spellings that share a key are merged; the most common spelling (then the
+    alphabetically first) becomes the client name and is written back to
+    every contract in the group.
+    """
+    contracts, clients = Contract.__table__, Client.__table__
+    rows = conn.execute(
+        sa.select(contracts.c.user_id, contracts.c.client_name, sa.func.count())
+        .where(contracts.c.client_id.is_(None))
+        .group_by(contracts.c.user_id, contracts.c.client_name)
+    ).all()
+    groups = {}
+    for user_id, name, count in rows:
+        groups.setdefault((user_id, client_name_key(name)), Counter())[name] += count
+
+    linked = 0
+    for (user_id, key), spellings in groups.items():
+        client_id = conn.scalar(sa.select(clients.c.id).where(
+            clients.c.user_id == user_id, clients.c.name_key == key))
+        if client_id is None:
+            canonical = min(spellings, key=lambda n: (-spellings[n], n))
+            client_id = conn.execute(clients.insert().values(
+                user_id=user_id, name=' '.join(canonical.split()), name_key=key,
+            )).inserted_primary_key[0]
+        name = conn.scalar(sa.select(clients.c.name).where(clients.c.id == client_id))
+        linked += conn.execute(
+            contracts.update()
+            .where(contracts.c.user_id == user_id, contracts.c.client_id.is_(None),
+                   contracts.c.client_name.in_(list(spellings)))
+            .values(client_id=client_id, client_name=name)
+        ).rowcount
+    return linked
@@ -0,0 +1,58 @@
+"""On-the-fly compression of HTML and JSON responses.
+
+Text responses larger than ``COMPRESS_MIN_SIZE`` bytes are gzip- (or, with
+the optional ``brotli`` package, brotli-) encoded when the client accepts
+it.  Streamed and file responses are left alone: static files have their
+own pre-compressed variants (see :mod:`aura.assets`) and PDFs are already
+Flate-compressed internally by ReportLab.
+"""
+import gzip
+from flask import request
+
+try:  # Optional dependency, see aura.assets.
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = frozenset({
+    'text/html', 'application/json', 'text/plain', 'text/css',
+    'application/javascript', 'image/svg+xml',
+})
+
+
+def _choose_encoding():
+    accept = request.accept_encodings
+    if brotli is not None and accept['br']:
+        return 'br'
+    if accept['gzip']:
+        return 'gzip'
+    return None
+
+
+def init_compression(app):
+    """Register the after-request hook that compresses eligible responses."""
+    min_size = app.config.get('COMPRESS_MIN_SIZE', 0)
+    if not min_size:
+        return
+    level = app.config.get('COMPRESS_LEVEL', 6)
+
+    @app.after_request
+    def _compress_response(response):
+        if (response.direct_passthrough or response.is_streamed
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES
+                or 'Content-Encoding' in response.headers
+                or not 200 <= response.status_code < 300):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = _choose_encoding()
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        if encoding == 'br':
+            response.set_data(brotli.compress(data, quality=min(level, 11)))
+        else:
+            response.set_data(gzip.compress(data, compresslevel=level))
+        response.headers['Content-Encoding'] = encoding
+        return response
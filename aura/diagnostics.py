@@ -0,0 +1,208 @@
+"""Slow-request log and on-demand per-request profiler.
+
+Every request counts its SQL statements (via engine events) and times
+them.  A request slower than ``SLOW_REQUEST_MS`` is logged on the
+``aura.diagnostics`` logger as one JSON line with the endpoint, user id,
+SQL count and time, and the ``SLOW_REQUEST_TOP_STATEMENTS`` slowest
+statements.
+
+A single request can also be profiled: send ``X-Aura-Profile: <PROFILE_TOKEN>``,
+or set ``PROFILE_SAMPLE_RATE`` to profile that fraction of requests.  The
+request then runs under cProfile with tracemalloc, and
+``instance/profiles/`` receives a ``.pstats`` file (open it with
+``python -m pstats``, snakeviz or flameprof) plus a ``.txt`` summary with
+the memory peak and the top allocation sites.  Only one request per
+process is profiled at a time.  The tracemalloc peak is process-wide, so
+other requests running at the same time are included in it.
+"""
+import cProfile
+import heapq
+import hmac
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from flask import current_app, has_request_context, request, session
+from sqlalchemy import event
+
+_log = logging.getLogger(__name__)
+
+_EXTENSION_KEY = 'aura_diagnostics'
+_ENVIRON_KEY = 'aura.diagnostics'
+PROFILE_HEADER = 'X-Aura-Profile'
+_STATEMENT_CHARS = 500
+
+
+class _RequestStats:
+    __slots__ = ('started', 'sql_count', 'sql_seconds', 'slowest', 'profiler', 'own_tracing')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.slowest = []  # min-heap of (seconds, statement)
+        self.profiler = None
+        self.own_tracing = False
+
+
+class Diagnostics:
+    """Per-process slow-request and profiling state with counters."""
+
+    def __init__(self, app):
+        self.app = app
+        self._profile_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.counters = {'slow_requests': 0, 'profiles_written': 0, 'profiles_skipped': 0}
+
+    # -- SQL statement hooks ------------------------------------------------
+
+    def attach(self, engine):
+        if not event.contains(engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('aura_query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('aura_query_start')
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        stats = request.environ.get(_ENVIRON_KEY) if has_request_context() else None
+        if stats is None:
+            return
+        stats.sql_count += 1
+        stats.sql_seconds += elapsed
+        entry = (elapsed, statement[:_STATEMENT_CHARS])
+        top = self.app.config.get('SLOW_REQUEST_TOP_STATEMENTS', 3)
+        if len(stats.slowest) < top:
+            heapq.heappush(stats.slowest, entry)
+        elif top and entry > stats.slowest[0]:
+            heapq.heapreplace(stats.slowest, entry)
+
+    # -- request hooks ------------------------------------------------------
+
+    def _wants_profile(self):
+        config = self.app.config
+        token = config.get('PROFILE_TOKEN')
+        header = request.headers.get(PROFILE_HEADER)
+        if token and header and hmac.compare_digest(header, token):
+            return True
+        rate = config.get('PROFILE_SAMPLE_RATE', 0.0)
+        return rate > 0 and random.random() < rate
+
+    def before_request(self):
+        stats = request.environ[_ENVIRON_KEY] = _RequestStats()
+        if not self._wants_profile():
+            return
+        if not self._profile_lock.acquire(blocking=False):
+            with self._lock:
+                self.counters['profiles_skipped'] += 1
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+            stats.own_tracing = True
+        tracemalloc.reset_peak()
+        stats.profiler = cProfile.Profile()
+        stats.profiler.enable()
+
+    def after_request(self, response):
+        stats = request.environ.pop(_ENVIRON_KEY, None)
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - stats.started
+        if stats.profiler is not None:
+            self._finish_profile(stats, elapsed)
+        threshold = self.app.config.get('SLOW_REQUEST_MS', 0)
+        if threshold and elapsed * 1000.0 >= threshold and not response.is_streamed:
+            self._log_slow(stats, elapsed, response.status_code)
+        return response
+
+    def teardown_request(self, exc):
+        # after_request is skipped when a view raises; never leave a profiler running.
+        stats = request.environ.pop(_ENVIRON_KEY, None)
+        if stats is not None and stats.profiler is not None:
+            stats.profiler.disable()
+            self._stop_tracing(stats)
+            self._profile_lock.release()
+
+    @staticmethod
+    def _stop_tracing(stats):
+        if stats.own_tracing:
+            tracemalloc.stop()
+
+    def _log_slow(self, stats, elapsed, status):
+        record = {
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': status,
+            'user_id': session.get('user_id'),
+            'duration_ms': round(elapsed * 1000.0, 1),
+            'sql_count': stats.sql_count,
+            'sql_ms': round(stats.sql_seconds * 1000.0, 1),
+            'slowest_sql': [{'ms': round(seconds * 1000.0, 2), 'statement': statement}
+                            for seconds, statement in sorted(stats.slowest, reverse=True)],
+        }
+        with self._lock:
+            self.counters['slow_requests'] += 1
+        _log.warning('slow request %s', json.dumps(record))
+
+    def _finish_profile(self, stats, elapsed):
+        try:
+            stats.profiler.disable()
+            _, peak = tracemalloc.get_traced_memory()
+            top_allocations = tracemalloc.take_snapshot().statistics('lineno')[:10]
+            self._stop_tracing(stats)
+            directory = os.path.join(self.app.instance_path, 'profiles')
+            os.makedirs(directory, exist_ok=True)
+            stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+            base = os.path.join(directory, f'{stamp}-{request.endpoint or "unknown"}')
+            stats.profiler.dump_stats(base + '.pstats')
+            summary = io.StringIO()
+            summary.write(f'{request.method} {request.full_path}\n'
+                          f'duration_ms={elapsed * 1000.0:.1f} sql_count={stats.sql_count} '
+                          f'sql_ms={stats.sql_seconds * 1000.0:.1f} '
+                          f'tracemalloc_peak_kib={peak / 1024.0:.1f}\n\nTop allocations:\n')
+            for stat in top_allocations:
+                summary.write(f'  {stat}\n')
+            summary.write('\n')
+            pstats.Stats(stats.profiler, stream=summary).sort_stats('cumulative').print_stats(30)
+            with open(base + '.txt', 'w') as f:
+                f.write(summary.getvalue())
+            with self._lock:
+                self.counters['profiles_written'] += 1
+            _log.info('Wrote request profile %s.pstats', base)
+        finally:
+            stats.profiler = None
+            self._profile_lock.release()
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self.counters)
+        counters['slow_request_ms'] = self.app.config.get('SLOW_REQUEST_MS', 0)
+        return counters
+
+
+def init_diagnostics(app):
+    state = app.extensions[_EXTENSION_KEY] = Diagnostics(app)
+    with app.app_context():
+        from .extensions import db
+        from .routing import replica_engine
+        for engine in filter(None, [*db.engines.values(), replica_engine(app)]):
+            state.attach(engine)
+    app.before_request(state.before_request)
+    app.after_request(state.after_request)
+    app.teardown_request(state.teardown_request)
+
+
+def diagnostics(app=None):
+    return (app or current_app).extensions[_EXTENSION_KEY]
@@ -0,0 +1,88 @@
+"""In-process publisher for live dashboard updates (Server-Sent Events).
+
+Each open ``/dashboard/stream`` connection subscribes a bounded queue for its
+user and a topic (the dashboard's base currency).  Views that record a
+delivery or payment publish one pre-rendered message per topic after
+committing, so streams only ever wait on their queue — they never touch
+the database or hold a connection while idle.
+
+The publisher is per process: with several Gunicorn workers a stream only
+sees changes made through the same worker, and the page falls back to its
+normal reload for everything else.  Blocking on ``queue.Queue`` works with
+both ``gthread`` and (monkey-patched) ``gevent`` workers.
+
+An open stream holds a worker thread, so :meth:`Publisher.subscribe` refuses
+streams beyond a per-process and a per-user cap.  The refused page polls
+``/dashboard/totals`` instead.
+"""
+import queue
+import threading
+from flask import current_app
+
+_EXTENSION_KEY = 'aura_events'
+_QUEUE_SIZE = 16
+
+
+class Publisher:
+    """Fan out messages to per-user subscriber queues."""
+
+    def __init__(self):
+        self._subscribers = {}  # user_id -> {queue: topic}
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id, topic, max_streams=None, max_per_user=None):
+        """Return a new queue for the user, or None when a cap is reached."""
+        q = queue.Queue(maxsize=_QUEUE_SIZE)
+        with self._lock:
+            subs = self._subscribers.get(user_id, {})
+            if max_streams is not None and self._count >= max_streams:
+                return None
+            if max_per_user is not None and len(subs) >= max_per_user:
+                return None
+            self._subscribers.setdefault(user_id, {})[q] = topic
+            self._count += 1
+        return q
+
+    def unsubscribe(self, user_id, q):
+        with self._lock:
+            subs = self._subscribers.get(user_id)
+            if subs is not None and subs.pop(q, None) is not None:
+                self._count -= 1
+                if not subs:
+                    del self._subscribers[user_id]
+
+    @property
+    def stream_count(self):
+        return self._count
+
+    def topics(self, user_id):
+        """Return the set of topics the user's open streams listen on."""
+        with self._lock:
+            return set(self._subscribers.get(user_id, {}).values())
+
+    def publish(self, user_id, messages):
+        """Deliver ``messages[topic]`` to each of the user's subscribers."""
+        with self._lock:
+            targets = list(self._subscribers.get(user_id, {}).items())
+        for q, topic in targets:
+            message = messages.get(topic)
+            if message is None:
+                continue
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                # A stalled client only needs the newest totals.
+                try:
+                    q.get_nowait()
+                    q.put_nowait(message)
+                except (queue.Empty, queue.Full):
+                    pass
+
+
+def init_events(app):
+    app.extensions[_EXTENSION_KEY] = Publisher()
+
+
+def publisher(app=None):
+    return (app or current_app).extensions[_EXTENSION_KEY]
@@ -0,0 +1,80 @@
+"""Foreign-exchange rates from the local ``fx_rates`` table.
+
+Rates are looked up as "the latest rate on or before a date" through the
+(base_currency, currency, rate_date) unique index, and memoised on
+``flask.g`` so a request resolves each currency pair at most once.
+"""
+import csv
+from datetime import date
+from flask import g, has_app_context
+from sqlalchemy import delete, insert, select, tuple_
+from .extensions import db
+from .models import FxRate, ALLOWED_CURRENCIES
+
+# Keeps the (base, currency, date) IN-list well under SQLite's bound-parameter limit.
+_DELETE_CHUNK = 500
+
+
+def get_rate(currency, base, on):
+    """Return the ``base`` value of one unit of ``currency`` on ``on``, or None."""
+    if currency == base:
+        return 1.0
+    key = (currency, base, on)
+    memo = g.setdefault('_aura_fx_rates', {}) if has_app_context() else {}
+    if key not in memo:
+        memo[key] = db.session.scalar(rate_select(currency, base, on))
+    return memo[key]
+
+
+def rate_select(currency, base, on):
+    """SELECT of the latest ``currency``→``base`` rate on or before ``on``."""
+    return (
+        select(FxRate.rate)
+        .where(FxRate.base_currency == base, FxRate.currency == currency,
+               FxRate.rate_date <= on)
+        .order_by(FxRate.rate_date.desc())
+        .limit(1)
+    )
+
+
+def rates_to(base, on, currencies=ALLOWED_CURRENCIES):
+    """Return {currency: rate-or-None} for converting ``currencies`` into ``base``."""
+    return {cur: get_rate(cur, base, on) for cur in currencies}
+
+
+def load_rates_csv(path):
+    """Upsert rates from a CSV with ``date,currency,base_currency,rate`` columns.
+
+    Returns the number of rates written.  Raises ValueError on a bad row.
+    """
+    rows = {}
+    with open(path, newline='') as fh:
+        for line_no, record in enumerate(csv.DictReader(fh), start=2):
+            try:
+                rate_date = date.fromisoformat(record['date'].strip())
+                currency = record['currency'].strip().upper()
+                base = record['base_currency'].strip().upper()
+                rate = float(record['rate'])
+            except (KeyError, AttributeError, ValueError) as exc:
+                raise ValueError(f'Line {line_no}: invalid FX rate row ({exc}).') from exc
+            if currency not in ALLOWED_CURRENCIES or base not in ALLOWED_CURRENCIES:
+                raise ValueError(f'Line {line_no}: unsupported currency pair {currency}/{base}.')
+            if rate <= 0:
+                raise ValueError(f'Line {line_no}: rate must be positive.')
+            rows[(base, currency, rate_date)] = rate
+    if not rows:
+        return 0
+    keys = list(rows)
+    for start in range(0, len(keys), _DELETE_CHUNK):
+        db.session.execute(
+            delete(FxRate).where(
+                tuple_(FxRate.base_currency, FxRate.currency, FxRate.rate_date)
+                .in_(keys[start:start + _DELETE_CHUNK])
+            )
+        )
+    db.session.execute(insert(FxRate), [
+        {'base_currency': base, 'currency': cur, 'rate_date': d, 'rate': rate}
+        for (base, cur, d), rate in rows.items()
+    ])
+    db.session.commit()
+    return len(rows)
@@ -0,0 +1,301 @@
+"""Versioned schema migrations (``flask aura migrate``).
+
+``db.create_all()`` only creates missing tables; it never adds a column or
+an index to a table that already exists.  Migrations fill that gap.  Each
+one is a function registered with :func:`migration` under an increasing
+version number; :func:`run_migrations` applies the pending ones in order
+and records them in ``schema_migrations``.
+
+Migrations are written to be idempotent (they check the live schema before
+changing it), so version 1 can simply create the current tables on a fresh
+database and every later step becomes a no-op there.
+
+On PostgreSQL indexes are built with ``CREATE INDEX CONCURRENTLY`` outside
+a transaction, so writes to large tables are not blocked while they build.
+
+:func:`run_migrations` holds a lock while it runs, so several Gunicorn
+workers starting with ``INIT_DB=true`` apply each version exactly once:
+``pg_advisory_lock`` on PostgreSQL, an exclusive ``flock`` on a file next
+to the database for SQLite.
+"""
+import logging
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+import sqlalchemy as sa
+from sqlalchemy.schema import CreateColumn
+from .extensions import db
+
+_log = logging.getLogger(__name__)
+
+_metadata = sa.MetaData()
+schema_migrations = sa.Table(
+    'schema_migrations', _metadata,
+    sa.Column('version', sa.Integer, primary_key=True, autoincrement=False),
+    sa.Column('description', sa.String(200), nullable=False),
+    sa.Column('applied_at', sa.DateTime, nullable=False),
+)
+
+MIGRATIONS = []
+
+# pg_advisory_lock key of migration runs ("aura" in ASCII).
+_LOCK_KEY = 0x61757261
+
+
+def migration(version, description):
+    """Register ``fn(engine)`` as schema version ``version``."""
+    def decorator(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return decorator
+
+
+def applied_versions(engine):
+    _metadata.create_all(engine)
+    with engine.connect() as conn:
+        return set(conn.scalars(sa.select(schema_migrations.c.version)))
+
+
+def pending_migrations(engine):
+    applied = applied_versions(engine)
+    return [m for m in MIGRATIONS if m[0] not in applied]
+
+
+@contextmanager
+def _pg_lock(engine):
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.execute(sa.text('SELECT pg_advisory_lock(:key)'), {'key': _LOCK_KEY})
+        try:
+            yield
+        finally:
+            conn.execute(sa.text('SELECT pg_advisory_unlock(:key)'), {'key': _LOCK_KEY})
+
+
+@contextmanager
+def _file_lock(path):
+    import fcntl
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def migration_lock(engine):
+    """Context manager serialising migration runs across processes."""
+    if engine.dialect.name == 'postgresql':
+        return _pg_lock(engine)
+    database = engine.url.database if engine.dialect.name == 'sqlite' else None
+    if not database or database == ':memory:' or database.startswith('file:'):
+        return nullcontext()  # private to this process
+    return _file_lock(database + '.migrate-lock')
+
+
+def run_migrations(engine, target=None):
+    """Apply pending migrations up to ``target``; return the (version, description) applied.
+
+    Another process migrating the same database is waited for; the versions
+    it applied are then no longer pending here.
+    """
+    done = []
+    with migration_lock(engine):
+        for version, description, fn in pending_migrations(engine):
+            if target is not None and version > target:
+                break
+            _log.info('Applying migration %s: %s', version, description)
+            fn(engine)
+            with engine.begin() as conn:
+                conn.execute(schema_migrations.insert().values(
+                    version=version, description=description, applied_at=datetime.utcnow()))
+            done.append((version, description))
+    return done
+
+
+# -- helpers -----------------------------------------------------------------
+
+def add_column(engine, table, column):
+    """Add ``column`` (a model Column) to ``table`` unless it already exists."""
+    if column.name in {c['name'] for c in sa.inspect(engine).get_columns(table)}:
+        return False
+    with engine.begin() as conn:
+        ddl = CreateColumn(column).compile(dialect=conn.dialect)
+        conn.execute(sa.text(f'ALTER TABLE {table} ADD COLUMN {ddl}'))
+    return True
+
+
+def create_index(engine, index):
+    """Create a model ``Index`` if missing, concurrently on PostgreSQL."""
+    table = index.table.name
+    columns = ', '.join(col.name for col in index.columns)
+    unique = 'UNIQUE ' if index.unique else ''
+    if engine.dialect.name == 'postgresql':
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            # An interrupted concurrent build leaves an INVALID index behind
+            # that IF NOT EXISTS would happily skip; drop it and start over.
+            invalid = conn.scalar(sa.text(
+                'SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid '
+                'WHERE c.relname = :name AND NOT i.indisvalid'), {'name': index.name})
+            if invalid:
+                conn.execute(sa.text(f'DROP INDEX CONCURRENTLY {index.name}'))
+            conn.execute(sa.text(
+                f'CREATE {unique}INDEX CONCURRENTLY IF NOT EXISTS {index.name} '
+                f'ON {table} ({columns})'))
+    else:
+        with engine.begin() as conn:
+            conn.execute(sa.text(
+                f'CREATE {unique}INDEX IF NOT EXISTS {index.name} ON {table} ({columns})'))
+
+
+def _model_index(model, name):
+    return next(ix for ix in model.__table__.indexes if ix.name == name)
+
+
+# -- migrations --------------------------------------------------------------
+
+@migration(1, 'baseline: create missing tables')
+def _baseline(engine):
+    from . import models  # noqa: F401  (register every table on db.metadata)
+    db.metadata.create_all(engine)
+
+
+@migration(2, 'contracts.archived and contracts.archived_at')
+def _contract_archive_columns(engine):
+    from .models import Contract
+    add_column(engine, 'contracts', Contract.__table__.c.archived)
+    add_column(engine, 'contracts', Contract.__table__.c.archived_at)
+
+
+@migration(3, 'milestones.status, backfilled from source fields')
+def _milestone_status(engine):
+    from .models import Milestone
+    from .reporting import derived_status_expr
+    if add_column(engine, 'milestones', Milestone.__table__.c.status):
+        with engine.begin() as conn:
+            conn.execute(sa.update(Milestone.__table__).values(status=derived_status_expr()))
+
+
+@migration(4, 'hot-path composite indexes')
+def _hot_path_indexes(engine):
+    from .models import ChangeLog, Contract, Milestone
+    for model, name in (
+        (Contract, 'ix_contracts_user_id_created_at'),
+        (Contract, 'ix_contracts_user_id_archived_created_at'),
+        (Milestone, 'ix_milestones_contract_id_status'),
+        (Milestone, 'ix_milestones_contract_id_actual_delivery_date'),
+        (ChangeLog, 'ix_change_log_user_id_id'),
+    ):
+        create_index(engine, _model_index(model, name))
+
+
+@migration(5, 'clients table, contracts.client_id and client name deduplication')
+def _clients(engine):
+    from .clients import backfill_clients
+    from .models import Client, Contract
+    Client.__table__.create(engine, checkfirst=True)
+    if add_column(engine, 'contracts', Contract.__table__.c.client_id) \
+            and engine.dialect.name == 'postgresql':
+        # NOT VALID skips the table scan under the ALTER's lock; VALIDATE
+        # then checks existing rows while allowing writes.
+        with engine.begin() as conn:
+            conn.execute(sa.text(
+                'ALTER TABLE contracts ADD CONSTRAINT fk_contracts_client_id '
+                'FOREIGN KEY (client_id) REFERENCES clients (id) NOT VALID'))
+        with engine.begin() as conn:
+            conn.execute(sa.text('ALTER TABLE contracts VALIDATE CONSTRAINT fk_contracts_client_id'))
+    create_index(engine, _model_index(Contract, 'ix_contracts_client_id'))
+    with engine.begin() as conn:
+        backfill_clients(conn)
+
+
+# (table, column, referred table, ON DELETE action)
+_DELETE_ACTIONS = (
+    ('clients', 'user_id', 'users', 'CASCADE'),
+    ('contracts', 'user_id', 'users', 'CASCADE'),
+    ('contracts', 'client_id', 'clients', 'SET NULL'),
+    ('milestones', 'contract_id', 'contracts', 'CASCADE'),
+    ('payments', 'milestone_id', 'milestones', 'CASCADE'),
+    ('receivables_snapshots', 'user_id', 'users', 'CASCADE'),
+)
+
+
+def _foreign_key(engine, table, column):
+    for fk in sa.inspect(engine).get_foreign_keys(table):
+        if fk['constrained_columns'] == [column]:
+            return fk
+    return None
+
+
+def _rebuild_sqlite_table(engine, name):
+    """Recreate a SQLite table from its model definition, keeping its rows.
+
+    SQLite cannot alter a constraint in place; this is its documented
+    create-copy-drop-rename procedure, run with foreign keys off.
+    """
+    from sqlalchemy.schema import CreateTable
+    table = db.metadata.tables[name]
+    existing = {c['name'] for c in sa.inspect(engine).get_columns(name)}
+    columns = ', '.join(c.name for c in table.columns if c.name in existing)
+    with engine.connect() as conn:
+        conn.exec_driver_sql('PRAGMA foreign_keys=OFF')
+        conn.commit()
+        try:
+            with conn.begin():
+                ddl = str(CreateTable(table).compile(dialect=conn.dialect))
+                conn.exec_driver_sql(ddl.replace(f'CREATE TABLE {name} ', f'CREATE TABLE _new_{name} ', 1))
+                conn.exec_driver_sql(
+                    f'INSERT INTO _new_{name} ({columns}) SELECT {columns} FROM {name}')
+                conn.exec_driver_sql(f'DROP TABLE {name}')
+                conn.exec_driver_sql(f'ALTER TABLE _new_{name} RENAME TO {name}')
+                problems = conn.exec_driver_sql(f'PRAGMA foreign_key_check({name})').fetchall()
+                if problems:
+                    raise RuntimeError(f'{name}: {len(problems)} row(s) violate foreign keys')
+        finally:
+            conn.exec_driver_sql('PRAGMA foreign_keys=ON')
+            conn.commit()
+    for index in table.indexes:
+        create_index(engine, index)
+
+
+@migration(6, 'ON DELETE CASCADE foreign keys')
+def _cascading_deletes(engine):
+    # Missing keys count as stale too: SQLite's ADD COLUMN in migration 5
+    # could not carry contracts.client_id's foreign key.
+    stale = []
+    for table, column, referred, action in _DELETE_ACTIONS:
+        fk = _foreign_key(engine, table, column) or {}
+        if ((fk.get('options') or {}).get('ondelete') or '').upper() != action:
+            stale.append((table, column, referred, action, fk.get('name')))
+    if engine.dialect.name == 'sqlite':
+        for table in dict.fromkeys(t for t, *_ in stale):
+            _rebuild_sqlite_table(engine, table)
+        return
+    for table, column, referred, action, name in stale:
+        new_name = f'fk_{table}_{column}'
+        with engine.begin() as conn:
+            if name:
+                conn.execute(sa.text(f'ALTER TABLE {table} DROP CONSTRAINT {name}'))
+            conn.execute(sa.text(
+                f'ALTER TABLE {table} ADD CONSTRAINT {new_name} FOREIGN KEY ({column}) '
+                f'REFERENCES {referred} (id) ON DELETE {action} NOT VALID'))
+        with engine.begin() as conn:
+            conn.execute(sa.text(f'ALTER TABLE {table} VALIDATE CONSTRAINT {new_name}'))
+
+
+@migration(7, 'milestone_schedules table and milestones.schedule_id')
+def _milestone_schedules(engine):
+    from .models import Milestone, MilestoneSchedule
+    MilestoneSchedule.__table__.create(engine, checkfirst=True)
+    added = add_column(engine, 'milestones', Milestone.__table__.c.schedule_id)
+    if added and engine.dialect.name == 'sqlite':
+        # ADD COLUMN cannot carry the foreign key; rebuild to get ON DELETE SET NULL.
+        _rebuild_sqlite_table(engine, 'milestones')
+    elif added and engine.dialect.name == 'postgresql':
+        with engine.begin() as conn:
+            conn.execute(sa.text(
+                'ALTER TABLE milestones ADD CONSTRAINT fk_milestones_schedule_id '
+                'FOREIGN KEY (schedule_id) REFERENCES milestone_schedules (id) '
+                'ON DELETE SET NULL NOT VALID'))
+        with engine.begin() as conn:
+            conn.execute(sa.text('ALTER TABLE milestones VALIDATE CONSTRAINT fk_milestones_schedule_id'))
+    create_index(engine, _model_index(Milestone, 'ix_milestones_schedule_id'))
@@ -1,8 +1,37 @@
-from datetime import date, timedelta
+from datetime import timedelta
 from .extensions import db
+from .utils.clock import as_of as current_as_of
 
 ALLOWED_CURRENCIES = ('INR', 'USD')
 
+MILESTONE_PENDING = 'pending'
+MILESTONE_DELIVERED = 'delivered'
+MILESTONE_INVOICE_ELIGIBLE = 'invoice_eligible'
+MILESTONE_PAID = 'paid'
+MILESTONE_STATUSES = (MILESTONE_PENDING, MILESTONE_DELIVERED, MILESTONE_INVOICE_ELIGIBLE, MILESTONE_PAID)
+
+
+def _initial_milestone_status(context):
+    """Column default: derive the status of a new milestone from its fields."""
+    params = context.get_current_parameters()
+    if params.get('invoice_eligible'):
+        return MILESTONE_INVOICE_ELIGIBLE
+    if params.get('actual_delivery_date'):
+        return MILESTONE_DELIVERED
+    return MILESTONE_PENDING
+
+
+def penalty_units(unit, days_overdue):
+    """Number of penalty periods in ``days_overdue``; a started month counts in full."""
+    return -(-days_overdue // 30) if unit == 'month' else days_overdue
+
+
+def penalty_for(payment_amount, rate_percent, unit, days_overdue):
+    """Penalty on ``payment_amount`` after ``days_overdue`` days past due."""
+    if days_overdue <= 0:
+        return 0.0
+    return round(payment_amount * (rate_percent / 100) * penalty_units(unit, days_overdue), 2)
+
 class User(db.Model):
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
@@ -10,12 +39,39 @@ class User(db.Model):
     password_hash = db.Column(db.String(128), nullable=False)
     salt = db.Column(db.String(32), nullable=False)
     password_iterations = db.Column(db.Integer, nullable=False, default=1)
-    contracts = db.relationship('Contract', backref='user', lazy=True, cascade='all, delete-orphan')
+    # Child rows are removed by ON DELETE CASCADE; passive_deletes stops the
+    # ORM from loading them first.
+    contracts = db.relationship('Contract', backref='user', lazy=True, cascade='all, delete-orphan',
+                                passive_deletes=True)
+
+class Client(db.Model):
+    """A user's client; ``name_key`` folds case, punctuation and spacing."""
+    __tablename__ = 'clients'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'name_key', name='uq_clients_user_id_name_key'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    name = db.Column(db.String(200), nullable=False)
+    name_key = db.Column(db.String(200), nullable=False)
+    created_at = db.Column(db.DateTime, default=db.func.now())
+    contracts = db.relationship('Contract', backref='client', lazy=True, passive_deletes=True)
 
 class Contract(db.Model):
     __tablename__ = 'contracts'
+    __table_args__ = (
+        # Serves the hot "active contracts for this user, newest first" lookups.
+        db.Index('ix_contracts_user_id_archived_created_at', 'user_id', 'archived', 'created_at'),
+        # Same ordering across active and archived contracts (exports, PDFs).
+        db.Index('ix_contracts_user_id_created_at', 'user_id', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'),
+                        nullable=False, index=True)
+    # client_name mirrors Client.name for display; group on client_id.
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id', name='fk_contracts_client_id',
+                                                        ondelete='SET NULL'),
+                          nullable=True, index=True)
     client_name = db.Column(db.String(200), nullable=False)
     contract_name = db.Column(db.String(200), nullable=False)
     start_date = db.Column(db.Date, nullable=False)
@@ -23,12 +79,22 @@ class Contract(db.Model):
     payment_term_days = db.Column(db.Integer, nullable=False, default=30)
     currency = db.Column(db.String(3), nullable=False, default='INR')
     created_at = db.Column(db.DateTime, default=db.func.now())
-    milestones = db.relationship('Milestone', backref='contract', lazy=True, cascade='all, delete-orphan')
+    archived = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    archived_at = db.Column(db.DateTime, nullable=True)
+    milestones = db.relationship('Milestone', backref='contract', lazy=True, cascade='all, delete-orphan',
+                                 passive_deletes=True)
 
 class Milestone(db.Model):
     __tablename__ = 'milestones'
+    __table_args__ = (
+        db.Index('ix_milestones_contract_id_status', 'contract_id', 'status'),
+        # Delivery-date range scans per contract (overdue and receivables sums).
+        db.Index('ix_milestones_contract_id_actual_delivery_date',
+                 'contract_id', 'actual_delivery_date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    contract_id = db.Column(db.Integer, db.ForeignKey('contracts.id'), nullable=False, index=True)
+    contract_id = db.Column(db.Integer, db.ForeignKey('contracts.id', ondelete='CASCADE'),
+                            nullable=False, index=True)
     name = db.Column(db.String(200), nullable=False)
     planned_delivery_date = db.Column(db.Date, nullable=False)
     payment_amount = db.Column(db.Float, nullable=False)
@@ -37,8 +103,34 @@ class Milestone(db.Model):
     penalty_enabled = db.Column(db.Boolean, default=False, nullable=False)
     penalty_rate_percent = db.Column(db.Float, default=0.0, nullable=False)
     penalty_unit = db.Column(db.String(5), default='day', nullable=False)
+    # Denormalised from actual_delivery_date, invoice_eligible and payment so
+    # status queries need no join to payments.  Kept current by the views in
+    # milestones.py; `flask aura check-status` verifies it.
+    status = db.Column(db.Enum(*MILESTONE_STATUSES, name='milestone_status', native_enum=False,
+                               create_constraint=True, length=20),
+                       nullable=False, default=_initial_milestone_status,
+                       server_default=MILESTONE_PENDING)
+    # Set for milestones generated by a MilestoneSchedule.
+    schedule_id = db.Column(db.Integer,
+                            db.ForeignKey('milestone_schedules.id', ondelete='SET NULL',
+                                          name='fk_milestones_schedule_id'),
+                            nullable=True, index=True)
     created_at = db.Column(db.DateTime, default=db.func.now())
-    payment = db.relationship('Payment', backref='milestone', uselist=False, cascade='all, delete-orphan')
+    payment = db.relationship('Payment', backref='milestone', uselist=False, cascade='all, delete-orphan',
+                              passive_deletes=True)
+
+    def derive_status(self):
+        """Return the status implied by the milestone's source fields."""
+        if self.payment:
+            return MILESTONE_PAID
+        if self.invoice_eligible:
+            return MILESTONE_INVOICE_ELIGIBLE
+        if self.actual_delivery_date:
+            return MILESTONE_DELIVERED
+        return MILESTONE_PENDING
+
+    def refresh_status(self):
+        self.status = self.derive_status()
 
     @property
     def due_date(self):
@@ -46,42 +138,131 @@ class Milestone(db.Model):
             return self.actual_delivery_date + timedelta(days=self.contract.payment_term_days)
         return None
 
+    def paid_by(self, as_of):
+        """True if the payment was received on or before ``as_of``."""
+        return self.payment is not None and self.payment.received_date <= as_of
+
+    def delivered_by(self, as_of):
+        """True if the milestone was delivered on or before ``as_of``."""
+        return self.actual_delivery_date is not None and self.actual_delivery_date <= as_of
+
+    def overdue_days_on(self, as_of):
+        d = self.due_date
+        if d and as_of > d and not self.paid_by(as_of):
+            return (as_of - d).days
+        return 0
+
+    # The properties below use the request's as-of date (see aura.utils.clock).
+
+    @property
+    def is_paid(self):
+        return self.paid_by(current_as_of())
+
+    @property
+    def is_delivered(self):
+        return self.delivered_by(current_as_of())
+
+    @property
+    def is_invoice_eligible(self):
+        # Set on delivery, so it cannot predate the delivery.
+        return bool(self.invoice_eligible) and self.is_delivered
+
     @property
     def is_overdue(self):
-        d = self.due_date
-        if d and date.today() > d and not self.payment:
-            return True
-        return False
+        return self.overdue_days_on(current_as_of()) > 0
 
     @property
     def overdue_days(self):
-        if self.is_overdue:
-            return (date.today() - self.due_date).days
-        return 0
+        return self.overdue_days_on(current_as_of())
 
     def compute_penalty(self, as_of=None):
-        """Return penalty amount as of as_of date (defaults to today).
+        """Return penalty amount as of as_of date (defaults to the request's as-of date).
         Returns 0.0 if penalty not applicable."""
-        if not self.penalty_enabled or self.payment:
+        if as_of is None:
+            as_of = current_as_of()
+        if not self.penalty_enabled or self.paid_by(as_of):
             return 0.0
         due = self.due_date
         if not due:
             return 0.0
-        if as_of is None:
-            as_of = date.today()
-        days_overdue = max(0, (as_of - due).days)
-        if days_overdue == 0:
-            return 0.0
-        if self.penalty_unit == 'month':
-            units = -(-days_overdue // 30)
-        else:
-            units = days_overdue
-        return round(self.payment_amount * (self.penalty_rate_percent / 100) * units, 2)
+        return penalty_for(self.payment_amount, self.penalty_rate_percent, self.penalty_unit,
+                           max(0, (as_of - due).days))
+
+class MilestoneSchedule(db.Model):
+    """A recurring series of milestones on a contract (see aura/schedules.py)."""
+    __tablename__ = 'milestone_schedules'
+    id = db.Column(db.Integer, primary_key=True)
+    contract_id = db.Column(db.Integer, db.ForeignKey('contracts.id', ondelete='CASCADE'),
+                            nullable=False, index=True)
+    name = db.Column(db.String(150), nullable=False)
+    frequency = db.Column(db.String(10), nullable=False, default='monthly')
+    start_date = db.Column(db.Date, nullable=False)
+    # Exactly one of count / end_date bounds the series.
+    count = db.Column(db.Integer, nullable=True)
+    end_date = db.Column(db.Date, nullable=True)
+    # 'split': amount is the schedule total; 'per_period': amount per milestone.
+    amount_mode = db.Column(db.String(10), nullable=False, default='per_period')
+    amount = db.Column(db.Float, nullable=False)
+    penalty_enabled = db.Column(db.Boolean, default=False, nullable=False)
+    penalty_rate_percent = db.Column(db.Float, default=0.0, nullable=False)
+    penalty_unit = db.Column(db.String(5), default='day', nullable=False)
+    created_at = db.Column(db.DateTime, default=db.func.now())
+    contract = db.relationship('Contract', backref=db.backref('schedules', lazy=True,
+                                                              passive_deletes=True))
 
 class Payment(db.Model):
     __tablename__ = 'payments'
     id = db.Column(db.Integer, primary_key=True)
-    milestone_id = db.Column(db.Integer, db.ForeignKey('milestones.id'), nullable=False, unique=True)
+    milestone_id = db.Column(db.Integer, db.ForeignKey('milestones.id', ondelete='CASCADE'),
+                             nullable=False, unique=True)
     received_date = db.Column(db.Date, nullable=False)
     amount_received = db.Column(db.Float, nullable=False)
     created_at = db.Column(db.DateTime, default=db.func.now())
+
+class ReceivablesSnapshot(db.Model):
+    """Per-user, per-currency receivables totals captured once per day."""
+    __tablename__ = 'receivables_snapshots'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'snapshot_date', 'currency',
+                            name='uq_receivables_snapshots_user_date_currency'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    snapshot_date = db.Column(db.Date, nullable=False)
+    currency = db.Column(db.String(3), nullable=False)
+    received = db.Column(db.Float, nullable=False, default=0.0)
+    pending = db.Column(db.Float, nullable=False, default=0.0)
+    overdue = db.Column(db.Float, nullable=False, default=0.0)
+    created_at = db.Column(db.DateTime, default=db.func.now())
+
+class FxRate(db.Model):
+    """Units of ``base_currency`` per one unit of ``currency`` on ``rate_date``."""
+    __tablename__ = 'fx_rates'
+    __table_args__ = (
+        db.UniqueConstraint('base_currency', 'currency', 'rate_date',
+                            name='uq_fx_rates_base_currency_date'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    base_currency = db.Column(db.String(3), nullable=False)
+    currency = db.Column(db.String(3), nullable=False)
+    rate_date = db.Column(db.Date, nullable=False)
+    rate = db.Column(db.Float, nullable=False)
+
+class ChangeLog(db.Model):
+    """Append-only record of contract and milestone mutations.
+
+    ``id`` doubles as the sync cursor handed out by ``/api/changes`` (which
+    holds back rows younger than ``CHANGE_FEED_LAG_SECONDS``).
+    """
+    __tablename__ = 'change_log'
+    __table_args__ = (
+        db.Index('ix_change_log_user_id_id', 'user_id', 'id'),
+    )
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    entity = db.Column(db.String(20), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    contract_id = db.Column(db.Integer, nullable=True)
+    action = db.Column(db.String(20), nullable=False)
+    payload = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=db.func.now())
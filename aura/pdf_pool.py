@@ -0,0 +1,217 @@
+"""Warm process pool for PDF rendering.
+
+ReportLab layout is pure-Python CPU work.  Rendered in a web thread, it holds
+the GIL, and every other thread of that worker waits until the PDF is done.
+The pool keeps ``PDF_POOL_SIZE`` render processes per web worker instead.
+They are started with ``spawn`` or ``forkserver`` (never a plain fork of a
+process holding database connections), import ReportLab, build the styles
+once (:func:`aura.pdf_render.warm`), and then take jobs over a pipe.  A job
+is a module-level render function plus plain-data arguments, and the reply
+is PDF bytes.  While a render runs, the web thread only waits on the pipe.
+
+* A job may wait for a free worker and then for the render for
+  ``PDF_RENDER_TIMEOUT_SECONDS`` in total.  A worker that overruns is
+  killed and replaced, and the caller gets :class:`PdfPoolUnavailable`.
+* A worker that dies (a crash, an OOM kill) is replaced as well.  Other
+  jobs and workers are not affected.
+* An exception raised by the render function comes back as
+  :class:`PdfRenderError`, and the worker stays.
+* ``PDF_POOL_SIZE=0`` renders inline in the calling thread.
+
+Processes start on first use, or earlier from Gunicorn's
+``post_worker_init`` and the ASGI lifespan, so the first PDF is fast too.
+The counters and queue depth appear under ``pdf_pool`` in ``/api/metrics``.
+"""
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from flask import current_app
+
+_log = logging.getLogger(__name__)
+
+_EXTENSION_KEY = 'aura_pdf_pool'
+
+
+class PdfRenderError(Exception):
+    """The render function raised inside a pool worker."""
+
+
+class PdfPoolUnavailable(PdfRenderError):
+    """No worker produced the PDF in time: a timeout, or the worker died."""
+
+
+def _worker_main(conn):
+    # Ctrl-C reaches the whole process group; let the parent shut us down.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from .pdf_render import warm
+    warm()
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            return  # the parent went away
+        if job is None:
+            return
+        fn, args = job
+        try:
+            reply = (True, fn(*args))
+        except Exception as exc:
+            reply = (False, f'{type(exc).__name__}: {exc}')
+        conn.send(reply)
+
+
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child,), name='aura-pdf', daemon=True)
+        self.process.start()
+        child.close()
+
+    def stop(self, kill=False):
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class PdfRenderPool:
+    """Per-process pool of warm render workers, with counters for /api/metrics."""
+
+    def __init__(self, app):
+        self.app = app
+        self._lock = threading.Lock()
+        self._idle = queue.Queue()
+        self._ctx = None
+        self._pid = None
+        self._waiting = 0
+        self._busy = 0
+        self.counters = {'jobs': 0, 'timeouts': 0, 'crashes': 0, 'errors': 0, 'restarts': 0,
+                         'max_queue_depth': 0}
+        self._max_wait = 0.0
+
+    @property
+    def size(self):
+        return self.app.config.get('PDF_POOL_SIZE', 0)
+
+    @property
+    def started(self):
+        return self._pid == os.getpid()
+
+    def start(self):
+        """Start the workers unless running already (a forked copy starts its own)."""
+        if not self.size:
+            return
+        with self._lock:
+            if self.started:
+                return
+            method = self.app.config.get('PDF_POOL_START_METHOD')
+            if not method:
+                method = ('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods()
+                          else 'spawn')
+            self._ctx = multiprocessing.get_context(method)
+            # Workers inherited through a fork belong to the parent; never share their pipes.
+            self._idle = queue.Queue()
+            self._waiting = self._busy = 0
+            for _ in range(self.size):
+                self._idle.put(_Worker(self._ctx))
+            self._pid = os.getpid()
+        _log.info('Started %d PDF render worker(s) (%s)', self.size, method)
+
+    def close(self):
+        with self._lock:
+            if not self.started:
+                return
+            self._pid = None
+            while True:
+                try:
+                    self._idle.get_nowait().stop()
+                except queue.Empty:
+                    break
+
+    def _replace(self, worker, counter):
+        worker.stop(kill=True)
+        with self._lock:
+            self.counters[counter] += 1
+            self.counters['restarts'] += 1
+        return _Worker(self._ctx)
+
+    def _checkout(self, deadline):
+        with self._lock:
+            self._waiting += 1
+            self.counters['max_queue_depth'] = max(self.counters['max_queue_depth'], self._waiting)
+        queued = time.monotonic()
+        try:
+            worker = self._idle.get(timeout=max(0.0, deadline - queued))
+        except queue.Empty:
+            with self._lock:
+                self.counters['timeouts'] += 1
+            raise PdfPoolUnavailable('no PDF worker became free in time')
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        with self._lock:
+            self._busy += 1
+            self._max_wait = max(self._max_wait, time.monotonic() - queued)
+        if not worker.process.is_alive():  # died while idle
+            worker = self._replace(worker, 'crashes')
+        return worker
+
+    def render(self, fn, *args):
+        """Return ``fn(*args)`` (PDF bytes) computed by a pool worker, or inline."""
+        if not self.size:
+            return fn(*args)
+        self.start()
+        deadline = time.monotonic() + self.app.config.get('PDF_RENDER_TIMEOUT_SECONDS', 30)
+        worker = self._checkout(deadline)
+        try:
+            try:
+                worker.conn.send((fn, args))
+                if not worker.conn.poll(max(0.0, deadline - time.monotonic())):
+                    worker = self._replace(worker, 'timeouts')
+                    raise PdfPoolUnavailable('PDF render timed out')
+                ok, result = worker.conn.recv()
+            except (EOFError, OSError):
+                worker = self._replace(worker, 'crashes')
+                raise PdfPoolUnavailable('PDF worker exited during the render')
+        finally:
+            with self._lock:
+                self._busy -= 1
+                self.counters['jobs'] += 1
+            self._idle.put(worker)
+        if not ok:
+            with self._lock:
+                self.counters['errors'] += 1
+            raise PdfRenderError(result)
+        return result
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'started': self.started,
+                'idle': self._idle.qsize() if self.started else 0,
+                'busy': self._busy,
+                'queue_depth': self._waiting,
+                'max_wait_ms': round(self._max_wait * 1000.0, 1),
+                **self.counters,
+            }
+
+
+def init_pdf_pool(app):
+    app.extensions[_EXTENSION_KEY] = PdfRenderPool(app)
+
+
+def pdf_pool(app=None):
+    return (app or current_app).extensions[_EXTENSION_KEY]
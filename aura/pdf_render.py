@@ -0,0 +1,170 @@
+"""ReportLab layout for AURA's PDFs: plain data records in, PDF bytes out.
+
+Nothing here touches Flask or the database, so the functions can run in the
+warm render processes of :mod:`aura.pdf_pool` as well as inline.  Records
+hold only str, int, float, bool and date values and pickle cheaply.
+"""
+import io
+from datetime import date
+from functools import lru_cache
+from markupsafe import escape
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+from .utils.money import format_amount_pdf as format_amount
+
+_REMINDER_TITLES = {
+    'normal': 'Payment Reminder Notice',
+    'overdue': 'Overdue Payment Reminder',
+    'penalty': 'Overdue Payment Reminder with Penalty',
+}
+
+
+@lru_cache(maxsize=None)
+def _styles():
+    """Paragraph and table styles, built once per process (they are only read)."""
+    sheet = getSampleStyleSheet()
+    return {
+        'body': sheet['Normal'],
+        'reminder_title': ParagraphStyle('Title', parent=sheet['Title'], fontSize=18, spaceAfter=20),
+        'statement_title': ParagraphStyle('Title', parent=sheet['Title'], fontSize=18, spaceAfter=12),
+        'grid': TableStyle([
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 8),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e9ecef')),
+            ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+            ('ALIGN', (4, 0), (-1, -1), 'RIGHT'),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ]),
+    }
+
+
+def render_reminder(record):
+    """Build a milestone payment reminder; ``record`` comes from ``pdf_bp.reminder_record``."""
+    styles = _styles()
+    body_style = styles['body']
+    mode = record['mode']
+    currency = record['currency']
+    today = record['as_of']
+    days_overdue = record['days_overdue']
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter,
+                            rightMargin=inch, leftMargin=inch,
+                            topMargin=inch, bottomMargin=inch)
+
+    due_date_str = record['due_date'].isoformat() if record['due_date'] else 'N/A'
+    delivery_str = record['delivered'].isoformat() if record['delivered'] else 'N/A'
+    story = [
+        Paragraph(_REMINDER_TITLES[mode], styles['reminder_title']),
+        Spacer(1, 0.2 * inch),
+        Paragraph(f'<b>Client:</b> {escape(record["client_name"])}', body_style),
+        Paragraph(f'<b>Contract:</b> {escape(record["contract_name"])}', body_style),
+        Paragraph(f'<b>Milestone:</b> {escape(record["milestone_name"])}', body_style),
+        Paragraph(f'<b>Actual Delivery Date:</b> {delivery_str}', body_style),
+        Paragraph(f'<b>Due Date:</b> {due_date_str}', body_style),
+        Spacer(1, 0.2 * inch),
+    ]
+
+    amount_str = format_amount(record['amount'], currency)
+    story.append(Paragraph(f'<b>Amount Due:</b> {amount_str}', body_style))
+    story.append(Paragraph(f'<b>Status:</b> {record["status_label"]}', body_style))
+
+    if mode in ('overdue', 'penalty') and record['is_overdue']:
+        story.append(Paragraph(f'<b>Days Overdue:</b> {days_overdue}', body_style))
+
+    if mode == 'penalty':
+        if not record['is_overdue']:
+            story.append(Spacer(1, 0.2 * inch))
+            story.append(Paragraph(
+                f'<i>Not overdue as of {today.isoformat()}. Penalty = 0.</i>', body_style))
+        else:
+            penalty_unit = record['penalty_unit']
+            unit_label = 'month(s)' if penalty_unit == 'month' else 'day(s)'
+            story.append(Paragraph(f'<b>Penalty Rate:</b> {record["penalty_rate_percent"]}% per {penalty_unit}', body_style))
+            story.append(Paragraph(f'<b>Penalty Units:</b> {record["penalty_units"]} {unit_label}', body_style))
+            story.append(Paragraph(f'<b>Penalty Amount:</b> {format_amount(record["penalty_amount"], currency)}', body_style))
+            total_payable = record['amount'] + record['penalty_amount']
+            story.append(Paragraph(f'<b>Total Payable:</b> {format_amount(total_payable, currency)}', body_style))
+
+    story.append(Spacer(1, 0.3 * inch))
+
+    reminder_text = (
+        f'This is a formal payment reminder for the above-referenced milestone. '
+        f'According to the terms of the contract, payment of <b>{amount_str}</b> '
+        f'was due on <b>{due_date_str}</b>. '
+    )
+    if days_overdue > 0:
+        reminder_text += (
+            f'This payment is now <b>{days_overdue} days overdue</b>. '
+            f'Please arrange payment at your earliest convenience to avoid further delays.'
+        )
+    else:
+        reminder_text += 'Please ensure payment is made by the due date.'
+    story.append(Paragraph(reminder_text, body_style))
+    story.append(Spacer(1, 0.3 * inch))
+    if today != date.today():
+        story.append(Paragraph(f'As of: {today.isoformat()}', body_style))
+    story.append(Paragraph(f'Generated on: {date.today().isoformat()}', body_style))
+
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def render_statement(client_name, scope, rows, totals, as_of):
+    """Build the statement of account PDF in a single ``doc.build``; return bytes."""
+    styles = _styles()
+    body_style = styles['body']
+    grid = styles['grid']
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter,
+                            rightMargin=0.6 * inch, leftMargin=0.6 * inch,
+                            topMargin=0.75 * inch, bottomMargin=0.75 * inch)
+
+    story = [
+        Paragraph('Statement of Account', styles['statement_title']),
+        Paragraph(f'<b>Client:</b> {escape(client_name)}', body_style),
+        Paragraph(f'<b>Scope:</b> {escape(scope)}', body_style),
+        Paragraph(f'<b>As of:</b> {as_of.isoformat()}', body_style),
+        Spacer(1, 0.2 * inch),
+    ]
+    if rows:
+        # Table cells are plain strings: no markup parsing, and no escaping needed.
+        data = [['Contract', 'Milestone', 'Delivered', 'Due', 'Days Overdue', 'Amount', 'Penalty']]
+        for row in rows:
+            data.append([
+                row['contract'], row['milestone'],
+                row['delivered'].isoformat() if row['delivered'] else 'N/A',
+                row['due'].isoformat() if row['due'] else 'N/A',
+                str(row['days_overdue']) if row['days_overdue'] else '',
+                format_amount(row['amount'], row['currency']),
+                format_amount(row['penalty'], row['currency']) if row['penalty'] else '',
+            ])
+        story.append(Table(data, repeatRows=1, style=grid,
+                           colWidths=[1.5 * inch, 1.5 * inch, 0.75 * inch, 0.75 * inch,
+                                      0.6 * inch, 1.1 * inch, 1.0 * inch]))
+        story.append(Spacer(1, 0.25 * inch))
+        summary = [['Currency', 'Outstanding', 'Of which overdue', 'Penalties', 'Total Payable']]
+        for currency in sorted(totals):
+            t = totals[currency]
+            summary.append([currency, format_amount(t['amount'], currency),
+                            format_amount(t['overdue'], currency),
+                            format_amount(t['penalty'], currency),
+                            format_amount(t['amount'] + t['penalty'], currency)])
+        story.append(Table(summary, style=grid))
+    else:
+        story.append(Paragraph('No outstanding milestones.', body_style))
+    story.append(Spacer(1, 0.3 * inch))
+    story.append(Paragraph(f'Generated on: {date.today().isoformat()}', body_style))
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def warm():
+    """Import and lay out everything a render needs, so the first real job is fast."""
+    _styles()
+    doc = SimpleDocTemplate(io.BytesIO(), pagesize=letter)
+    doc.build([Paragraph('<b>warm</b> <i>up</i>', _styles()['body']),
+               Table([['a', 'b']], style=_styles()['grid'])])
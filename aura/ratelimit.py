@@ -0,0 +1,162 @@
+"""Token-bucket throttling for login attempts.
+
+Every login POST takes one token from a bucket keyed by client IP and one
+from a bucket keyed by username.  Buckets hold ``*_BURST`` tokens and refill
+at ``*_PER_MINUTE``; an empty bucket rejects the attempt *before* the user
+lookup or any PBKDF2 work, so a credential-stuffing burst costs almost no
+CPU.
+
+Two backends are available via ``LOGIN_RATE_LIMIT_BACKEND``:
+
+* ``memory`` (default) — per-process dict; fine for a single worker.
+* ``sqlite`` — a small SQLite file shared by every worker on the host
+  (``LOGIN_RATE_LIMIT_SQLITE_PATH``, default ``instance/ratelimit.db``).
+"""
+import os
+import sqlite3
+import threading
+import time
+from flask import current_app
+
+_EXTENSION_KEY = 'aura_login_limiter'
+# Memory backend: prune idle buckets once this many keys are tracked.
+_MAX_MEMORY_KEYS = 10000
+
+
+def _refill(tokens, updated, capacity, per_second, now):
+    return min(capacity, tokens + (now - updated) * per_second)
+
+
+class MemoryBackend:
+    """Process-local buckets."""
+
+    def __init__(self):
+        self._buckets = {}  # key -> (tokens, updated, seconds until full)
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, per_second, now):
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (capacity, now, 0))
+            tokens = _refill(tokens, updated, capacity, per_second, now)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            full_after = (capacity - tokens) / per_second if per_second else float('inf')
+            self._buckets[key] = (tokens, now, full_after)
+            if len(self._buckets) > _MAX_MEMORY_KEYS:
+                self._prune(now)
+            return allowed
+
+    def _prune(self, now):
+        # A bucket that has refilled completely is indistinguishable from a new one.
+        for key, (_, updated, full_after) in list(self._buckets.items()):
+            if now - updated >= full_after:
+                del self._buckets[key]
+
+
+class SQLiteBackend:
+    """Buckets in a SQLite file shared by all worker processes on the host.
+
+    Each thread keeps one connection.  Buckets that have refilled to capacity
+    are deleted as part of every attempt, so random usernames cannot grow
+    the file without bound.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')  # persistent: once per file
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS rate_buckets (key TEXT PRIMARY KEY, '
+                'tokens REAL NOT NULL, updated REAL NOT NULL, full_at REAL NOT NULL DEFAULT 0)'
+            )
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(rate_buckets)')}
+            if 'full_at' not in columns:  # file from an older release
+                conn.execute('ALTER TABLE rate_buckets ADD COLUMN full_at REAL NOT NULL DEFAULT 0')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_rate_buckets_full_at ON rate_buckets (full_at)')
+        finally:
+            conn.close()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():  # never reuse one across fork
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.pid = os.getpid()
+        return conn
+
+    def consume(self, key, capacity, per_second, now):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # A bucket that has refilled completely is indistinguishable from a new one.
+            conn.execute('DELETE FROM rate_buckets WHERE full_at <= ?', (now,))
+            row = conn.execute('SELECT tokens, updated FROM rate_buckets WHERE key = ?',
+                               (key,)).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens = _refill(tokens, updated, capacity, per_second, now)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            full_at = now + (capacity - tokens) / per_second if per_second else float('inf')
+            conn.execute(
+                'INSERT OR REPLACE INTO rate_buckets (key, tokens, updated, full_at) '
+                'VALUES (?, ?, ?, ?)',
+                (key, tokens, now, full_at),
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed
+
+    def bucket_count(self):
+        return self._connection().execute('SELECT COUNT(*) FROM rate_buckets').fetchone()[0]
+
+
+class LoginLimiter:
+    """Per-IP and per-username login throttle with counters."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.counters = {'allowed': 0, 'throttled_ip': 0, 'throttled_username': 0}
+
+    def _take(self, kind, key, now):
+        config = current_app.config
+        capacity = config[f'LOGIN_{kind}_BURST']
+        if capacity <= 0:
+            return True
+        per_second = config[f'LOGIN_{kind}_PER_MINUTE'] / 60.0
+        return self.backend.consume(f'{kind.lower()}:{key}', capacity, per_second, now)
+
+    def check(self, ip, username):
+        """Return None if the attempt may proceed, else 'ip' or 'username'."""
+        now = time.time()
+        reason = None
+        if not self._take('IP', ip or 'unknown', now):
+            reason = 'ip'
+        elif not self._take('USERNAME', username.lower(), now):
+            reason = 'username'
+        with self._lock:
+            self.counters['throttled_' + reason if reason else 'allowed'] += 1
+        return reason
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+def init_login_limiter(app):
+    if app.config.get('LOGIN_RATE_LIMIT_BACKEND') == 'sqlite':
+        path = (app.config.get('LOGIN_RATE_LIMIT_SQLITE_PATH')
+                or os.path.join(app.instance_path, 'ratelimit.db'))
+        backend = SQLiteBackend(path)
+    else:
+        backend = MemoryBackend()
+    app.extensions[_EXTENSION_KEY] = LoginLimiter(backend)
+
+
+def login_limiter(app=None):
+    return (app or current_app).extensions[_EXTENSION_KEY]
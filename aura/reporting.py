@@ -0,0 +1,232 @@
+"""Set-based receivables reporting queries shared by the CLI and dashboard."""
+from datetime import timedelta
+from sqlalchemy import and_, case, delete, exists, func, insert, literal, null, or_, select, update
+from .extensions import db
+from .models import (
+    Client, Contract, Milestone, Payment, ReceivablesSnapshot,
+    MILESTONE_PENDING, MILESTONE_DELIVERED, MILESTONE_INVOICE_ELIGIBLE, MILESTONE_PAID,
+)
+from .utils.sql import days_between
+
+
+def _receivable_amounts(as_of):
+    """Per-milestone received/pending/overdue amount expressions as of ``as_of``.
+
+    They expect milestones joined to their contract and outer-joined to
+    payments received on or before ``as_of`` (see :func:`_join_receivables`).
+    """
+    paid = Payment.id.isnot(None)
+    eligible = and_(
+        Payment.id.is_(None),
+        Milestone.invoice_eligible.is_(True),
+        or_(Milestone.actual_delivery_date.is_(None),
+            Milestone.actual_delivery_date <= as_of),
+    )
+    overdue = and_(
+        eligible,
+        Milestone.actual_delivery_date.isnot(None),
+        days_between(Milestone.actual_delivery_date, as_of) > Contract.payment_term_days,
+    )
+    return {
+        'received': case((paid, Payment.amount_received), else_=0.0),
+        'pending': case((eligible, Milestone.payment_amount), else_=0.0),
+        'overdue': case((overdue, Milestone.payment_amount), else_=0.0),
+    }
+
+
+def _join_receivables(stmt, as_of, outer=False):
+    stmt = stmt.select_from(Contract)
+    if outer:
+        stmt = stmt.outerjoin(Milestone, Milestone.contract_id == Contract.id)
+    else:
+        stmt = stmt.join(Milestone, Milestone.contract_id == Contract.id)
+    return stmt.outerjoin(Payment, and_(Payment.milestone_id == Milestone.id,
+                                        Payment.received_date <= as_of))
+
+
+def _currency_expr():
+    return func.coalesce(Contract.currency, 'INR')
+
+
+def receivables_totals_select(as_of, user_id=None):
+    """Return a SELECT of received/pending/overdue totals per user and currency.
+
+    Only payments received and deliveries made on or before ``as_of`` count,
+    so the same query yields today's totals or a historical backfill.
+    """
+    currency = _currency_expr()
+    amounts = _receivable_amounts(as_of)
+    stmt = _join_receivables(
+        select(
+            Contract.user_id.label('user_id'),
+            currency.label('currency'),
+            *(func.coalesce(func.sum(expr), 0.0).label(name) for name, expr in amounts.items()),
+        ),
+        as_of,
+    ).group_by(Contract.user_id, currency)
+    if user_id is not None:
+        stmt = stmt.where(Contract.user_id == user_id)
+    return stmt
+
+
+def contract_breakdown_select(user_id, as_of, rates=None):
+    """Return a SELECT of the user's active contracts with their receivables sums.
+
+    Rows carry the ``Contract`` entity plus ``received``/``pending``/``overdue``.
+    When ``rates`` ({currency: rate-or-None}) is given, ``*_base`` columns hold
+    the same sums converted at those rates inside the aggregation; they are
+    NULL for contracts whose currency has no rate.
+    """
+    amounts = _receivable_amounts(as_of)
+    columns = [func.coalesce(func.sum(expr), 0.0).label(name) for name, expr in amounts.items()]
+    if rates is not None:
+        known = {cur: rate for cur, rate in rates.items() if rate is not None}
+        rate = case(known, value=_currency_expr(), else_=null()) if known else null()
+        columns += [func.sum(expr * rate).label(f'{name}_base') for name, expr in amounts.items()]
+    return (
+        _join_receivables(select(Contract, *columns), as_of, outer=True)
+        .where(Contract.user_id == user_id, Contract.archived.is_(False))
+        .group_by(Contract.id)
+        .order_by(Contract.created_at.desc())
+    )
+
+
+def client_rollups_select(user_id, as_of, client_id=None):
+    """Return a SELECT of per-client, per-currency rollups, grouped on ``client_id``.
+
+    Rows carry ``client_id``, ``name``, ``currency``, ``contracts``,
+    ``received``, ``exposure`` (invoiced and unpaid), ``overdue`` and
+    ``avg_days_to_pay`` (delivery to payment, over paid milestones; NULL if
+    none were paid).
+    """
+    amounts = _receivable_amounts(as_of)
+    currency = _currency_expr()
+    days_to_pay = case(
+        (and_(Payment.id.isnot(None), Milestone.actual_delivery_date.isnot(None)),
+         days_between(Milestone.actual_delivery_date, Payment.received_date)),
+        else_=null(),
+    )
+    stmt = (
+        _join_receivables(
+            select(
+                Contract.client_id.label('client_id'),
+                Client.name.label('name'),
+                currency.label('currency'),
+                func.count(func.distinct(Contract.id)).label('contracts'),
+                func.coalesce(func.sum(amounts['received']), 0.0).label('received'),
+                func.coalesce(func.sum(amounts['pending']), 0.0).label('exposure'),
+                func.coalesce(func.sum(amounts['overdue']), 0.0).label('overdue'),
+                func.avg(days_to_pay).label('avg_days_to_pay'),
+            ),
+            as_of, outer=True,
+        )
+        .join(Client, Client.id == Contract.client_id)
+        .where(Contract.user_id == user_id)
+        .group_by(Contract.client_id, Client.name, currency)
+        .order_by(Client.name, Contract.client_id, currency)
+    )
+    if client_id is not None:
+        stmt = stmt.where(Contract.client_id == client_id)
+    return stmt
+
+
+def write_snapshot(as_of):
+    """Replace the receivables snapshot rows for ``as_of``; return the row count.
+
+    Runs as one DELETE plus one INSERT ... SELECT, so re-running the command
+    for the same day is idempotent and costs the same regardless of history.
+    """
+    totals = receivables_totals_select(as_of).subquery()
+    db.session.execute(
+        delete(ReceivablesSnapshot).where(ReceivablesSnapshot.snapshot_date == as_of)
+    )
+    db.session.execute(
+        insert(ReceivablesSnapshot).from_select(
+            ['user_id', 'snapshot_date', 'currency', 'received', 'pending', 'overdue'],
+            select(totals.c.user_id, literal(as_of, type_=db.Date), totals.c.currency,
+                   totals.c.received, totals.c.pending, totals.c.overdue),
+        )
+    )
+    count = db.session.scalar(
+        select(func.count()).select_from(ReceivablesSnapshot)
+        .where(ReceivablesSnapshot.snapshot_date == as_of)
+    )
+    db.session.commit()
+    return count
+
+
+def snapshot_trend_select(user_id, end, days=730):
+    """SELECT of the user's snapshot rows for the ``days`` ending at ``end``, oldest first."""
+    return (
+        select(ReceivablesSnapshot.snapshot_date, ReceivablesSnapshot.currency,
+               ReceivablesSnapshot.received, ReceivablesSnapshot.pending,
+               ReceivablesSnapshot.overdue)
+        .where(ReceivablesSnapshot.user_id == user_id,
+               ReceivablesSnapshot.snapshot_date > end - timedelta(days=days),
+               ReceivablesSnapshot.snapshot_date <= end)
+        .order_by(ReceivablesSnapshot.snapshot_date)
+    )
+
+
+def snapshot_trend(user_id, end, days=730):
+    """Return the user's snapshot rows for the ``days`` ending at ``end``, oldest first."""
+    return db.session.execute(snapshot_trend_select(user_id, end, days)).all()
+
+
+def derived_status_expr():
+    """SQL CASE giving the status implied by a milestone's source fields."""
+    paid = exists().where(Payment.milestone_id == Milestone.id)
+    return case(
+        (paid, MILESTONE_PAID),
+        (Milestone.invoice_eligible.is_(True), MILESTONE_INVOICE_ELIGIBLE),
+        (Milestone.actual_delivery_date.isnot(None), MILESTONE_DELIVERED),
+        else_=MILESTONE_PENDING,
+    )
+
+
+def status_mismatches(limit=None):
+    """Return (milestone_id, stored, expected) rows whose status has drifted."""
+    expected = derived_status_expr()
+    stmt = (
+        select(Milestone.id, Milestone.status, expected.label('expected'))
+        .where(Milestone.status != expected)
+        .order_by(Milestone.id)
+    )
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return db.session.execute(stmt).all()
+
+
+def repair_statuses():
+    """Rewrite every drifted milestone status in one UPDATE; return the row count."""
+    expected = derived_status_expr()
+    result = db.session.execute(
+        update(Milestone).where(Milestone.status != expected).values(status=expected)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def status_counts_select(contract_ids):
+    """SELECT of (contract_id, status, count) rows using the (contract_id, status) index."""
+    return (
+        select(Milestone.contract_id, Milestone.status, func.count())
+        .where(Milestone.contract_id.in_(contract_ids))
+        .group_by(Milestone.contract_id, Milestone.status)
+    )
+
+
+def fold_status_counts(contract_ids, rows):
+    """Turn :func:`status_counts_select` rows into {contract_id: {status: count}}."""
+    counts = {cid: {} for cid in contract_ids}
+    for contract_id, status, count in rows:
+        counts[contract_id][status] = count
+    return counts
+
+
+def status_counts(contract_ids):
+    """Return {contract_id: {status: count}} using the (contract_id, status) index."""
+    if not contract_ids:
+        return {}
+    return fold_status_counts(contract_ids, db.session.execute(status_counts_select(contract_ids)))
@@ -0,0 +1,80 @@
+"""Read-replica routing for AURA.
+
+When ``DATABASE_READ_URL`` is configured a second engine is created for the
+replica and :class:`RoutingSession` sends reads there whenever the current
+app context has opted in:
+
+* safe (GET/HEAD) requests opt in automatically, unless the signed-in
+  client made a successful write within the last ``READ_YOUR_WRITES_SECONDS`` — so a redirect after a
+  POST always sees its own changes even if the replica lags;
+* CLI reporting commands opt in with :func:`reading_from_replica`.
+
+ORM flushes and INSERT/UPDATE/DELETE statements always go to the primary.
+Without a replica every query uses the primary, exactly as before.
+"""
+import time
+from contextlib import contextmanager
+import sqlalchemy as sa
+from flask import current_app, g, has_app_context, request, session
+from flask_sqlalchemy.session import Session
+
+_EXTENSION_KEY = 'aura_replica_engine'
+_SAFE_METHODS = ('GET', 'HEAD')
+_RYW_SESSION_KEY = '_ryw_until'
+
+
+def _replica_requested():
+    return has_app_context() and g.get('_aura_use_replica', False)
+
+
+def replica_engine(app=None):
+    """Return the replica engine for ``app`` (default: current app), or None."""
+    app = app or current_app
+    return app.extensions.get(_EXTENSION_KEY)
+
+
+class RoutingSession(Session):
+    """Session that routes read-only statements to the replica engine."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and _replica_requested()
+                and not getattr(clause, 'is_dml', False)):
+            engine = replica_engine()
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@contextmanager
+def reading_from_replica():
+    """Route reads in the current app context to the replica, if configured."""
+    previous = g.get('_aura_use_replica', False)
+    g._aura_use_replica = True
+    try:
+        yield
+    finally:
+        g._aura_use_replica = previous
+
+
+def init_routing(app):
+    """Create the replica engine and register the per-request routing hooks."""
+    read_uri = app.config.get('SQLALCHEMY_READ_DATABASE_URI')
+    if not read_uri:
+        return
+    app.extensions[_EXTENSION_KEY] = sa.create_engine(
+        read_uri, **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    )
+
+    @app.before_request
+    def _route_reads_to_replica():
+        if request.method in _SAFE_METHODS:
+            g._aura_use_replica = session.get(_RYW_SESSION_KEY, 0) <= time.time()
+
+    @app.after_request
+    def _open_read_your_writes_window(response):
+        # Only signed-in writes that succeeded; anything else would just
+        # cost every anonymous or failed POST a Set-Cookie.
+        if request.method not in _SAFE_METHODS and 'user_id' in session \
+                and response.status_code < 400:
+            session[_RYW_SESSION_KEY] = time.time() + app.config['READ_YOUR_WRITES_SECONDS']
+        return response
@@ -0,0 +1,120 @@
+"""Recurring milestone schedules.
+
+:func:`plan_schedule` turns a :class:`~aura.models.MilestoneSchedule` into
+plain milestone rows without touching the database, which is what the
+preview shows.  :func:`generate_milestones` writes them with one bulk
+INSERT, and :func:`regenerate_milestones` replaces only the schedule's
+future milestones that have not been delivered or paid.
+"""
+import calendar
+from datetime import date, timedelta
+from sqlalchemy import and_, delete, exists, insert, literal, null, select
+from .changes import MILESTONE, milestone_row_payload, record_changes
+from .extensions import db
+from .models import ChangeLog, Milestone, Payment, MILESTONE_PENDING
+
+FREQUENCIES = ('weekly', 'monthly', 'quarterly')
+AMOUNT_MODES = ('per_period', 'split')
+MAX_PERIODS = 120
+
+
+def add_months(d, months):
+    """Return ``d`` shifted by ``months``, clamping the day to the month's end."""
+    month_index = d.month - 1 + months
+    year, month = d.year + month_index // 12, month_index % 12 + 1
+    return d.replace(year=year, month=month, day=min(d.day, calendar.monthrange(year, month)[1]))
+
+
+def period_dates(frequency, start, count=None, end=None):
+    """Dates of a series starting at ``start``, bounded by ``count`` or ``end``."""
+    dates = []
+    for i in range(MAX_PERIODS):
+        if frequency == 'weekly':
+            d = start + timedelta(weeks=i)
+        else:
+            d = add_months(start, i * (3 if frequency == 'quarterly' else 1))
+        if (count is not None and i >= count) or (end is not None and d > end):
+            break
+        dates.append(d)
+    return dates
+
+
+def _label(frequency, d):
+    if frequency == 'weekly':
+        return d.isoformat()
+    return d.strftime('%b %Y')
+
+
+def plan_schedule(schedule):
+    """Return the milestone column dicts the schedule describes (nothing is written)."""
+    dates = period_dates(schedule.frequency, schedule.start_date,
+                         count=schedule.count, end=schedule.end_date)
+    if schedule.amount_mode == 'split' and dates:
+        share = round(schedule.amount / len(dates), 2)
+        amounts = [share] * (len(dates) - 1) + [round(schedule.amount - share * (len(dates) - 1), 2)]
+    else:
+        amounts = [schedule.amount] * len(dates)
+    return [{
+        'contract_id': schedule.contract_id,
+        'schedule_id': schedule.id,
+        'name': f'{schedule.name} – {_label(schedule.frequency, d)}',
+        'planned_delivery_date': d,
+        'payment_amount': amount,
+        'invoice_eligible': False,
+        'penalty_enabled': schedule.penalty_enabled,
+        'penalty_rate_percent': schedule.penalty_rate_percent,
+        'penalty_unit': schedule.penalty_unit,
+        'status': MILESTONE_PENDING,
+    } for d, amount in zip(dates, amounts)]
+
+
+def generate_milestones(schedule, user_id, rows=None):
+    """Insert ``rows`` (default: the full plan) in one statement; return the count.
+
+    The change-log rows go in with a second bulk insert.
+    """
+    rows = plan_schedule(schedule) if rows is None else rows
+    if not rows:
+        return 0
+    ids = db.session.scalars(insert(Milestone).returning(Milestone.id), rows).all()
+    record_changes([
+        (user_id, MILESTONE, milestone_id, 'create', row['contract_id'],
+         milestone_row_payload(milestone_id, row))
+        for milestone_id, row in zip(ids, rows)
+    ])
+    return len(ids)
+
+
+def _replaceable(schedule, today):
+    """Milestones of the schedule that are still in the future and untouched."""
+    return and_(
+        Milestone.schedule_id == schedule.id,
+        Milestone.planned_delivery_date >= today,
+        Milestone.actual_delivery_date.is_(None),
+        ~exists().where(Payment.milestone_id == Milestone.id),
+    )
+
+
+def regenerate_milestones(schedule, user_id, today=None):
+    """Replace the schedule's future, undelivered, unpaid milestones with a fresh plan.
+
+    Milestones already delivered, paid or dated before ``today`` are kept, and
+    planned dates they already cover are skipped.  Returns (removed, added).
+    """
+    today = today or date.today()
+    replaceable = _replaceable(schedule, today)
+    db.session.execute(
+        insert(ChangeLog).from_select(
+            ['user_id', 'entity', 'entity_id', 'contract_id', 'action', 'payload'],
+            select(literal(user_id), literal(MILESTONE), Milestone.id, Milestone.contract_id,
+                   literal('delete'), null()).where(replaceable)
+        )
+    )
+    removed = db.session.execute(
+        delete(Milestone).where(replaceable).execution_options(synchronize_session=False)
+    ).rowcount
+    kept = set(db.session.scalars(
+        select(Milestone.planned_delivery_date).where(Milestone.schedule_id == schedule.id)))
+    rows = [row for row in plan_schedule(schedule)
+            if row['planned_delivery_date'] >= today and row['planned_delivery_date'] not in kept]
+    return removed, generate_milestones(schedule, user_id, rows)
@@ -12,3 +12,55 @@ document.addEventListener('DOMContentLoaded', function () {
     }, ALERT_DISPLAY_TIME);
   });
 });
+
+// Live dashboard: apply totals pushed over Server-Sent Events, or polled
+// from /dashboard/totals when the server refuses another stream (503).
+document.addEventListener('DOMContentLoaded', function () {
+  const anchor = document.querySelector('[data-live-stream]');
+  if (!anchor) { return; }
+  const setText = function (selector, value) {
+    const el = document.querySelector(selector);
+    if (el && value !== undefined) { el.textContent = value; }
+  };
+  const applyContract = function (contract) {
+    const row = document.querySelector('[data-contract-row="' + contract.id + '"]');
+    if (row) {
+      ['received', 'pending', 'overdue'].forEach(function (key) {
+        const cell = row.querySelector('[data-field="' + key + '"]');
+        if (cell) { cell.textContent = contract[key]; }
+      });
+      row.querySelector('[data-field="overdue"]').classList.toggle('overdue', contract.overdue_flag);
+    }
+  };
+  const apply = function (data) {
+    (data.totals || []).forEach(function (t) {
+      ['received', 'pending', 'overdue'].forEach(function (key) {
+        setText('[data-live-total="' + t.currency + '-' + key + '"]', t[key]);
+      });
+    });
+    if (data.consolidated) {
+      ['received', 'pending', 'overdue'].forEach(function (key) {
+        setText('[data-live-total="consolidated-' + key + '"]', data.consolidated[key]);
+      });
+    }
+    if (data.contract) { applyContract(data.contract); }
+    (data.contracts || []).forEach(applyContract);
+  };
+  const poll = function () {
+    const interval = Number(anchor.dataset.livePollSeconds || 30) * 1000;
+    setInterval(function () {
+      if (document.hidden) { return; }
+      fetch(anchor.dataset.livePoll, { credentials: 'same-origin' })
+        .then(function (response) { return response.ok ? response.json() : null; })
+        .then(function (data) { if (data) { apply(data); } })
+        .catch(function () {});
+    }, interval);
+  };
+  if (!window.EventSource) { poll(); return; }
+  const source = new EventSource(anchor.dataset.liveStream);
+  source.addEventListener('update', function (event) { apply(JSON.parse(event.data)); });
+  source.addEventListener('error', function () {
+    // A refused stream (503) is closed for good; a dropped one reconnects.
+    if (source.readyState === EventSource.CLOSED) { poll(); }
+  });
+});
@@ -0,0 +1,64 @@
+"""Request-scoped "as of" date.
+
+Overdue flags, penalties and receivables totals all depend on the current
+date.  :func:`as_of` resolves it once per request — from the ``as_of``
+query parameter when given (``?as_of=2024-03-31``), otherwise today — and
+everything else takes it from there, so a page is consistent with itself
+and can be viewed as of any date, such as a month-end.
+
+While a request carries an explicit ``as_of``, links built with ``url_for``
+to the date-dependent pages keep it, so navigation stays in the same view.
+"""
+from datetime import date
+from flask import abort, has_request_context, request
+
+# Cached in the WSGI environ rather than on ``g``: an app context (and its
+# ``g``) may outlive a single request, e.g. in tests or CLI-driven requests.
+_ENVIRON_KEY = 'aura.as_of'
+
+# Pages whose content depends on the as-of date.
+TIME_TRAVEL_ENDPOINTS = frozenset({
+    'dashboard.index', 'contracts.view_contract',
+    'clients.list_clients', 'clients.view_client',
+    'pdf.generate_pdf', 'pdf.contract_statement',
+    'pdf.client_statement', 'pdf.client_statement_by_id',
+})
+
+
+def _resolve():
+    value = request.args.get('as_of')
+    if not value:
+        return date.today(), False
+    try:
+        return date.fromisoformat(value), True
+    except ValueError:
+        abort(400, 'Invalid as_of date; expected YYYY-MM-DD.')
+
+
+def as_of():
+    """Return the request's as-of date (today outside a request)."""
+    if not has_request_context():
+        return date.today()
+    if _ENVIRON_KEY not in request.environ:
+        request.environ[_ENVIRON_KEY] = _resolve()
+    return request.environ[_ENVIRON_KEY][0]
+
+
+def is_time_travel():
+    """True when the request asked for an explicit ``as_of`` date."""
+    if not has_request_context():
+        return False
+    as_of()
+    return request.environ[_ENVIRON_KEY][1]
+
+
+def init_clock(app):
+    @app.url_defaults
+    def _keep_as_of(endpoint, values):
+        if (endpoint in TIME_TRAVEL_ENDPOINTS and 'as_of' not in values
+                and has_request_context() and is_time_travel()):
+            values['as_of'] = as_of().isoformat()
+
+    @app.context_processor
+    def _as_of_context():
+        return {'as_of': as_of(), 'time_travel': is_time_travel()}
@@ -0,0 +1,73 @@
+"""Rendered-fragment cache for heavy template tables.
+
+Templates wrap a row in a call block keyed by the row's version — the
+values that affect its markup::
+
+    {% call cached_fragment('dashboard-row', c.id, c.contract_name, received) %}
+      <tr>...</tr>
+    {% endcall %}
+
+An unchanged row is served from memory, skipping its ``url_for`` and
+``format_amount`` calls.  Any change to a version value produces a new key,
+so entries never need explicit invalidation; the least recently used ones
+are evicted once ``FRAGMENT_CACHE_SIZE`` is reached.  The cache lives on the
+app (one per worker process) and is safe to share between threads.
+"""
+import threading
+from collections import OrderedDict
+from flask import current_app
+from markupsafe import Markup
+
+_EXTENSION_KEY = 'aura_fragment_cache'
+
+
+class FragmentCache:
+    """Thread-safe LRU mapping of fragment keys to rendered markup."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_render(self, key, render):
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return html
+            self.misses += 1
+        html = Markup(render())
+        with self._lock:
+            self._entries[key] = html
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return html
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+def cached_fragment(name, *version, caller):
+    """Jinja global: render the call block once per (name, *version) key."""
+    cache = current_app.extensions.get(_EXTENSION_KEY)
+    if cache is None:
+        return caller()
+    return cache.get_or_render((name,) + version, caller)
+
+
+def init_fragment_cache(app):
+    """Attach a fragment cache to ``app`` and expose ``cached_fragment`` to templates."""
+    size = app.config.get('FRAGMENT_CACHE_SIZE', 0)
+    if size > 0:
+        app.extensions[_EXTENSION_KEY] = FragmentCache(size)
+    app.jinja_env.globals['cached_fragment'] = cached_fragment
+
+
+def fragment_cache(app=None):
+    """Return the app's :class:`FragmentCache`, or None when disabled."""
+    return (app or current_app).extensions.get(_EXTENSION_KEY)
@@ -0,0 +1,148 @@
+"""Password hashing, cost calibration and transparent rehash-on-login.
+
+Hashes are PBKDF2-HMAC-SHA256 with the per-user iteration count stored next
+to them (``password_iterations``); ``1`` marks a legacy plain SHA-256 hash.
+New hashes use ``PASSWORD_HASH_ITERATIONS``, which ``flask aura
+calibrate-hash`` helps pick for this hardware.  After a successful login
+whose stored hash is cheaper than the configured cost, the password is
+re-hashed off the request thread and written back with a conditional
+UPDATE, so a concurrent password change is never overwritten.
+"""
+import hashlib
+import hmac
+import logging
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from sqlalchemy import update
+
+_log = logging.getLogger(__name__)
+
+DEFAULT_ITERATIONS = 260000
+_EXTENSION_KEY = 'aura_password_hasher'
+
+
+def hash_password(password, salt, iterations):
+    """Hash password using PBKDF2-HMAC-SHA256 (iterations>1) or plain SHA-256 (iterations==1)."""
+    if iterations > 1:
+        return hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), iterations).hex()
+    return hashlib.sha256((salt + password).encode()).hexdigest()
+
+
+def configured_iterations(app=None):
+    return (app or current_app).config.get('PASSWORD_HASH_ITERATIONS', DEFAULT_ITERATIONS)
+
+
+def new_password_hash(password, iterations=None):
+    """Return ``(password_hash, salt, iterations)`` for a fresh random salt."""
+    iterations = iterations or configured_iterations()
+    salt = secrets.token_hex(16)
+    return hash_password(password, salt, iterations), salt, iterations
+
+
+def calibrate(target_ms, probe_iterations=50000, rounds=5):
+    """Return ``(iterations, ms_per_10k)`` so one hash takes about ``target_ms``.
+
+    Uses the fastest of ``rounds`` probes, i.e. the cost on an idle core;
+    under load real logins will take longer.
+    """
+    best = min(_time_hash(probe_iterations) for _ in range(rounds))
+    per_iteration = best / probe_iterations
+    iterations = int(target_ms / 1000.0 / per_iteration)
+    # Round to a readable value; never below two iterations (one means SHA-256).
+    iterations = max(2, round(iterations, -3) if iterations >= 1000 else iterations)
+    return iterations, per_iteration * 10000 * 1000.0
+
+
+def _time_hash(iterations):
+    start = time.perf_counter()
+    hashlib.pbkdf2_hmac('sha256', b'calibration', b'0' * 32, iterations)
+    return time.perf_counter() - start
+
+
+class PasswordHasher:
+    """Verifies passwords, schedules upgrades and keeps timing counters."""
+
+    def __init__(self, app):
+        self.app = app
+        # Created on first use, so a preloading Gunicorn master never owns it.
+        self._executor = None
+        self._lock = threading.Lock()
+        self.counters = {'verified': 0, 'verify_seconds': 0.0, 'verify_max_seconds': 0.0,
+                         'rehash_scheduled': 0, 'rehashed': 0, 'rehash_skipped': 0}
+
+    def verify(self, password, user):
+        """Constant-time password verification."""
+        start = time.perf_counter()
+        expected = hash_password(password, user.salt, user.password_iterations)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.counters['verified'] += 1
+            self.counters['verify_seconds'] += elapsed
+            self.counters['verify_max_seconds'] = max(self.counters['verify_max_seconds'], elapsed)
+        return hmac.compare_digest(expected, user.password_hash)
+
+    def needs_rehash(self, user):
+        return user.password_iterations < configured_iterations(self.app)
+
+    def rehash_if_needed(self, user, password):
+        """Upgrade ``user``'s hash to the configured cost after a successful login."""
+        if not self.needs_rehash(user):
+            return
+        with self._lock:
+            self.counters['rehash_scheduled'] += 1
+        if not self.app.config.get('REHASH_IN_BACKGROUND', True):
+            self._rehash(user.id, user.password_hash, password)
+            return
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1,
+                                                    thread_name_prefix='aura-rehash')
+        self._executor.submit(self._rehash_in_context, user.id, user.password_hash, password)
+
+    def _rehash_in_context(self, user_id, old_hash, password):
+        from ..extensions import db
+        try:
+            with self.app.app_context():
+                try:
+                    self._rehash(user_id, old_hash, password)
+                finally:
+                    db.session.remove()
+        except Exception:
+            _log.exception('Background password rehash failed for user %s', user_id)
+
+    def _rehash(self, user_id, old_hash, password):
+        from ..extensions import db
+        from ..models import User
+        password_hash, salt, iterations = new_password_hash(
+            password, configured_iterations(self.app))
+        result = db.session.execute(
+            update(User)
+            .where(User.id == user_id, User.password_hash == old_hash)
+            .values(password_hash=password_hash, salt=salt, password_iterations=iterations)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        key = 'rehashed' if result.rowcount else 'rehash_skipped'
+        with self._lock:
+            self.counters[key] += 1
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self.counters)
+        total = counters.pop('verify_seconds')
+        verified = counters['verified']
+        counters['verify_avg_ms'] = round(total / verified * 1000.0, 2) if verified else 0.0
+        counters['verify_max_ms'] = round(counters.pop('verify_max_seconds') * 1000.0, 2)
+        counters['iterations'] = configured_iterations(self.app)
+        return counters
+
+
+def init_password_hasher(app):
+    app.extensions[_EXTENSION_KEY] = PasswordHasher(app)
+
+
+def password_hasher(app=None):
+    return (app or current_app).extensions[_EXTENSION_KEY]
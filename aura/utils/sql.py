@@ -0,0 +1,134 @@
+"""Portable SQL expression helpers for AURA.
+
+SQLite and PostgreSQL disagree on date arithmetic, so set-based queries that
+need it use these constructs instead of dialect-specific text.
+"""
+import weakref
+from sqlalchemy import Date, DateTime, Integer, event
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+
+
+class days_between(FunctionElement):
+    """Whole days from ``start`` to ``end`` (``end - start``) as an integer."""
+    type = Integer()
+    inherit_cache = True
+    name = 'days_between'
+
+
+@compiles(days_between)
+def _days_between_default(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return f'({compiler.process(end, **kw)} - {compiler.process(start, **kw)})'
+
+
+@compiles(days_between, 'sqlite')
+def _days_between_sqlite(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return (
+        f'CAST(julianday({compiler.process(end, **kw)}) - '
+        f'julianday({compiler.process(start, **kw)}) AS INTEGER)'
+    )
+
+
+class date_add_days(FunctionElement):
+    """``date`` shifted by ``days`` (an integer, possibly negative) as a date."""
+    type = Date()
+    inherit_cache = True
+    name = 'date_add_days'
+
+
+@compiles(date_add_days)
+def _date_add_days_default(element, compiler, **kw):
+    value, days = list(element.clauses)
+    return f'({compiler.process(value, **kw)} + {compiler.process(days, **kw)})'
+
+
+@compiles(date_add_days, 'sqlite')
+def _date_add_days_sqlite(element, compiler, **kw):
+    value, days = list(element.clauses)
+    return (
+        f"date({compiler.process(value, **kw)}, "
+        f"printf('%+d days', {compiler.process(days, **kw)}))"
+    )
+
+
+class seconds_ago(FunctionElement):
+    """The database's current timestamp minus ``seconds`` (a number)."""
+    type = DateTime()
+    inherit_cache = True
+    name = 'seconds_ago'
+
+
+@compiles(seconds_ago)
+def _seconds_ago_default(element, compiler, **kw):
+    (seconds,) = list(element.clauses)
+    return f'(CURRENT_TIMESTAMP - make_interval(secs => {compiler.process(seconds, **kw)}))'
+
+
+@compiles(seconds_ago, 'sqlite')
+def _seconds_ago_sqlite(element, compiler, **kw):
+    (seconds,) = list(element.clauses)
+    return f"datetime('now', printf('-%f seconds', {compiler.process(seconds, **kw)}))"
+
+
+# engine -> pragmas applied on its connections
+_configured_engines = weakref.WeakKeyDictionary()
+
+
+def _apply_pragmas(pragmas):
+    statements = [f'PRAGMA {name}={value}' for name, value in pragmas.items()]
+
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.close()
+    return on_connect
+
+
+def configure_sqlite(engine, pragmas=None):
+    """Apply ``pragmas`` ({name: value}) on every new SQLite connection.
+
+    ``foreign_keys=ON`` is always included: SQLite leaves foreign keys (and
+    their ON DELETE actions) off by default, per connection.  Returns False
+    (and does nothing) for other dialects or an already configured engine.
+    """
+    if engine.dialect.name != 'sqlite' or engine in _configured_engines:
+        return False
+    pragmas = _configured_engines[engine] = {**(pragmas or {}), 'foreign_keys': 'ON'}
+    event.listen(engine, 'connect', _apply_pragmas(pragmas))
+    return True
+
+
+def optimize_database(engine, vacuum=False):
+    """Refresh planner statistics and reclaim free pages; return a summary dict.
+
+    SQLite: ``ANALYZE`` and ``PRAGMA optimize``, then ``PRAGMA
+    incremental_vacuum`` (or a full ``VACUUM`` with ``vacuum=True``, which
+    also switches an older file to incremental auto-vacuum) and a WAL
+    checkpoint.  PostgreSQL: ``ANALYZE`` (``VACUUM ANALYZE`` with ``vacuum``).
+    """
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        if engine.dialect.name != 'sqlite':
+            conn.exec_driver_sql('VACUUM ANALYZE' if vacuum else 'ANALYZE')
+            return {'dialect': engine.dialect.name, 'vacuum': vacuum}
+        pragma = lambda name: conn.exec_driver_sql(f'PRAGMA {name}').scalar()
+        before = pragma('freelist_count')
+        conn.exec_driver_sql('ANALYZE')
+        conn.exec_driver_sql('PRAGMA optimize')
+        if vacuum:
+            conn.exec_driver_sql('PRAGMA auto_vacuum=INCREMENTAL')
+            conn.exec_driver_sql('VACUUM')
+        elif pragma('auto_vacuum') == 2:  # incremental
+            conn.exec_driver_sql('PRAGMA incremental_vacuum').fetchall()
+        conn.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)')
+        return {
+            'dialect': 'sqlite',
+            'vacuum': vacuum,
+            'journal_mode': pragma('journal_mode'),
+            'auto_vacuum': {0: 'none', 1: 'full', 2: 'incremental'}.get(pragma('auto_vacuum')),
+            'pages': pragma('page_count'),
+            'free_pages_before': before,
+            'free_pages_after': pragma('freelist_count'),
+        }
@@ -65,19 +65,109 @@ def _fix_db_url(url):
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY', 'dev-secret-key')
+    # A relative SQLite path resolves inside the instance folder.
     SQLALCHEMY_DATABASE_URI = _fix_db_url(
-        os.environ.get('DATABASE_URL', 'sqlite:////tmp/aura.db')
+        os.environ.get('DATABASE_URL', 'sqlite:///aura.db')
     )
+    # Applied to every SQLite connection (aura/utils/sql.py).  WAL lets
+    # readers run alongside the single writer; synchronous=NORMAL is
+    # durable in WAL mode except against power loss on the last commits;
+    # busy_timeout makes a second writer wait instead of failing with
+    # "database is locked".  cache_size is negative KiB, per connection.
+    SQLITE_PRAGMAS = {
+        # First, so the pragmas below wait for locks too.
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+        # Before journal_mode: switching to WAL writes the file header, after
+        # which auto_vacuum is ignored.  It only takes effect on a new file
+        # (or after `flask aura optimize --vacuum`).
+        'auto_vacuum': 'INCREMENTAL',
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -int(os.environ.get('SQLITE_CACHE_KIB', '65536')),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_BYTES', str(256 * 1024 * 1024))),
+        'temp_store': 'MEMORY',
+    }
+    # Optional read replica for GET handlers and reporting commands; see
+    # aura/routing.py.  Reads return to the primary for
+    # READ_YOUR_WRITES_SECONDS after a client's own POST.
+    SQLALCHEMY_READ_DATABASE_URI = _fix_db_url(os.environ.get('DATABASE_READ_URL'))
+    READ_YOUR_WRITES_SECONDS = int(os.environ.get('READ_YOUR_WRITES_SECONDS', '5'))
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # `flask aura archive-contracts` archives fully paid contracts whose last
+    # payment is older than this many days.
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '365'))
+    # Compiled-template cache in the instance folder, and the number of
+    # rendered table rows kept in memory per worker (0 disables).
+    JINJA_BYTECODE_CACHE = True
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', '10000'))
+    # Content-hashed static URLs with immutable caching (aura/assets.py) and
+    # gzip/brotli for HTML/JSON bodies of at least COMPRESS_MIN_SIZE bytes.
+    STATIC_FINGERPRINT = True
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', '1024'))
+    COMPRESS_LEVEL = 6
+    # Currency the dashboard consolidates into (override per view with ?base=).
+    BASE_CURRENCY = os.environ.get('BASE_CURRENCY', 'INR')
+    # /api/changes holds back changes younger than this many seconds, so a
+    # sync cursor never passes a row whose transaction commits later.  Keep
+    # it above twice the longest write transaction.  Unset: 0 on SQLite
+    # (writers commit in id order), 5 on other databases.
+    CHANGE_FEED_LAG_SECONDS = os.environ.get('CHANGE_FEED_LAG_SECONDS')
+    # Live dashboard (SSE): keep-alive interval, and how long one stream may
+    # hold a worker thread before the browser is told to reconnect.
+    SSE_HEARTBEAT_SECONDS = 15
+    SSE_MAX_SECONDS = int(os.environ.get('SSE_MAX_SECONDS', '300'))
+    # Open streams allowed per worker process and per user.  Each holds a
+    # thread (GUNICORN_THREADS); refused pages poll every SSE_POLL_SECONDS.
+    SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', '1'))
+    SSE_MAX_STREAMS_PER_USER = int(os.environ.get('SSE_MAX_STREAMS_PER_USER', '1'))
+    SSE_POLL_SECONDS = int(os.environ.get('SSE_POLL_SECONDS', '30'))
+    # PBKDF2 cost for new hashes; see `flask aura calibrate-hash`.  Cheaper
+    # stored hashes are upgraded on the next successful login.
+    PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', '260000'))
+    REHASH_IN_BACKGROUND = True
+    # Login throttling (aura/ratelimit.py).  A burst of 0 disables that bucket.
+    LOGIN_RATE_LIMIT_BACKEND = os.environ.get('LOGIN_RATE_LIMIT_BACKEND', 'memory')
+    LOGIN_RATE_LIMIT_SQLITE_PATH = os.environ.get('LOGIN_RATE_LIMIT_SQLITE_PATH')
+    LOGIN_IP_BURST = int(os.environ.get('LOGIN_IP_BURST', '20'))
+    LOGIN_IP_PER_MINUTE = float(os.environ.get('LOGIN_IP_PER_MINUTE', '10'))
+    LOGIN_USERNAME_BURST = int(os.environ.get('LOGIN_USERNAME_BURST', '5'))
+    LOGIN_USERNAME_PER_MINUTE = float(os.environ.get('LOGIN_USERNAME_PER_MINUTE', '2'))
+    # Slow-request log and per-request profiler (aura/diagnostics.py).
+    # SLOW_REQUEST_MS=0 disables the log; PROFILE_TOKEN unset disables the header.
+    SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', '1000'))
+    SLOW_REQUEST_TOP_STATEMENTS = int(os.environ.get('SLOW_REQUEST_TOP_STATEMENTS', '3'))
+    PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+    # Warm PDF render processes per web worker (aura/pdf_pool.py); 0 renders
+    # inline.  A render that cannot finish (queue wait included) within the
+    # timeout answers 503.
+    PDF_POOL_SIZE = int(os.environ.get('PDF_POOL_SIZE', '1'))
+    PDF_RENDER_TIMEOUT_SECONDS = float(os.environ.get('PDF_RENDER_TIMEOUT_SECONDS', '30'))
+    PDF_POOL_START_METHOD = os.environ.get('PDF_POOL_START_METHOD')  # spawn / forkserver
+    # Optional ASGI mode (asgi.py, aura/asgi.py): threads for the routes still
+    # served by Flask.
+    ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', '10'))
+    # Number of reverse proxies in front of the app (1 on Render) whose
+    # X-Forwarded-For is trusted, so the IP bucket sees real client addresses.
+    PROXY_FIX_HOPS = int(os.environ.get('PROXY_FIX_HOPS', '0'))
+    # Validate pooled connections before use: with several workers and
+    # threads, connections sit idle long enough for Postgres/Supabase to
+    # drop them.
+    SQLALCHEMY_ENGINE_OPTIONS = {'pool_pre_ping': True}
 
 
 class DevelopmentConfig(Config):
     DEBUG = True
+    # Static files change while developing; keep plain URLs.
+    STATIC_FINGERPRINT = False
 
 
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_READ_DATABASE_URI = None
+    REHASH_IN_BACKGROUND = False
+    PDF_POOL_SIZE = 0
 
 
 class ProductionConfig(Config):
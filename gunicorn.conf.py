@@ -0,0 +1,50 @@
+"""Gunicorn settings for AURA.
+
+Defaults to threaded (``gthread``) workers so a slow PDF render or PBKDF2
+login no longer blocks every other request.  All values can be overridden
+from the environment:
+
+  WEB_CONCURRENCY   number of worker processes (default 2)
+  GUNICORN_THREADS  threads per worker (default 4)
+  GUNICORN_TIMEOUT  worker timeout in seconds (default 120)
+  GUNICORN_PRELOAD  "true" to import the app once in the master before forking
+
+The app keeps no module-level mutable state: each request gets its own
+scoped SQLAlchemy session (Flask-SQLAlchemy removes it at teardown) and
+per-request data lives on ``flask.g``.  The only shared objects are the
+engine connection pools, which are thread-safe and are re-created in each
+worker after fork (see ``post_fork``).  Each worker also starts its own warm
+PDF render processes (``PDF_POOL_SIZE``, see ``post_worker_init``).
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+worker_class = 'gthread' if threads > 1 else 'sync'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '').lower() == 'true'
+
+
+def post_fork(server, worker):
+    """Drop pooled connections inherited from the master process.
+
+    Only relevant with ``preload_app``: a connection opened in the master
+    (e.g. by INIT_DB bootstrapping) must never be shared by two workers.
+    ``close=False`` leaves the parent's sockets alone and just forgets them.
+    """
+    if not preload_app:
+        return
+    import run
+    from aura.extensions import db
+    from aura.routing import replica_engine
+    with run.app.app_context():
+        engines = list(db.engines.values()) + [replica_engine()]
+        for engine in filter(None, engines):
+            engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    """Start this worker's PDF render processes before it accepts requests."""
+    from aura.pdf_pool import pdf_pool
+    pdf_pool(worker.wsgi).start()
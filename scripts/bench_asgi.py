@@ -0,0 +1,208 @@
+"""Compare concurrent-request throughput of the sync (Gunicorn) and ASGI (uvicorn) modes.
+
+Each mode seeds a fresh SQLite database and serves it from one worker
+process: Gunicorn ``gthread`` with ``--threads`` threads for ``sync``, uvicorn
+with the ``asgi.py`` app for ``asgi``.  ``--concurrency`` clients then request the
+read-heavy pages in rotation for ``--duration`` seconds:
+dashboard, contract list, client list, change feed and health.  Requests
+per second and latency percentiles are printed for each mode.
+
+A local SQLite file answers in microseconds, which is not what a hosted
+database does.  ``--db-latency-ms`` adds that round trip to every statement
+the server runs, as a sleep in SQLite's trace callback.  The sleep happens
+on the thread that executes the statement: the request thread in sync mode,
+aiosqlite's connection thread in ASGI mode.  This is where async pays off.
+
+    python scripts/bench_asgi.py [--concurrency 50] [--duration 10] [--db-latency-ms 5]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SECRET_KEY = 'bench-secret'
+CONTRACTS, MILESTONES_PER_CONTRACT = 50, 10
+PATHS = ('/dashboard', '/contracts', '/clients', '/api/changes', '/api/health')
+MODES = ('sync', 'asgi')
+
+
+def _add_latency(engine, seconds):
+    """Sleep ``seconds`` whenever a connection of ``engine`` runs a statement."""
+    from sqlalchemy import event
+    from sqlalchemy.util import await_only
+
+    def trace(statement):
+        time.sleep(seconds)
+
+    def on_connect(dbapi_connection, connection_record):
+        driver = getattr(dbapi_connection, 'driver_connection', dbapi_connection)
+        if isinstance(driver, sqlite3.Connection):
+            driver.set_trace_callback(trace)
+        else:  # aiosqlite: set it on its own thread
+            await_only(driver.set_trace_callback(trace))
+    event.listen(engine, 'connect', on_connect)
+
+
+def _seed(app):
+    import sqlalchemy as sa
+    from aura.extensions import db
+    from aura.models import Contract, Milestone, User
+    with app.app_context():
+        db.create_all()
+        with db.engine.begin() as conn:
+            conn.execute(sa.insert(User).values(id=1, username='bench', password_hash='x', salt='s'))
+            conn.execute(sa.insert(Contract), [
+                {'id': c, 'user_id': 1, 'client_name': f'Client {c % 10}',
+                 'contract_name': f'Contract {c}', 'start_date': date(2024, 1, 1),
+                 'total_value': 10000.0, 'payment_term_days': 30, 'currency': 'INR'}
+                for c in range(1, CONTRACTS + 1)])
+            conn.execute(sa.insert(Milestone), [
+                {'contract_id': c, 'name': f'M{i}', 'payment_amount': 1000.0,
+                 'planned_delivery_date': date(2024, 1, 1) + timedelta(days=30 * i),
+                 'actual_delivery_date': date(2024, 1, 1) + timedelta(days=30 * i) if i < 5 else None,
+                 'invoice_eligible': i < 5, 'penalty_enabled': False, 'penalty_rate_percent': 0.0,
+                 'penalty_unit': 'day', 'status': 'invoice_eligible' if i < 5 else 'pending'}
+                for c in range(1, CONTRACTS + 1) for i in range(MILESTONES_PER_CONTRACT)])
+        from aura.clients import backfill_clients
+        with db.engine.begin() as conn:
+            backfill_clients(conn)
+
+
+def serve(mode, port, latency):
+    """Child process: build the app on DATABASE_URL and serve it on ``port``."""
+    from aura import create_app
+    from aura.extensions import db
+    app = create_app('production')
+    app.config.update(SLOW_REQUEST_MS=0, FRAGMENT_CACHE_SIZE=0)
+    if mode == 'sync':
+        from gunicorn.app.base import BaseApplication
+        with app.app_context():
+            _add_latency(db.engine, latency)
+
+        threads = int(os.environ['GUNICORN_THREADS'])
+
+        class Server(BaseApplication):
+            def load_config(self):
+                for key, value in {'bind': f'127.0.0.1:{port}', 'workers': 1, 'threads': threads,
+                                   'worker_class': 'gthread', 'loglevel': 'warning'}.items():
+                    self.cfg.set(key, value)
+
+            def load(self):
+                return app
+        Server().run()
+    else:
+        import uvicorn
+        from aura.asgi import async_backend, create_asgi_app
+        asgi_app = create_asgi_app(app)
+        _add_latency(async_backend(app).engine.sync_engine, latency)
+        uvicorn.run(asgi_app, host='127.0.0.1', port=port, log_level='warning', access_log=False)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _session_cookie():
+    from aura import create_app
+    app = create_app('production')
+    app.config['SECRET_KEY'] = SECRET_KEY
+    return app.session_interface.get_signing_serializer(app).dumps({'user_id': 1})
+
+
+async def _load(port, concurrency, duration, cookie):
+    import httpx
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+
+    async def client(offset):
+        nonlocal errors
+        async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}',
+                                     cookies={'session': cookie}, timeout=60) as http:
+            i = offset
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await http.get(PATHS[i % len(PATHS)])
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+                i += 1
+
+    await asyncio.gather(*(client(n) for n in range(concurrency)))
+    return latencies, errors
+
+
+def _wait_for(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+def run(mode, concurrency, duration, latency_ms, threads):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, 'DATABASE_URL': f'sqlite:///{os.path.join(tmp, "bench.db")}',
+               'SECRET_KEY': SECRET_KEY, 'GUNICORN_THREADS': str(threads),
+               'ASGI_WSGI_THREADS': str(threads), 'INIT_DB': ''}
+        subprocess.run([sys.executable, __file__, '--seed'], env=env, check=True)
+        port = _free_port()
+        server = subprocess.Popen([sys.executable, __file__, '--serve', mode, '--port', str(port),
+                                   '--db-latency-ms', str(latency_ms)], env=env)
+        try:
+            _wait_for(port)
+            asyncio.run(_load(port, 5, 1.0, _session_cookie()))  # warm-up
+            latencies, errors = asyncio.run(_load(port, concurrency, duration, _session_cookie()))
+        finally:
+            server.terminate()
+            server.wait()
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000.0
+    print(f'{mode:>5}: {len(latencies) / duration:8.1f} req/s  p50 {pct(0.5):7.1f} ms  '
+          f'p95 {pct(0.95):7.1f} ms  mean {statistics.fmean(latencies) * 1000.0:7.1f} ms  '
+          f'{errors} errors  ({concurrency} clients, {latency_ms} ms/statement, {duration:.0f}s)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--db-latency-ms', type=float, default=5.0)
+    parser.add_argument('--threads', type=int, default=4,
+                        help='Gunicorn threads (sync) and Flask fallback threads (asgi).')
+    parser.add_argument('--mode', choices=MODES, action='append', help='Mode(s) to run (default: both).')
+    parser.add_argument('--seed', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--serve', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.seed:
+        from aura import create_app
+        _seed(create_app('production'))
+    elif args.serve:
+        serve(args.serve, args.port, args.db_latency_ms / 1000.0)
+    else:
+        for mode in args.mode or MODES:
+            run(mode, args.concurrency, args.duration, args.db_latency_ms, args.threads)
+
+
+if __name__ == '__main__':
+    main()
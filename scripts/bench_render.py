@@ -0,0 +1,134 @@
+"""Measure template render time for 1,000-row dashboard and milestone tables.
+
+Compares rendering with the fragment cache disabled, on a cold cache (first
+render, every row a miss) and on a warm cache (unchanged rows served from
+memory), and template load time with and without the Jinja bytecode cache.
+
+    python scripts/bench_render.py [--rows 1000] [--repeat 5]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import render_template, session  # noqa: E402
+from aura import create_app  # noqa: E402
+from aura.extensions import db  # noqa: E402
+from aura.models import User, Contract, Milestone, Payment  # noqa: E402
+from aura.utils.fragments import fragment_cache  # noqa: E402
+
+_TEMPLATES = ('base.html', 'dashboard/index.html', 'contracts/detail.html')
+
+
+def _seed(rows):
+    user = User(username='bench', password_hash='x', salt='x')
+    db.session.add(user)
+    db.session.flush()
+    today = date.today()
+    breakdown = []
+    for i in range(rows):
+        c = Contract(user_id=user.id, client_name=f'Client {i}', contract_name=f'Contract {i}',
+                     start_date=today - timedelta(days=365), total_value=1000.0,
+                     currency=('INR', 'USD')[i % 2])
+        db.session.add(c)
+        breakdown.append({'contract': c, 'received': 100.0 * i, 'pending': 50.0 * i,
+                          'overdue': 10.0 * (i % 3), 'currency': c.currency})
+    big = Contract(user_id=user.id, client_name='Big Client', contract_name='Big Contract',
+                   start_date=today - timedelta(days=365), total_value=1000.0 * rows)
+    db.session.add(big)
+    db.session.flush()
+    for j in range(rows):
+        delivered = today - timedelta(days=j % 90) if j % 4 else None
+        m = Milestone(contract_id=big.id, name=f'Milestone {j}', planned_delivery_date=today,
+                      payment_amount=1000.0, actual_delivery_date=delivered,
+                      invoice_eligible=delivered is not None,
+                      penalty_enabled=j % 2 == 0, penalty_rate_percent=1.0)
+        db.session.add(m)
+        if j % 5 == 1:
+            db.session.flush()
+            db.session.add(Payment(milestone_id=m.id, received_date=today, amount_received=1000.0))
+    db.session.commit()
+    # Warm relationships so the timings measure rendering, not lazy loads.
+    for m in big.milestones:
+        _ = m.payment
+    return user.id, breakdown, big
+
+
+def _time(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def bench_rendering(rows, repeat):
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        user_id, breakdown, big = _seed(rows)
+        pages = {
+            'dashboard': lambda: render_template(
+                'dashboard/index.html', currency_summary=[], contract_breakdown=breakdown,
+                trend_charts=[], trend_width=600, trend_height=120),
+            'detail': lambda: render_template(
+                'contracts/detail.html', contract=big, today=date.today()),
+        }
+        cache = fragment_cache(app)
+        results = {}
+        with app.test_request_context('/'):
+            session['user_id'] = user_id
+            for name, render in pages.items():
+                app.extensions.pop('aura_fragment_cache')
+                uncached = _time(render, repeat)
+                app.extensions['aura_fragment_cache'] = cache
+                cache.clear()
+                cold = _time(render, 1)
+                warm = _time(render, repeat)
+                results[name] = (uncached, cold, warm)
+    return results
+
+
+def bench_template_loading(repeat):
+    cache_dir = tempfile.mkdtemp(prefix='aura-jinja-')
+    try:
+        from jinja2 import FileSystemBytecodeCache
+
+        def load(with_cache):
+            app = create_app('testing')
+            if with_cache:
+                app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+            else:
+                app.jinja_env.bytecode_cache = None
+            for name in _TEMPLATES:
+                app.jinja_env.get_template(name)
+
+        load(True)  # populate the bytecode cache
+        return _time(lambda: load(False), repeat), _time(lambda: load(True), repeat)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print(f'{args.rows}-row tables, best of {args.repeat} (ms)')
+    print(f"{'page':>10} {'no cache':>10} {'cold':>10} {'warm':>10}")
+    for name, (uncached, cold, warm) in bench_rendering(args.rows, args.repeat).items():
+        print(f'{name:>10} {uncached:>10.1f} {cold:>10.1f} {warm:>10.1f}')
+    compile_ms, bytecode_ms = bench_template_loading(args.repeat)
+    print(f'template load (app factory + {len(_TEMPLATES)} templates): '
+          f'compile {compile_ms:.1f} ms, bytecode cache {bytecode_ms:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
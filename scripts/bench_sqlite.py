@@ -0,0 +1,126 @@
+"""Compare concurrent SQLite throughput with and without the tuned pragmas.
+
+Each run seeds a fresh database file and starts ``--processes`` worker
+processes, standing in for Gunicorn workers.  For ``--duration`` seconds
+they issue a mix of dashboard-style reads (the real
+``contract_breakdown_select``) and small write transactions (a milestone
+plus its change-log row).  Then the operations per second and failures
+(``database is locked``) are reported for each profile:
+
+* ``baseline`` — SQLite defaults (rollback journal, ``synchronous=FULL``)
+  with only ``foreign_keys=ON``, as before the tuned profile.
+* ``tuned`` — ``SQLITE_PRAGMAS`` from config.py.
+
+    python scripts/bench_sqlite.py [--processes 4] [--duration 10] [--write-ratio 0.2]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlalchemy as sa  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+from config import Config  # noqa: E402
+from aura.extensions import db  # noqa: E402
+from aura.models import ChangeLog, Contract, Milestone, User  # noqa: E402
+from aura.reporting import contract_breakdown_select  # noqa: E402
+from aura.utils.sql import configure_sqlite  # noqa: E402
+
+PROFILES = {'baseline': {}, 'tuned': Config.SQLITE_PRAGMAS}
+USERS, CONTRACTS_PER_USER, MILESTONES_PER_CONTRACT = 10, 20, 10
+
+
+def _engine(path, profile):
+    engine = sa.create_engine(f'sqlite:///{path}')
+    configure_sqlite(engine, PROFILES[profile])
+    return engine
+
+
+def _seed(engine):
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(sa.insert(User), [{'id': u, 'username': f'u{u}', 'password_hash': 'x',
+                                        'salt': 's'} for u in range(1, USERS + 1)])
+        conn.execute(sa.insert(Contract), [
+            {'id': c, 'user_id': c % USERS + 1, 'client_name': 'Client', 'contract_name': f'C{c}',
+             'start_date': date(2024, 1, 1), 'total_value': 1000.0, 'payment_term_days': 30,
+             'currency': 'INR'} for c in range(1, USERS * CONTRACTS_PER_USER + 1)])
+        conn.execute(sa.insert(Milestone), [
+            {'contract_id': c, 'name': f'M{i}', 'payment_amount': 100.0,
+             'planned_delivery_date': date(2024, 1, 1) + timedelta(days=30 * i),
+             'actual_delivery_date': date(2024, 1, 1) + timedelta(days=30 * i) if i < 5 else None,
+             'invoice_eligible': i < 5, 'penalty_enabled': False, 'penalty_rate_percent': 0.0,
+             'penalty_unit': 'day', 'status': 'invoice_eligible' if i < 5 else 'pending'}
+            for c in range(1, USERS * CONTRACTS_PER_USER + 1) for i in range(MILESTONES_PER_CONTRACT)])
+
+
+def _worker(path, profile, duration, write_ratio, results):
+    engine = _engine(path, profile)
+    rng = random.Random(os.getpid())
+    reads = writes = failures = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        user_id = rng.randint(1, USERS)
+        try:
+            with Session(engine) as session:
+                if rng.random() < write_ratio:
+                    contract_id = rng.randint(1, USERS * CONTRACTS_PER_USER)
+                    session.execute(sa.insert(Milestone).values(
+                        contract_id=contract_id, name='bench', payment_amount=1.0,
+                        planned_delivery_date=date(2025, 1, 1), penalty_enabled=False,
+                        penalty_rate_percent=0.0, penalty_unit='day', status='pending'))
+                    session.execute(sa.insert(ChangeLog).values(
+                        user_id=user_id, entity='milestone', entity_id=0,
+                        contract_id=contract_id, action='create'))
+                    session.commit()
+                    writes += 1
+                else:
+                    session.execute(contract_breakdown_select(user_id, date(2024, 6, 1))).all()
+                    reads += 1
+        except OperationalError:
+            failures += 1
+    engine.dispose()
+    results.put((reads, writes, failures))
+
+
+def run(profile, processes, duration, write_ratio):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        engine = _engine(path, profile)
+        _seed(engine)
+        engine.dispose()
+        results = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=_worker,
+                                           args=(path, profile, duration, write_ratio, results))
+                   for _ in range(processes)]
+        for w in workers:
+            w.start()
+        totals = [sum(col) for col in zip(*(results.get() for _ in workers))]
+        for w in workers:
+            w.join()
+    reads, writes, failures = totals
+    print(f'{profile:>9}: {reads / duration:8.0f} reads/s  {writes / duration:7.0f} writes/s  '
+          f'{failures:5d} failed ({processes} processes, {duration:.0f}s)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--profile', choices=sorted(PROFILES), action='append',
+                        help='Profile(s) to run (default: all).')
+    args = parser.parse_args()
+    for profile in args.profile or ('baseline', 'tuned'):
+        run(profile, args.processes, args.duration, args.write_ratio)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+"""Local load test for AURA.
+
+Drives a running AURA instance with a weighted mix of login, dashboard,
+contract-detail and PDF requests from concurrent virtual users and reports
+throughput and latency percentiles.  With ``--serve`` it starts gunicorn
+itself for each ``WORKERSxTHREADS`` combination so scaling can be compared
+in one run.
+
+Examples::
+
+    # Seed a throwaway SQLite database and compare worker/thread layouts.
+    DATABASE_URL=sqlite:////tmp/aura-load.db python scripts/loadtest.py \\
+        --seed --serve 1x1,2x1,2x4,4x4 --duration 20
+
+    # Hit an already running server.
+    python scripts/loadtest.py --base-url http://127.0.0.1:8000 \\
+        --username loadtest --password loadtest-pass
+
+Only the standard library is used on the client side.
+"""
+import argparse
+import http.cookiejar
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MIX = 'login=1,dashboard=5,detail=3,pdf=1'
+_CONTRACT_RE = re.compile(r'/contracts/(\d+)"')
+_PDF_RE = re.compile(r'/milestones/(\d+)/pdf')
+
+
+def parse_mix(spec):
+    """Parse ``name=weight,...`` into a list of (name, weight) pairs."""
+    mix = []
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ('login', 'dashboard', 'detail', 'pdf'):
+            raise ValueError(f'Unknown request type: {name!r}')
+        mix.append((name, int(weight or 1)))
+    return mix
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list (0.0 for empty input)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarise(samples, elapsed):
+    """Reduce (kind, seconds, ok) samples to throughput and latency figures."""
+    latencies = sorted(s for _, s, ok in samples if ok)
+    per_kind = {}
+    for kind, seconds, ok in samples:
+        per_kind.setdefault(kind, []).append(seconds)
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, _, ok in samples if not ok),
+        'rps': len(samples) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'per_kind_p95_ms': {
+            kind: percentile(sorted(values), 95) * 1000
+            for kind, values in sorted(per_kind.items())
+        },
+    }
+
+
+class VirtualUser:
+    """One logged-in browser session issuing requests from the mix."""
+
+    def __init__(self, base_url, username, password):
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+
+    def _get(self, path):
+        with self.opener.open(self.base_url + path, timeout=60) as resp:
+            return resp.status, resp.read()
+
+    def login(self):
+        data = urllib.parse.urlencode(
+            {'username': self.username, 'password': self.password}
+        ).encode()
+        with self.opener.open(self.base_url + '/login', data=data, timeout=60) as resp:
+            body = resp.read()
+            return resp.status, body
+
+    def discover(self):
+        """Return (contract_ids, milestone_ids) reachable by this user."""
+        _, body = self._get('/contracts')
+        contract_ids = sorted(set(_CONTRACT_RE.findall(body.decode())))
+        milestone_ids = []
+        for cid in contract_ids[:10]:
+            _, detail = self._get(f'/contracts/{cid}')
+            milestone_ids.extend(_PDF_RE.findall(detail.decode()))
+        return contract_ids, sorted(set(milestone_ids))
+
+    def request(self, kind, contract_ids, milestone_ids):
+        if kind == 'login':
+            return self.login()
+        if kind == 'detail' and contract_ids:
+            return self._get(f'/contracts/{random.choice(contract_ids)}')
+        if kind == 'pdf' and milestone_ids:
+            return self._get(f'/milestones/{random.choice(milestone_ids)}/pdf')
+        return self._get('/dashboard')
+
+
+def run_load(base_url, username, password, concurrency, duration, mix):
+    """Run the mix for ``duration`` seconds with ``concurrency`` users."""
+    probe = VirtualUser(base_url, username, password)
+    status, body = probe.login()
+    if b'Dashboard' not in body:
+        raise SystemExit(f'Login as {username!r} failed (HTTP {status}).')
+    contract_ids, milestone_ids = probe.discover()
+
+    kinds = [name for name, weight in mix for _ in range(weight)]
+    samples = []
+    samples_lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        user = VirtualUser(base_url, username, password)
+        user.login()
+        local = []
+        while time.perf_counter() < deadline:
+            kind = random.choice(kinds)
+            started = time.perf_counter()
+            try:
+                status, _ = user.request(kind, contract_ids, milestone_ids)
+                ok = status == 200
+            except (urllib.error.URLError, OSError):
+                ok = False
+            local.append((kind, time.perf_counter() - started, ok))
+        with samples_lock:
+            samples.extend(local)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return summarise(samples, time.perf_counter() - started)
+
+
+def seed(username, password, contracts=20, milestones=10):
+    """Create the load-test user and data in the configured DATABASE_URL."""
+    sys.path.insert(0, ROOT)
+    from datetime import date, timedelta
+    from aura import create_app
+    from aura.extensions import db
+    from aura.models import User, Contract, Milestone, Payment
+    from aura.utils.passwords import DEFAULT_ITERATIONS, hash_password
+
+    app = create_app('production')
+    with app.app_context():
+        db.create_all()
+        if User.query.filter_by(username=username).first():
+            return
+        user = User(username=username, salt='loadtest',
+                    password_hash=hash_password(password, 'loadtest', DEFAULT_ITERATIONS),
+                    password_iterations=DEFAULT_ITERATIONS)
+        db.session.add(user)
+        db.session.flush()
+        today = date.today()
+        for i in range(contracts):
+            contract = Contract(user_id=user.id, client_name=f'Client {i % 7}',
+                                contract_name=f'Load Contract {i}',
+                                start_date=today - timedelta(days=400),
+                                total_value=10000.0 * milestones,
+                                currency=('INR', 'USD')[i % 2])
+            db.session.add(contract)
+            db.session.flush()
+            for j in range(milestones):
+                delivered = today - timedelta(days=10 * j)
+                ms = Milestone(contract_id=contract.id, name=f'Milestone {j}',
+                               planned_delivery_date=delivered, payment_amount=10000.0,
+                               actual_delivery_date=delivered, invoice_eligible=True,
+                               penalty_enabled=j % 3 == 0, penalty_rate_percent=0.5)
+                db.session.add(ms)
+                if j % 2:
+                    db.session.flush()
+                    db.session.add(Payment(milestone_id=ms.id, received_date=today,
+                                           amount_received=10000.0))
+        db.session.commit()
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def serve(workers, threads):
+    """Start gunicorn with the given layout and yield its base URL."""
+    port = _free_port()
+    # Every virtual user logs in from 127.0.0.1, so login throttling is off.
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(workers),
+               GUNICORN_THREADS=str(threads), LOGIN_IP_BURST='0', LOGIN_USERNAME_BURST='0')
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'run:app', '--config', 'gunicorn.conf.py',
+         '--bind', f'127.0.0.1:{port}', '--log-level', 'warning'],
+        cwd=ROOT, env=env,
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.2)
+        else:
+            raise SystemExit('gunicorn did not start within 30s')
+        yield f'http://127.0.0.1:{port}'
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def _print_row(label, result):
+    kinds = ' '.join(f'{k}={v:.0f}' for k, v in result['per_kind_p95_ms'].items())
+    print(f"{label:>10} {result['requests']:>8} {result['errors']:>6} {result['rps']:>8.1f} "
+          f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f}  {kinds}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--username', default='loadtest')
+    parser.add_argument('--password', default='loadtest-pass')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=15.0)
+    parser.add_argument('--mix', default=DEFAULT_MIX,
+                        help=f'Weighted request mix (default: {DEFAULT_MIX}).')
+    parser.add_argument('--seed', action='store_true',
+                        help='Create the load-test user and sample data first.')
+    parser.add_argument('--serve', default='',
+                        help='Comma-separated WORKERSxTHREADS layouts to start with gunicorn.')
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    if args.seed:
+        seed(args.username, args.password)
+
+    print(f"{'layout':>10} {'requests':>8} {'errors':>6} {'req/s':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  per-type p95 ms")
+    if not args.serve:
+        _print_row('external', run_load(args.base_url, args.username, args.password,
+                                        args.concurrency, args.duration, mix))
+        return
+    for layout in args.serve.split(','):
+        workers, _, threads = layout.strip().partition('x')
+        with serve(int(workers), int(threads or 1)) as base_url:
+            result = run_load(base_url, args.username, args.password,
+                              args.concurrency, args.duration, mix)
+        _print_row(layout.strip(), result)
+
+
+if __name__ == '__main__':
+    main()
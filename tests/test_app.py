@@ -2,6 +2,7 @@ import hashlib
 import io
 import os
 import pytest
+from contextlib import contextmanager
 from datetime import date, timedelta
 from aura import create_app
 from aura.extensions import db as _db
@@ -17,6 +18,9 @@ def app():
         'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
         'WTF_CSRF_ENABLED': False,
         'SECRET_KEY': 'test-secret',
+        'PASSWORD_HASH_ITERATIONS': 1000,
+        'REHASH_IN_BACKGROUND': False,
+        'PDF_POOL_SIZE': 0,
     })
     with application.app_context():
         _db.create_all()
@@ -63,6 +67,20 @@ def contract(app, user):
         return c.id
 
 
+@contextmanager
+def capture_sql(engine=None):
+    """Collect the SQL of every statement run on ``engine`` (default: the app's) in the block."""
+    from sqlalchemy import event
+    engine = engine or _db.engine
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+
+
 def test_app_creates(app):
     assert app is not None
 
@@ -91,7 +109,7 @@ def test_admin_bootstrap_creates_user_with_salt(monkeypatch):
     monkeypatch.setenv('ADMIN_USERNAME', 'bootstrapadmin')
     monkeypatch.setenv('ADMIN_PASSWORD', 'bootstrappass')
     from aura import create_app
-    from aura.blueprints.auth import _hash_password, _PBKDF2_ITERATIONS
+    from aura.utils.passwords import DEFAULT_ITERATIONS, hash_password
     # 'testing' config uses in-memory SQLite; bootstrap runs inside create_app
     application = create_app('testing')
     with application.app_context():
@@ -99,8 +117,8 @@ def test_admin_bootstrap_creates_user_with_salt(monkeypatch):
         admin = U.query.filter_by(username='bootstrapadmin').first()
         assert admin is not None
         assert admin.salt is not None and len(admin.salt) > 0
-        assert admin.password_iterations == _PBKDF2_ITERATIONS
-        expected_hash = _hash_password('bootstrappass', admin.salt, admin.password_iterations)
+        assert admin.password_iterations == DEFAULT_ITERATIONS
+        expected_hash = hash_password('bootstrappass', admin.salt, admin.password_iterations)
         assert admin.password_hash == expected_hash
 
 
@@ -590,3 +608,1184 @@ def test_contract_detail_pdf_links(app, auth_client, user):
 
     # Penalty PDF link only for m2 (overdue+unpaid+penalty_enabled)
     assert 'mode=penalty' in html
+
+
+def test_snapshot_command_idempotent(app, user, contract):
+    """flask aura snapshot writes one row per user/currency and can be re-run."""
+    from aura.models import ReceivablesSnapshot
+    with app.app_context():
+        past = date.today() - timedelta(days=60)
+        m1 = Milestone(contract_id=contract, name='Paid', planned_delivery_date=past,
+                       payment_amount=1000.0, actual_delivery_date=past, invoice_eligible=True)
+        m2 = Milestone(contract_id=contract, name='Late', planned_delivery_date=past,
+                       payment_amount=400.0, actual_delivery_date=past, invoice_eligible=True)
+        _db.session.add_all([m1, m2])
+        _db.session.commit()
+        _db.session.add(Payment(milestone_id=m1.id, received_date=past, amount_received=1000.0))
+        _db.session.commit()
+
+    runner = app.test_cli_runner()
+    for _ in range(2):
+        result = runner.invoke(args=['aura', 'snapshot'])
+        assert result.exit_code == 0, result.output
+    with app.app_context():
+        rows = ReceivablesSnapshot.query.all()
+        assert len(rows) == 1
+        assert rows[0].currency == 'INR'
+        assert rows[0].received == 1000.0
+        assert rows[0].pending == 400.0
+        assert rows[0].overdue == 400.0
+
+
+def test_dashboard_trend_chart(app, auth_client, user):
+    """The dashboard draws a trend chart from stored snapshots."""
+    from aura.models import ReceivablesSnapshot
+    with app.app_context():
+        for offset, received in ((30, 100.0), (0, 250.0)):
+            _db.session.add(ReceivablesSnapshot(
+                user_id=user, snapshot_date=date.today() - timedelta(days=offset),
+                currency='USD', received=received, pending=50.0, overdue=0.0))
+        _db.session.commit()
+    response = auth_client.get('/dashboard')
+    assert response.status_code == 200
+    assert b'Receivables Trend' in response.data
+    assert b'trend-received' in response.data
+
+
+def test_threaded_server_under_concurrent_load(app, user, contract):
+    """Concurrent sessions against a threaded server complete without errors."""
+    import threading
+    from werkzeug.serving import make_server
+    from scripts.loadtest import run_load, parse_mix
+    app.config.update(LOGIN_IP_BURST=0, LOGIN_USERNAME_BURST=0)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        result = run_load(f'http://127.0.0.1:{server.server_port}', 'testuser', 'password',
+                          concurrency=4, duration=1.0,
+                          mix=parse_mix('login=1,dashboard=3,detail=2,pdf=1'))
+    finally:
+        server.shutdown()
+    assert result['requests'] > 0
+    assert result['errors'] == 0
+
+
+def test_loadtest_percentiles():
+    """The load-test summary reports nearest-rank percentiles."""
+    from scripts.loadtest import percentile, summarise
+    values = [i / 1000 for i in range(1, 101)]
+    assert percentile(values, 50) == 0.05
+    assert percentile(values, 99) == 0.099
+    result = summarise([('dashboard', v, True) for v in values], elapsed=2.0)
+    assert result['rps'] == 50.0
+    assert round(result['p95_ms']) == 95
+
+
+def test_read_replica_routing(monkeypatch, tmp_path, caplog):
+    """GETs read from DATABASE_READ_URL except inside the read-your-writes window."""
+    import json
+    import logging
+    import config
+    from aura import create_app
+    from aura.routing import replica_engine
+    monkeypatch.setattr(config.ProductionConfig, 'SQLALCHEMY_DATABASE_URI',
+                        f'sqlite:///{tmp_path / "primary.db"}')
+    monkeypatch.setattr(config.ProductionConfig, 'SQLALCHEMY_READ_DATABASE_URI',
+                        f'sqlite:///{tmp_path / "replica.db"}')
+    application = create_app('production')
+    application.config.update({'SECRET_KEY': 'test-secret', 'READ_YOUR_WRITES_SECONDS': 0})
+    with application.app_context():
+        replica = replica_engine()
+        _db.create_all()
+        _db.metadata.create_all(replica)
+        salt = 'testsalt'
+        password_hash = hashlib.sha256((salt + 'password').encode()).hexdigest()
+        for engine in (_db.engine, replica):
+            with engine.begin() as conn:
+                conn.execute(User.__table__.insert(),
+                             {'id': 1, 'username': 'testuser', 'password_hash': password_hash,
+                              'salt': salt, 'password_iterations': 1})
+        with replica.begin() as conn:
+            conn.execute(Contract.__table__.insert(),
+                         {'user_id': 1, 'client_name': 'Replica Co', 'contract_name': 'Replica Only',
+                          'start_date': date(2024, 1, 1), 'total_value': 1.0,
+                          'payment_term_days': 30, 'currency': 'INR'})
+
+    # Anonymous and failed writes open no read-your-writes window.
+    anonymous = application.test_client()
+    assert 'Set-Cookie' not in anonymous.post('/contracts/new').headers
+    anonymous.post('/login', data={'username': 'testuser', 'password': 'wrong'})
+    with anonymous.session_transaction() as sess:
+        assert '_ryw_until' not in sess
+
+    client = application.test_client()
+    client.post('/login', data={'username': 'testuser', 'password': 'password'})
+    application.config['SLOW_REQUEST_MS'] = 1
+    with caplog.at_level(logging.WARNING, logger='aura.diagnostics'):
+        assert b'Replica Only' in client.get('/contracts').data
+    # Replica queries count in the slow-request log too.
+    records = [json.loads(r.getMessage().split(' ', 2)[2]) for r in caplog.records
+               if r.getMessage().startswith('slow request')]
+    record = next(r for r in records if r['path'] == '/contracts')
+    assert record['sql_count'] >= 1 and record['slowest_sql']
+    application.config['SLOW_REQUEST_MS'] = 0
+
+    application.config['READ_YOUR_WRITES_SECONDS'] = 60
+    client.post('/contracts/new', data={
+        'client_name': 'Primary Co', 'contract_name': 'Primary Only', 'start_date': '2024-01-01',
+        'total_value': '5', 'payment_term_days': '30', 'currency': 'INR',
+    })
+    html = client.get('/contracts').data
+    assert b'Primary Only' in html
+    assert b'Replica Only' not in html
+
+
+def test_archive_hides_contract_from_hot_views(app, auth_client, contract):
+    """Archived contracts leave the list and dashboard and appear in the archive view."""
+    auth_client.post(f'/contracts/{contract}/archive')
+    assert b'Project Alpha' not in auth_client.get('/contracts').data
+    assert b'Project Alpha' not in auth_client.get('/dashboard').data
+    assert b'Project Alpha' in auth_client.get('/contracts/archive').data
+    auth_client.post(f'/contracts/{contract}/unarchive')
+    assert b'Project Alpha' in auth_client.get('/contracts').data
+
+
+def test_archive_refuses_contract_with_outstanding_milestones(app, auth_client, contract):
+    """Archiving must not hide unpaid milestones from the dashboard totals."""
+    with app.app_context():
+        _db.session.add(Milestone(contract_id=contract, name='Unpaid', payment_amount=500.0,
+                                  planned_delivery_date=date(2024, 2, 1)))
+        _db.session.commit()
+    resp = auth_client.post(f'/contracts/{contract}/archive', follow_redirects=True)
+    assert b'all paid can be archived' in resp.data
+    with app.app_context():
+        assert _db.session.get(Contract, contract).archived is False
+    assert b'Project Alpha' in auth_client.get('/dashboard').data
+
+
+def test_archive_contracts_command(app, user, contract):
+    """Only contracts fully paid longer ago than the threshold are auto-archived."""
+    with app.app_context():
+        old = date.today() - timedelta(days=400)
+        open_contract = Contract(user_id=user, client_name='Open', contract_name='Still Open',
+                                 start_date=old, total_value=10.0)
+        _db.session.add(open_contract)
+        _db.session.flush()
+        paid = Milestone(contract_id=contract, name='Paid', planned_delivery_date=old,
+                         payment_amount=10.0, actual_delivery_date=old, invoice_eligible=True)
+        unpaid = Milestone(contract_id=open_contract.id, name='Unpaid', planned_delivery_date=old,
+                           payment_amount=10.0)
+        _db.session.add_all([paid, unpaid])
+        _db.session.flush()
+        _db.session.add(Payment(milestone_id=paid.id, received_date=old, amount_received=10.0))
+        _db.session.commit()
+        open_id = open_contract.id
+
+    result = app.test_cli_runner().invoke(args=['aura', 'archive-contracts', '--older-than', '365'])
+    assert result.exit_code == 0, result.output
+    assert 'Archived 1 contract' in result.output
+    with app.app_context():
+        assert _db.session.get(Contract, contract).archived is True
+        assert _db.session.get(Contract, open_id).archived is False
+
+
+def test_fragment_cache_reuses_unchanged_rows(app, auth_client, contract):
+    """Detail rows are served from the fragment cache until the milestone changes."""
+    from aura.utils.fragments import fragment_cache
+    with app.app_context():
+        m = Milestone(contract_id=contract, name='Cached', planned_delivery_date=date(2024, 2, 1),
+                      payment_amount=700.0)
+        _db.session.add(m)
+        _db.session.commit()
+        mid = m.id
+    cache = fragment_cache(app)
+    cache.clear()
+    auth_client.get(f'/contracts/{contract}')
+    auth_client.get(f'/contracts/{contract}')
+    assert cache.misses == 1
+    assert cache.hits == 1
+
+    auth_client.post(f'/milestones/{mid}/deliver', data={'actual_delivery_date': '2024-02-10'})
+    html = auth_client.get(f'/contracts/{contract}').data
+    assert cache.misses == 2
+    assert b'2024-03-11' in html  # new due date rendered, not the stale row
+
+
+def test_static_urls_fingerprinted_and_immutable(app, client):
+    """Static URLs carry a content hash and are served with immutable caching."""
+    from flask import url_for
+    with app.test_request_context():
+        css_url = url_for('static', filename='css/style.css')
+    assert css_url.startswith('/static/css/style.') and css_url != '/static/css/style.css'
+    response = client.get(css_url)
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
+    assert response.mimetype == 'text/css'
+
+
+def test_compressed_static_variants_follow_the_content(app, client, tmp_path):
+    """A .gz compressed from an older version of a file is never served for the new one."""
+    import gzip
+    import shutil
+    from flask import url_for
+    from aura.assets import StaticManifest, _EXTENSION_KEY
+    folder = tmp_path / 'static'
+    shutil.copytree(app.static_folder, folder)
+    app.static_folder = str(folder)
+    app.extensions[_EXTENSION_KEY] = StaticManifest(app.static_folder)
+
+    def css():
+        with app.test_request_context():
+            url = url_for('static', filename='css/style.css')
+        return client.get(url, headers={'Accept-Encoding': 'gzip'})
+
+    result = app.test_cli_runner().invoke(args=['aura', 'compress-static'])
+    assert result.exit_code == 0, result.output
+    response = css()
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert b'--primary' in gzip.decompress(response.get_data())
+
+    # Edited (and redeployed) without re-running compress-static.
+    with open(folder / 'css' / 'style.css', 'a') as f:
+        f.write('\n.edited { color: red; }\n')
+    app.extensions[_EXTENSION_KEY] = StaticManifest(app.static_folder)
+    response = css()
+    assert 'Content-Encoding' not in response.headers
+    assert b'.edited' in response.get_data()
+
+    app.test_cli_runner().invoke(args=['aura', 'compress-static'])
+    assert b'.edited' in gzip.decompress(css().get_data())
+    assert len(list((folder / 'css').glob('style.*.css.gz'))) == 1
+
+
+def test_html_compressed_on_the_fly(auth_client):
+    """Large HTML responses are gzip-encoded when the client accepts it."""
+    import gzip
+    response = auth_client.get('/dashboard', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert b'Dashboard' in gzip.decompress(response.get_data())
+    plain = auth_client.get('/dashboard')
+    assert 'Content-Encoding' not in plain.headers
+
+
+def test_milestone_status_follows_transitions(app, auth_client, contract):
+    """Deliver and pay keep the persisted milestone status in step."""
+    auth_client.post(f'/contracts/{contract}/milestones/new', data={
+        'name': 'Tracked', 'planned_delivery_date': '2024-03-01', 'payment_amount': '100',
+    })
+    with app.app_context():
+        m = Milestone.query.filter_by(name='Tracked').first()
+        assert m.status == 'pending'
+        mid = m.id
+    auth_client.post(f'/milestones/{mid}/deliver', data={'actual_delivery_date': '2024-03-01'})
+    with app.app_context():
+        assert _db.session.get(Milestone, mid).status == 'invoice_eligible'
+    auth_client.post(f'/milestones/{mid}/pay', data={'received_date': '2024-03-20', 'amount_received': '100'})
+    with app.app_context():
+        assert _db.session.get(Milestone, mid).status == 'paid'
+    assert b'1 / 1' in auth_client.get('/contracts').data
+
+
+def test_check_status_command(app, contract):
+    """flask aura check-status reports drift and --fix repairs it."""
+    with app.app_context():
+        m = Milestone(contract_id=contract, name='Drifted', planned_delivery_date=date(2024, 2, 1),
+                      payment_amount=100.0, actual_delivery_date=date(2024, 2, 1), invoice_eligible=True)
+        _db.session.add(m)
+        _db.session.flush()
+        _db.session.add(Payment(milestone_id=m.id, received_date=date(2024, 2, 5), amount_received=100.0))
+        _db.session.commit()
+        mid = m.id
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['aura', 'check-status'])
+    assert result.exit_code != 0
+    assert f'Milestone {mid}' in result.output
+    result = runner.invoke(args=['aura', 'check-status', '--fix'])
+    assert 'Repaired 1' in result.output
+    with app.app_context():
+        assert _db.session.get(Milestone, mid).status == 'paid'
+    assert runner.invoke(args=['aura', 'check-status']).exit_code == 0
+
+
+def test_consolidated_dashboard_uses_fx_rates(app, auth_client, user, contract, tmp_path):
+    """Per-currency totals are converted into the base currency from loaded rates."""
+    csv_path = tmp_path / 'rates.csv'
+    csv_path.write_text('date,currency,base_currency,rate\n'
+                        '2024-01-01,USD,INR,80\n'
+                        '2024-06-01,INR,USD,0.0125\n')
+    result = app.test_cli_runner().invoke(args=['aura', 'load-fx-rates', str(csv_path)])
+    assert result.exit_code == 0, result.output
+    assert 'Loaded 2' in result.output
+    with app.app_context():
+        usd = Contract(user_id=user, client_name='US Co', contract_name='USD Work',
+                       start_date=date(2024, 1, 1), total_value=100.0, currency='USD')
+        _db.session.add(usd)
+        _db.session.flush()
+        for cid, amount in ((contract, 1000.0), (usd.id, 10.0)):
+            m = Milestone(contract_id=cid, name='Paid', planned_delivery_date=date(2024, 2, 1),
+                          payment_amount=amount, actual_delivery_date=date(2024, 2, 1),
+                          invoice_eligible=True)
+            _db.session.add(m)
+            _db.session.flush()
+            _db.session.add(Payment(milestone_id=m.id, received_date=date(2024, 2, 2),
+                                    amount_received=amount))
+        _db.session.commit()
+
+    html = auth_client.get('/dashboard').data.decode()
+    assert 'Consolidated in INR' in html
+    assert '₹1,800.00' in html
+    html = auth_client.get('/dashboard?base=USD').data.decode()
+    assert 'Consolidated in USD' in html
+    assert '$22.50' in html
+
+
+def test_change_feed_batches_mutations(app, client, auth_client, contract):
+    """Mutations append to the change log, served in cursor order by /api/changes."""
+    auth_client.post(f'/contracts/{contract}/milestones/new', data={
+        'name': 'Synced', 'planned_delivery_date': '2024-03-01', 'payment_amount': '100',
+    })
+    with app.app_context():
+        mid = Milestone.query.filter_by(name='Synced').first().id
+    auth_client.post(f'/milestones/{mid}/deliver', data={'actual_delivery_date': '2024-03-01'})
+    auth_client.post(f'/milestones/{mid}/pay', data={'received_date': '2024-03-05', 'amount_received': '100'})
+
+    first = auth_client.get('/api/changes?since=0&limit=2').get_json()
+    assert [c['action'] for c in first['changes']] == ['create', 'deliver']
+    assert first['has_more'] is True
+    rest = auth_client.get(f"/api/changes?since={first['next_cursor']}").get_json()
+    assert [c['action'] for c in rest['changes']] == ['pay']
+    assert rest['changes'][0]['data']['status'] == 'paid'
+    assert rest['has_more'] is False
+    idle = auth_client.get(f"/api/changes?since={rest['next_cursor']}").get_json()
+    assert idle['changes'] == [] and idle['next_cursor'] == rest['next_cursor']
+
+
+def test_change_feed_cursor_waits_for_commit_lag(app, auth_client, user):
+    """A cursor never passes an id whose transaction commits after a higher id's."""
+    import sqlalchemy as sa
+    from sqlalchemy.orm import Session
+    from aura.models import ChangeLog
+
+    def change(s, change_id):
+        s.add(ChangeLog(id=change_id, user_id=user, entity='contract', entity_id=change_id,
+                        action='create'))
+
+    app.config['CHANGE_FEED_LAG_SECONDS'] = 30
+    # Transaction A takes id 1, transaction B takes id 2 and commits first.
+    with Session(_db.engine) as a, Session(_db.engine) as b:
+        change(b, 2)
+        b.commit()
+        feed = auth_client.get('/api/changes?since=0').get_json()
+        assert feed['changes'] == [] and feed['next_cursor'] == 0
+        change(a, 1)
+        a.commit()
+    with app.app_context():
+        _db.session.execute(sa.update(ChangeLog).values(
+            created_at=sa.func.datetime('now', '-60 seconds')))
+        _db.session.commit()
+    feed = auth_client.get('/api/changes?since=0').get_json()
+    assert [c['cursor'] for c in feed['changes']] == [1, 2]
+
+    app.config['CHANGE_FEED_LAG_SECONDS'] = None  # SQLite default: no lag
+    assert auth_client.get('/api/changes?since=2').get_json()['next_cursor'] == 2
+
+
+def test_change_feed_requires_login(client):
+    response = client.get('/api/changes')
+    assert response.status_code == 401
+
+
+def test_dashboard_stream_pushes_payment_updates(app, auth_client, contract):
+    """Recording a payment pushes new totals to an open dashboard stream."""
+    import json as _json
+    with app.app_context():
+        m = Milestone(contract_id=contract, name='Live', planned_delivery_date=date(2024, 2, 1),
+                      payment_amount=1234.0, actual_delivery_date=date(2024, 2, 1),
+                      invoice_eligible=True)
+        _db.session.add(m)
+        _db.session.commit()
+        mid = m.id
+    app.config['SSE_HEARTBEAT_SECONDS'] = 0.05
+    response = auth_client.get('/dashboard/stream', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    chunks = iter(response.response)
+    assert next(chunks).startswith(b'retry:')
+
+    auth_client.post(f'/milestones/{mid}/pay', data={'received_date': '2024-02-10', 'amount_received': '1234'})
+    chunk = next(chunks)
+    while chunk.startswith(b':'):
+        chunk = next(chunks)
+    assert chunk.startswith(b'event: update')
+    payload = _json.loads(chunk.split(b'data: ', 1)[1])
+    assert payload['contract']['id'] == contract
+    assert payload['contract']['received'] == '₹1,234.00'
+    assert payload['totals'][0]['received'] == '₹1,234.00'
+    response.close()
+
+
+def test_dashboard_stream_capped_with_polling_fallback(app, auth_client, contract):
+    """Streams beyond the cap get 503; the page can poll /dashboard/totals instead."""
+    from aura.events import publisher
+    app.config.update(SSE_HEARTBEAT_SECONDS=0.05, SSE_MAX_STREAMS=2, SSE_MAX_STREAMS_PER_USER=1)
+    assert b'data-live-poll=' in auth_client.get('/dashboard').data
+    first = auth_client.get('/dashboard/stream', buffered=False)
+    next(iter(first.response))
+    second = auth_client.get('/dashboard/stream')
+    assert second.status_code == 503 and second.headers['Retry-After'] == '30'
+    first.close()
+    assert publisher(app).stream_count == 0
+
+    # Neither a HEAD nor a stream closed before its body is read keeps a slot.
+    assert auth_client.head('/dashboard/stream').status_code == 405
+    auth_client.get('/dashboard/stream', buffered=False).close()
+    assert publisher(app).stream_count == 0
+    unread = auth_client.get('/dashboard/stream', buffered=False)
+    assert unread.status_code == 200
+    unread.close()
+
+    app.config['SSE_MAX_STREAMS'] = 0
+    assert auth_client.get('/dashboard/stream').status_code == 503
+    polled = auth_client.get('/dashboard/totals').get_json()
+    assert polled['contracts'][0]['id'] == contract
+    assert {'totals', 'consolidated'} <= set(polled)
+
+
+def test_login_throttled_per_username(app, client, user):
+    """Repeated failures for one username are rejected before hashing."""
+    app.config.update(LOGIN_USERNAME_BURST=2, LOGIN_USERNAME_PER_MINUTE=0.01)
+    for _ in range(2):
+        response = client.post('/login', data={'username': 'testuser', 'password': 'wrong'})
+        assert response.status_code == 200
+    response = client.post('/login', data={'username': 'testuser', 'password': 'password'})
+    assert response.status_code == 429
+    assert b'Too many login attempts' in response.data
+    # Another username from the same client is unaffected.
+    response = client.post('/login', data={'username': 'someone', 'password': 'x'})
+    assert response.status_code == 200
+    client.post('/login', data={'username': 'testuser', 'password': 'password'})
+    with client.session_transaction() as sess:
+        assert 'user_id' not in sess
+    app.config.update(LOGIN_USERNAME_BURST=0)
+    client.post('/login', data={'username': 'testuser', 'password': 'password'})
+    metrics = client.get('/api/metrics').get_json()
+    assert metrics['login_throttle']['throttled_username'] == 2
+
+
+def test_sqlite_login_buckets_shared_between_processes(tmp_path):
+    """Two limiter backends on one SQLite file share their buckets."""
+    from aura.ratelimit import SQLiteBackend
+    path = str(tmp_path / 'ratelimit.db')
+    first, second = SQLiteBackend(path), SQLiteBackend(path)
+    assert first.consume('username:a', 2, 0.0, 100.0)
+    assert second.consume('username:a', 2, 0.0, 100.0)
+    assert not first.consume('username:a', 2, 0.0, 100.0)
+    assert second.consume('username:a', 2, 1.0, 101.0)
+
+
+def test_sqlite_login_buckets_pruned_once_refilled(tmp_path):
+    """Refilled buckets are deleted, and each thread reuses one connection."""
+    from aura.ratelimit import SQLiteBackend
+    backend = SQLiteBackend(str(tmp_path / 'ratelimit.db'))
+    for n in range(50):
+        assert backend.consume(f'username:random{n}', 5, 1.0, 100.0)
+    assert backend.bucket_count() == 50
+    conn = backend._connection()
+    # One second refills every bucket; the next attempt clears them out.
+    assert backend.consume('username:late', 5, 1.0, 101.0)
+    assert backend.bucket_count() == 1
+    assert backend._connection() is conn
+
+
+def test_login_upgrades_legacy_hash(app, client, user):
+    """A successful login re-hashes a legacy SHA-256 password at the configured cost."""
+    from aura.utils.passwords import hash_password
+    response = client.post('/login', data={'username': 'testuser', 'password': 'password'})
+    assert response.status_code == 302
+    with app.app_context():
+        u = _db.session.get(User, user)
+        assert u.password_iterations == 1000
+        assert u.password_hash == hash_password('password', u.salt, 1000)
+    client.post('/logout')
+    response = client.post('/login', data={'username': 'testuser', 'password': 'password'})
+    assert response.status_code == 302
+    hashing = client.get('/api/metrics').get_json()['password_hashing']
+    assert hashing['rehashed'] == 1
+    assert hashing['verified'] == 2
+
+
+def test_rehash_skips_concurrently_changed_password(app, user):
+    """The conditional UPDATE leaves a hash that changed since login alone."""
+    from aura.utils.passwords import password_hasher
+    with app.app_context():
+        u = _db.session.get(User, user)
+        stale_hash = u.password_hash
+        u.password_hash = 'changed-elsewhere'
+        _db.session.commit()
+        password_hasher()._rehash(user, stale_hash, 'password')
+        _db.session.expire_all()
+        assert _db.session.get(User, user).password_hash == 'changed-elsewhere'
+        assert password_hasher().snapshot()['rehash_skipped'] == 1
+
+
+def test_calibrate_hash_command(app):
+    """calibrate-hash recommends an iteration count for the target latency."""
+    result = app.test_cli_runner().invoke(args=['aura', 'calibrate-hash', '--target-ms', '5'])
+    assert result.exit_code == 0, result.output
+    assert 'Recommended for 5 ms: PASSWORD_HASH_ITERATIONS=' in result.output
+
+
+def test_migrate_upgrades_legacy_schema(tmp_path):
+    """Migrations add missing columns and indexes to an existing database."""
+    import sqlalchemy as sa
+    from aura.migrations import MIGRATIONS, applied_versions, run_migrations
+    engine = sa.create_engine(f'sqlite:///{tmp_path / "legacy.db"}')
+    with engine.begin() as conn:
+        for ddl in (
+            'CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE, '
+            'password_hash VARCHAR(128) NOT NULL, salt VARCHAR(32) NOT NULL, '
+            'password_iterations INTEGER NOT NULL)',
+            'CREATE TABLE contracts (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users (id), '
+            'client_name VARCHAR(200) NOT NULL, contract_name VARCHAR(200) NOT NULL, '
+            'start_date DATE NOT NULL, total_value FLOAT NOT NULL, payment_term_days INTEGER NOT NULL, '
+            'currency VARCHAR(3) NOT NULL, created_at DATETIME)',
+            'CREATE TABLE milestones (id INTEGER PRIMARY KEY, '
+            'contract_id INTEGER NOT NULL REFERENCES contracts (id), '
+            'name VARCHAR(200) NOT NULL, planned_delivery_date DATE NOT NULL, '
+            'payment_amount FLOAT NOT NULL, actual_delivery_date DATE, invoice_eligible BOOLEAN, '
+            'penalty_enabled BOOLEAN NOT NULL, penalty_rate_percent FLOAT NOT NULL, '
+            'penalty_unit VARCHAR(5) NOT NULL, created_at DATETIME)',
+            "INSERT INTO users VALUES (1, 'u', 'h', 's', 1)",
+            "INSERT INTO contracts VALUES (1, 1, 'C', 'K', '2024-01-01', 10, 30, 'INR', NULL)",
+            "INSERT INTO milestones VALUES (1, 1, 'M', '2024-02-01', 5, '2024-02-01', 1, 0, 0, 'day', NULL)",
+        ):
+            conn.execute(sa.text(ddl))
+
+    applied = run_migrations(engine)
+    assert [v for v, _ in applied] == [m[0] for m in MIGRATIONS]
+    inspector = sa.inspect(engine)
+    assert {'archived', 'archived_at'} <= {c['name'] for c in inspector.get_columns('contracts')}
+    assert 'ix_contracts_user_id_created_at' in {i['name'] for i in inspector.get_indexes('contracts')}
+    assert 'ix_milestones_contract_id_actual_delivery_date' in {
+        i['name'] for i in inspector.get_indexes('milestones')}
+    with engine.connect() as conn:
+        assert conn.scalar(sa.text('SELECT status FROM milestones WHERE id = 1')) == 'invoice_eligible'
+        assert conn.scalar(sa.text('SELECT archived FROM contracts WHERE id = 1')) == 0
+    fks = {fk['constrained_columns'][0]: fk['options'].get('ondelete')
+           for fk in inspector.get_foreign_keys('milestones')}
+    assert fks == {'contract_id': 'CASCADE', 'schedule_id': 'SET NULL'}
+    assert 'ix_milestones_contract_id_status' in {i['name'] for i in inspector.get_indexes('milestones')}
+    assert applied_versions(engine) == {m[0] for m in MIGRATIONS}
+    assert run_migrations(engine) == []
+
+
+def test_migrate_adds_missing_client_foreign_key(tmp_path):
+    """Upgrading from before clients existed ends with contracts.client_id ON DELETE SET NULL."""
+    import sqlalchemy as sa
+    from aura.migrations import run_migrations
+    engine = sa.create_engine(f'sqlite:///{tmp_path / "pre_clients.db"}')
+    with engine.begin() as conn:
+        for ddl in (
+            'CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE, '
+            'password_hash VARCHAR(128) NOT NULL, salt VARCHAR(32) NOT NULL, '
+            'password_iterations INTEGER NOT NULL)',
+            # user_id already cascades, so only the missing client_id key needs a rebuild.
+            'CREATE TABLE contracts (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, '
+            'client_name VARCHAR(200) NOT NULL, contract_name VARCHAR(200) NOT NULL, '
+            'start_date DATE NOT NULL, total_value FLOAT NOT NULL, payment_term_days INTEGER NOT NULL, '
+            'currency VARCHAR(3) NOT NULL, created_at DATETIME, '
+            'archived BOOLEAN NOT NULL DEFAULT 0, archived_at DATETIME, '
+            'FOREIGN KEY(user_id) REFERENCES users (id) ON DELETE CASCADE)',
+            "INSERT INTO users VALUES (1, 'u', 'h', 's', 1)",
+            "INSERT INTO contracts (id, user_id, client_name, contract_name, start_date, total_value, "
+            "payment_term_days, currency) VALUES (1, 1, 'Acme', 'K', '2024-01-01', 10, 30, 'INR')",
+        ):
+            conn.execute(sa.text(ddl))
+
+    run_migrations(engine)
+    fks = {fk['constrained_columns'][0]: fk['options'].get('ondelete')
+           for fk in sa.inspect(engine).get_foreign_keys('contracts')}
+    assert fks == {'user_id': 'CASCADE', 'client_id': 'SET NULL'}
+    with engine.begin() as conn:
+        conn.exec_driver_sql('PRAGMA foreign_keys=ON')
+        assert conn.scalar(sa.text('SELECT client_id FROM contracts WHERE id = 1')) is not None
+        conn.execute(sa.text('DELETE FROM clients'))
+        assert conn.scalar(sa.text('SELECT client_id FROM contracts WHERE id = 1')) is None
+    engine.dispose()
+
+
+def test_concurrent_migration_runs_apply_each_version_once(tmp_path):
+    """Workers migrating at startup at the same time wait for each other."""
+    import threading
+    import sqlalchemy as sa
+    from aura.migrations import MIGRATIONS, run_migrations, schema_migrations
+    engine = sa.create_engine(f'sqlite:///{tmp_path / "race.db"}',
+                              connect_args={'timeout': 30})
+    barrier = threading.Barrier(2)
+    results, errors = [], []
+
+    def worker():
+        barrier.wait()
+        try:
+            results.append(run_migrations(engine))
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=worker) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert sorted(len(done) for done in results) == [0, len(MIGRATIONS)]
+    with engine.connect() as conn:
+        assert conn.scalar(sa.select(sa.func.count()).select_from(schema_migrations)) == len(MIGRATIONS)
+    engine.dispose()
+
+
+def test_migrate_command_on_fresh_database(app):
+    """`flask aura migrate` brings an empty database to the current schema."""
+    import sqlalchemy as sa
+    from aura.migrations import schema_migrations
+    _db.drop_all()
+    schema_migrations.drop(_db.engine, checkfirst=True)
+    runner = app.test_cli_runner()
+    try:
+        result = runner.invoke(args=['aura', 'migrate'])
+        assert result.exit_code == 0, result.output
+        assert 'Applied 1: baseline' in result.output
+        assert 'ix_contracts_user_id_created_at' in {
+            i['name'] for i in sa.inspect(_db.engine).get_indexes('contracts')}
+        result = runner.invoke(args=['aura', 'migrate', '--status'])
+        assert 'pending' not in result.output
+    finally:
+        schema_migrations.drop(_db.engine, checkfirst=True)
+
+
+def test_client_statement_single_query(app, auth_client, user):
+    """A client statement loads all outstanding milestones in one query."""
+    from aura.models import MILESTONE_INVOICE_ELIGIBLE
+    with app.app_context():
+        for currency in ('INR', 'USD'):
+            c = Contract(user_id=user, client_name='Acme Corp', contract_name=f'Deal {currency}',
+                         start_date=date(2024, 1, 1), total_value=1.0, payment_term_days=30,
+                         currency=currency)
+            for i in range(100):
+                c.milestones.append(Milestone(
+                    name=f'M{i}', planned_delivery_date=date(2024, 2, 1), payment_amount=10.0,
+                    actual_delivery_date=date(2024, 2, 1), invoice_eligible=True,
+                    status=MILESTONE_INVOICE_ELIGIBLE, penalty_enabled=True,
+                    penalty_rate_percent=1.0, penalty_unit='month'))
+            _db.session.add(c)
+        _db.session.commit()
+        with capture_sql() as statements:
+            response = auth_client.get('/statements?client=Acme Corp')
+    assert response.status_code == 200
+    assert response.data[:4] == b'%PDF'
+    milestone_queries = [s for s in statements if 'FROM milestones' in s]
+    assert len(milestone_queries) == 1
+    assert auth_client.get('/statements?client=Nobody').status_code == 404
+
+
+def test_statement_totals_per_currency():
+    """Statement totals are summed per currency with penalties for overdue rows."""
+    from types import SimpleNamespace
+    from aura.blueprints.pdf_bp import statement_rows
+    inr = SimpleNamespace(currency='INR', contract_name='A', payment_term_days=30)
+    usd = SimpleNamespace(currency='USD', contract_name='B', payment_term_days=30)
+
+    def milestone(contract, delivered, amount, penalty=False):
+        return SimpleNamespace(
+            contract=contract, name='M', actual_delivery_date=delivered, payment_amount=amount,
+            penalty_enabled=penalty, penalty_rate_percent=1.0, penalty_unit='day',
+            due_date=delivered + timedelta(days=contract.payment_term_days))
+
+    today = date(2024, 3, 12)
+    rows, totals = statement_rows([
+        milestone(inr, date(2024, 2, 1), 1000.0, penalty=True),  # 10 days overdue
+        milestone(inr, date(2024, 3, 1), 500.0),
+        milestone(usd, date(2024, 1, 1), 200.0),
+    ], today)
+    assert [r['days_overdue'] for r in rows] == [10, 0, 41]
+    assert totals['INR'] == {'amount': 1500.0, 'penalty': 100.0, 'overdue': 1000.0}
+    assert totals['USD'] == {'amount': 200.0, 'penalty': 0.0, 'overdue': 200.0}
+
+
+def test_contract_form_reuses_matching_client(app, auth_client, user):
+    """Spelling variants of a client name resolve to one Client."""
+    from aura.models import Client
+    for name in ('Acme Corp', 'acme  corp.'):
+        auth_client.post('/contracts/new', data={
+            'client_name': name, 'contract_name': f'Deal {name}', 'start_date': '2024-01-01',
+            'total_value': '100', 'payment_term_days': '30', 'currency': 'INR'})
+    with app.app_context():
+        assert Client.query.count() == 1
+        client = Client.query.one()
+        assert [c.client_name for c in client.contracts] == ['Acme Corp', 'Acme Corp']
+
+
+def test_get_or_create_client_survives_insert_race(app, user, monkeypatch):
+    """Losing the insert race returns the other request's client; new ones await commit."""
+    from aura.clients import get_or_create_client
+    from aura.models import Client
+    with app.app_context():
+        existing = get_or_create_client(user, 'Acme Corp')
+        _db.session.commit()
+        # The lookup misses, as if the other insert committed just after it.
+        query_class = type(Client.query)
+        real_first = query_class.first
+        calls = []
+        monkeypatch.setattr(query_class, 'first',
+                            lambda q: real_first(q) if calls.append(q) or len(calls) > 1 else None)
+        assert get_or_create_client(user, 'acme corp').id == existing.id
+        # A new client is part of the caller's transaction, not committed on its own.
+        get_or_create_client(user, 'Globex')
+        _db.session.rollback()
+        _db.session.add(Contract(user_id=user, client_id=existing.id, client_name='Acme Corp',
+                                 contract_name='K', start_date=date(2024, 1, 1), total_value=1.0))
+        _db.session.commit()
+        assert Client.query.count() == 1
+
+
+def test_backfill_clients_deduplicates_names(app, user):
+    """The client backfill merges spellings and adopts the most common one."""
+    from aura.clients import backfill_clients
+    from aura.models import Client
+    with app.app_context():
+        for name in ('Acme Corp', 'ACME corp', 'Acme Corp', 'Globex'):
+            _db.session.add(Contract(user_id=user, client_name=name, contract_name='K',
+                                     start_date=date(2024, 1, 1), total_value=1.0))
+        _db.session.commit()
+        with _db.engine.begin() as conn:
+            assert backfill_clients(conn) == 4
+        _db.session.expire_all()
+        assert sorted(c.name for c in Client.query) == ['Acme Corp', 'Globex']
+        assert {c.client_name for c in Contract.query} == {'Acme Corp', 'Globex'}
+        assert Contract.query.filter(Contract.client_id.is_(None)).count() == 0
+
+
+def test_client_rollups(app, auth_client, user):
+    """Client rollups report exposure, overdue and average days to pay."""
+    from aura.clients import get_or_create_client
+    from aura.reporting import client_rollups_select
+    today = date.today()
+    with app.app_context():
+        client = get_or_create_client(user, 'Initech')
+        c = Contract(user_id=user, client=client, client_name=client.name, contract_name='K',
+                     start_date=date(2024, 1, 1), total_value=1.0, payment_term_days=30,
+                     currency='USD')
+        paid = Milestone(name='Paid', planned_delivery_date=today, payment_amount=100.0,
+                         actual_delivery_date=today - timedelta(days=50), invoice_eligible=True)
+        paid.payment = Payment(received_date=today - timedelta(days=40), amount_received=100.0)
+        late = Milestone(name='Late', planned_delivery_date=today, payment_amount=70.0,
+                         actual_delivery_date=today - timedelta(days=45), invoice_eligible=True)
+        fresh = Milestone(name='Fresh', planned_delivery_date=today, payment_amount=30.0,
+                          actual_delivery_date=today, invoice_eligible=True)
+        c.milestones.extend([paid, late, fresh])
+        _db.session.add(c)
+        _db.session.commit()
+        client_id = client.id
+        row = _db.session.execute(client_rollups_select(user, today)).one()
+    assert (row.client_id, row.currency, row.contracts) == (client_id, 'USD', 1)
+    assert (row.received, row.exposure, row.overdue) == (100.0, 100.0, 70.0)
+    assert row.avg_days_to_pay == 10
+    response = auth_client.get(f'/clients/{client_id}')
+    assert response.status_code == 200
+    assert b'Avg Days to Pay' in response.data
+    assert auth_client.get('/clients').status_code == 200
+    assert auth_client.get(f'/clients/{client_id}/statement').data[:4] == b'%PDF'
+
+
+def test_as_of_time_travel_views(app, auth_client, user, contract):
+    """?as_of= re-evaluates overdue and paid state and sticks to in-page links."""
+    with app.app_context():
+        m = Milestone(contract_id=contract, name='Phase 1', planned_delivery_date=date(2024, 1, 1),
+                      payment_amount=500.0, actual_delivery_date=date(2024, 1, 1),
+                      invoice_eligible=True)
+        m.payment = Payment(received_date=date(2024, 3, 15), amount_received=500.0)
+        _db.session.add(m)
+        _db.session.commit()
+        mid = m.id
+
+    # Due 2024-01-31, paid 2024-03-15.
+    before_due = auth_client.get(f'/contracts/{contract}?as_of=2024-01-20').data
+    assert b'Overdue' not in before_due and b'badge-success' not in before_due
+    month_end = auth_client.get(f'/contracts/{contract}?as_of=2024-02-29').data
+    assert b'Overdue (29d)' in month_end
+    assert f'/milestones/{mid}/pdf?mode=overdue&amp;as_of=2024-02-29'.encode() in month_end
+    assert b'Paid' in auth_client.get(f'/contracts/{contract}').data
+    # Before the delivery the row is pending, as on the dashboard; past views are read-only.
+    before_delivery = auth_client.get(f'/contracts/{contract}?as_of=2023-12-31').data
+    assert b'badge-secondary">Pending' in before_delivery
+    assert b'Invoice Eligible' not in before_delivery and b'2024-01-31' not in before_delivery
+    assert f'/milestones/{mid}/pdf'.encode() not in before_delivery
+    for action in ('deliver', 'pay', 'delete', 'edit'):
+        assert f'/milestones/{mid}/{action}'.encode() not in before_delivery
+    # A delivery already recorded is never overwritten.
+    auth_client.post(f'/milestones/{mid}/deliver', data={'actual_delivery_date': '2024-01-05'})
+    with app.app_context():
+        assert _db.session.get(Milestone, mid).actual_delivery_date == date(2024, 1, 1)
+
+    dashboard = auth_client.get('/dashboard?as_of=2024-02-29').data
+    assert f'/contracts/{contract}?as_of=2024-02-29'.encode() in dashboard
+    assert b'data-live-stream' not in dashboard
+    response = auth_client.get(f'/milestones/{mid}/pdf?mode=overdue&as_of=2024-02-29')
+    assert response.data[:4] == b'%PDF'
+    assert auth_client.get('/dashboard?as_of=yesterday').status_code == 400
+
+
+def test_penalty_uses_request_as_of(app, user, contract):
+    """Milestone date logic reads the request's as-of date, once."""
+    with app.app_context():
+        m = Milestone(contract_id=contract, name='P', planned_delivery_date=date(2024, 1, 1),
+                      payment_amount=100.0, actual_delivery_date=date(2024, 1, 1),
+                      invoice_eligible=True, penalty_enabled=True, penalty_rate_percent=1.0)
+        _db.session.add(m)
+        _db.session.commit()
+        with app.test_request_context('/?as_of=2024-02-10'):
+            assert m.overdue_days == 10
+            assert m.compute_penalty() == 10.0
+            assert m.compute_penalty(date(2024, 2, 5)) == 5.0
+
+
+def test_delete_contract_is_set_based(app, auth_client, user, contract):
+    """Deleting a contract removes milestones and payments without loading them."""
+    with app.app_context():
+        for i in range(20):
+            m = Milestone(contract_id=contract, name=f'M{i}', planned_delivery_date=date(2024, 1, 1),
+                          payment_amount=1.0, actual_delivery_date=date(2024, 1, 1),
+                          invoice_eligible=True)
+            m.payment = Payment(received_date=date(2024, 1, 2), amount_received=1.0)
+            _db.session.add(m)
+        _db.session.commit()
+        with capture_sql() as statements:
+            response = auth_client.post(f'/contracts/{contract}/delete')
+        assert response.status_code == 302
+        assert Milestone.query.count() == 0 and Payment.query.count() == 0
+        assert not any(s.startswith('SELECT') and 'FROM milestones' in s and 'DELETE' not in s
+                       for s in statements)
+        assert sum(s.startswith('DELETE') for s in statements) == 3
+
+
+def test_database_cascades_and_delete_user_command(app, user, contract):
+    """ON DELETE CASCADE is enforced on SQLite, and delete-user removes everything."""
+    from aura.models import ChangeLog
+    with app.app_context():
+        m = Milestone(contract_id=contract, name='M', planned_delivery_date=date(2024, 1, 1),
+                      payment_amount=1.0)
+        _db.session.add(m)
+        _db.session.add(ChangeLog(user_id=user, entity='contract', entity_id=contract,
+                                  action='create'))
+        _db.session.commit()
+        with _db.engine.begin() as conn:
+            conn.execute(Contract.__table__.delete())
+        assert Milestone.query.count() == 0
+
+        result = app.test_cli_runner().invoke(args=['aura', 'delete-user', 'testuser', '--yes'])
+        assert result.exit_code == 0, result.output
+        assert User.query.count() == 0
+        assert ChangeLog.query.count() == 0
+
+
+def test_schedule_preview_and_bulk_generation(app, auth_client, contract):
+    """Preview writes nothing; generating inserts every milestone in one statement."""
+    from aura.models import ChangeLog
+    form = {'name': 'Retainer', 'frequency': 'monthly', 'start_date': '2024-01-31',
+            'count': '12', 'amount': '1000', 'amount_mode': 'split',
+            'penalty_rate_percent': '1', 'penalty_unit': 'day', 'penalty_enabled': '1'}
+    with app.app_context():
+        response = auth_client.post(f'/contracts/{contract}/schedules/new',
+                                    data={**form, 'action': 'preview'})
+        assert response.status_code == 200
+        assert b'Preview (12 milestones)' in response.data and b'Retainer' in response.data
+        assert Milestone.query.count() == 0
+
+        with capture_sql() as statements:
+            response = auth_client.post(f'/contracts/{contract}/schedules/new',
+                                        data={**form, 'action': 'save'})
+        assert response.status_code == 302
+        assert sum(s.startswith('INSERT INTO milestones') for s in statements) == 1
+        milestones = Milestone.query.order_by(Milestone.planned_delivery_date).all()
+        assert len(milestones) == 12
+        assert milestones[1].planned_delivery_date == date(2024, 2, 29)
+        assert round(sum(m.payment_amount for m in milestones), 2) == 1000.0
+        assert all(m.status == 'pending' and m.penalty_enabled for m in milestones)
+        assert ChangeLog.query.filter_by(entity='milestone', action='create').count() == 12
+
+
+def test_schedule_edit_replaces_only_future_unpaid(app, auth_client, contract):
+    """Editing a schedule keeps delivered and past milestones and replaces the rest."""
+    from aura.models import MilestoneSchedule
+    from aura.schedules import generate_milestones, regenerate_milestones
+    with app.app_context():
+        start = date.today() - timedelta(days=14)
+        schedule = MilestoneSchedule(contract_id=contract, name='Sprint', frequency='weekly',
+                                     start_date=start, count=6, amount_mode='per_period',
+                                     amount=500.0)
+        _db.session.add(schedule)
+        _db.session.flush()
+        generate_milestones(schedule, user_id=1)
+        _db.session.commit()
+        future = Milestone.query.filter(Milestone.planned_delivery_date > date.today()) \
+            .order_by(Milestone.planned_delivery_date).all()
+        future[0].actual_delivery_date = date.today()
+        _db.session.commit()
+
+        schedule.count, schedule.amount = 8, 750.0
+        removed, added = regenerate_milestones(schedule, user_id=1)
+        _db.session.commit()
+        # Past: 2, delivered future: 1, replaced: 3 old future ones by 5 new.
+        assert (removed, added) == (3, 5)
+        amounts = sorted(m.payment_amount for m in Milestone.query.all())
+        assert amounts == [500.0] * 3 + [750.0] * 5
+        assert Milestone.query.count() == 8
+
+
+def test_clone_contract_is_set_based(app, auth_client, user, contract):
+    """Cloning copies milestones with one INSERT ... SELECT, shifting their dates."""
+    from aura.models import ChangeLog
+    with app.app_context():
+        for i in range(30):
+            m = Milestone(contract_id=contract, name=f'M{i}', payment_amount=10.0 + i,
+                          planned_delivery_date=date(2024, 1, 1) + timedelta(days=7 * i),
+                          actual_delivery_date=date(2024, 1, 2), invoice_eligible=True)
+            m.payment = Payment(received_date=date(2024, 1, 3), amount_received=1.0)
+            _db.session.add(m)
+        _db.session.commit()
+        with capture_sql() as statements:
+            response = auth_client.post(f'/contracts/{contract}/clone',
+                                        data={'start_date': '2023-12-01'})
+        assert response.status_code == 302
+        assert sum(s.startswith('INSERT INTO milestones') for s in statements) == 1
+        clone = Contract.query.filter(Contract.id != contract).one()
+        assert clone.contract_name == 'Project Alpha (copy)'
+        copies = Milestone.query.filter_by(contract_id=clone.id).order_by(Milestone.id).all()
+        assert len(copies) == 30
+        assert copies[0].planned_delivery_date == date(2023, 12, 1)
+        assert copies[29].planned_delivery_date == date(2023, 12, 1) + timedelta(days=7 * 29)
+        assert all(m.status == 'pending' and m.payment is None and not m.invoice_eligible
+                   and m.actual_delivery_date is None for m in copies)
+        assert ChangeLog.query.filter_by(contract_id=clone.id, action='create').count() == 31
+
+        result = app.test_cli_runner().invoke(args=['aura', 'clone-contract', str(contract),
+                                                    '--start-date', '2025-01-01', '--name', 'Beta'])
+        assert result.exit_code == 0, result.output
+        beta = Contract.query.filter_by(contract_name='Beta').one()
+        assert Milestone.query.filter_by(contract_id=beta.id).count() == 30
+
+
+def test_slow_request_log_records_sql(app, auth_client, user, contract, caplog):
+    """Requests over SLOW_REQUEST_MS are logged as JSON with their SQL profile."""
+    import json
+    import logging
+    app.config.update(SLOW_REQUEST_MS=1, SLOW_REQUEST_TOP_STATEMENTS=2)
+    with caplog.at_level(logging.WARNING, logger='aura.diagnostics'):
+        auth_client.get('/dashboard')
+    records = [json.loads(r.getMessage().split(' ', 2)[2]) for r in caplog.records
+               if r.getMessage().startswith('slow request')]
+    record = next(r for r in records if r['path'] == '/dashboard')
+    assert record['user_id'] == user and record['status'] == 200
+    assert record['sql_count'] >= 1 and 1 <= len(record['slowest_sql']) <= 2
+    assert record['slowest_sql'][0]['ms'] >= record['slowest_sql'][-1]['ms']
+    assert auth_client.get('/api/metrics').get_json()['diagnostics']['slow_requests'] >= 1
+
+
+def test_profile_header_writes_pstats(app, auth_client, contract, tmp_path, monkeypatch):
+    """A request carrying the profile token is profiled into instance/profiles."""
+    import pstats
+    monkeypatch.setattr(app, 'instance_path', str(tmp_path))
+    app.config['PROFILE_TOKEN'] = 'let-me-profile'
+    auth_client.get('/contracts', headers={'X-Aura-Profile': 'wrong'})
+    assert not (tmp_path / 'profiles').exists()
+    auth_client.get('/contracts', headers={'X-Aura-Profile': 'let-me-profile'})
+    written = sorted(p.name for p in (tmp_path / 'profiles').iterdir())
+    assert [p.rsplit('.', 1)[1] for p in written] == ['pstats', 'txt']
+    assert 'contracts.list_contracts' in written[0]
+    assert pstats.Stats(str(tmp_path / 'profiles' / written[0])).total_calls > 0
+    assert 'tracemalloc_peak_kib=' in (tmp_path / 'profiles' / written[1]).read_text()
+
+
+def test_sqlite_connections_tuned_and_optimize_command(app):
+    """Every SQLite connection gets the production pragmas; optimize runs cleanly."""
+    from sqlalchemy import text
+    with app.app_context():
+        if 'DATABASE_URL' not in os.environ:
+            assert _db.engine.url.database == os.path.join(app.instance_path, 'aura.db')
+        with _db.engine.connect() as conn:
+            pragma = lambda name: conn.execute(text(f'PRAGMA {name}')).scalar()
+            assert pragma('journal_mode') == 'wal'
+            assert pragma('synchronous') == 1  # NORMAL
+            assert pragma('busy_timeout') == 5000
+            assert pragma('foreign_keys') == 1
+            assert pragma('cache_size') == -65536
+        result = app.test_cli_runner().invoke(args=['aura', 'optimize'])
+        assert result.exit_code == 0, result.output
+        assert 'journal_mode=wal' in result.output and 'Free pages' in result.output
+
+
+def test_new_sqlite_database_uses_incremental_auto_vacuum(app, tmp_path):
+    """auto_vacuum is applied before WAL initialises a new file, so it sticks."""
+    import sqlite3
+    import sqlalchemy as sa
+    from aura.utils.sql import configure_sqlite
+    path = tmp_path / 'fresh.db'
+    engine = sa.create_engine(f'sqlite:///{path}')
+    configure_sqlite(engine, app.config['SQLITE_PRAGMAS'])
+    with engine.begin() as conn:
+        conn.exec_driver_sql('CREATE TABLE t (id INTEGER PRIMARY KEY)')
+    engine.dispose()
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2  # incremental
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    finally:
+        conn.close()
+
+
+def test_sqlite_online_backup_and_restore(app, user, contract, tmp_path):
+    """backup copies the live file in batches; restore brings the data back."""
+    with app.app_context():
+        _db.session.add(Milestone(contract_id=contract, name='Kept', payment_amount=5.0,
+                                  planned_delivery_date=date(2024, 2, 1)))
+        _db.session.commit()
+        dest = str(tmp_path / 'aura.db')
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=['aura', 'backup', dest, '--pages', '2', '--sleep-ms', '0'])
+        assert result.exit_code == 0, result.output
+        assert 'MB/s' in result.output and 'longest lock' in result.output
+        assert (tmp_path / 'aura.db.sha256').exists()
+
+        _db.session.execute(Contract.__table__.delete())
+        _db.session.commit()
+        assert Milestone.query.count() == 0
+        result = runner.invoke(args=['aura', 'restore', dest, '--yes'])
+        assert result.exit_code == 0, result.output
+        assert Milestone.query.one().name == 'Kept'
+
+        with open(dest, 'r+b') as f:
+            f.seek(200)
+            f.write(b'corrupt')
+        result = runner.invoke(args=['aura', 'restore', dest, '--verify-only'])
+        assert result.exit_code != 0 and 'does not match' in result.output
+
+
+def test_ndjson_backup_round_trip_and_checksum(app, user, contract, tmp_path):
+    """The portable format restores every row and rejects a tampered file."""
+    import gzip
+    from aura.backup import BackupError, backup_ndjson, restore_ndjson
+    with app.app_context():
+        m = Milestone(contract_id=contract, name='M', payment_amount=5.0,
+                      planned_delivery_date=date(2024, 2, 1), actual_delivery_date=date(2024, 2, 3))
+        m.payment = Payment(received_date=date(2024, 3, 1), amount_received=5.0)
+        _db.session.add(m)
+        _db.session.commit()
+        dest = str(tmp_path / 'aura.ndjson.gz')
+        stats = backup_ndjson(_db.engine, dest)
+        assert stats['tables']['milestones'] == 1 and stats['tables']['users'] == 1
+
+        _db.session.execute(Contract.__table__.delete())
+        _db.session.commit()
+        _db.session.remove()
+        restored = restore_ndjson(_db.engine, dest)
+        assert restored['rows'] == stats['rows']
+        milestone = Milestone.query.one()
+        assert milestone.actual_delivery_date == date(2024, 2, 3)
+        assert milestone.payment.received_date == date(2024, 3, 1)
+
+        lines = gzip.open(dest, 'rt').read().replace('"M"', '"X"')
+        tampered = str(tmp_path / 'tampered.ndjson.gz')
+        with gzip.open(tampered, 'wt') as f:
+            f.write(lines)
+        with pytest.raises(BackupError, match='checksum'):
+            restore_ndjson(_db.engine, tampered)
+        assert Milestone.query.one().name == 'M'
+
+
+def test_async_database_url_maps_drivers():
+    """ASGI mode swaps in the async driver and asyncpg's spelling of sslmode."""
+    pytest.importorskip('starlette')
+    pytest.importorskip('a2wsgi')
+    from aura.asgi import async_database_url
+    url, connect_args = async_database_url('sqlite:////tmp/aura.db')
+    assert url.drivername == 'sqlite+aiosqlite' and connect_args == {}
+    url, connect_args = async_database_url(
+        'postgresql://postgres.ref:pw@aws-0-x.pooler.supabase.com:6543/postgres?sslmode=require')
+    assert url.drivername == 'postgresql+asyncpg'
+    assert dict(url.query) == {'ssl': 'require'}
+    assert connect_args['statement_cache_size'] == 0
+    with pytest.raises(ValueError):
+        async_database_url('mysql://u:p@h/db')
+
+
+def test_asgi_serves_async_views_and_flask_fallback(app, user, contract):
+    """Async handlers share Flask's session, hooks and templates; other routes fall through."""
+    pytest.importorskip('aiosqlite')
+    pytest.importorskip('a2wsgi')
+    pytest.importorskip('httpx')
+    from starlette.testclient import TestClient
+    from aura.asgi import create_asgi_app
+    app.config.update(SLOW_REQUEST_MS=0)
+    with app.app_context():
+        m = Milestone(contract_id=contract, name='Design', payment_amount=500.0,
+                      planned_delivery_date=date(2024, 2, 1), actual_delivery_date=date(2024, 2, 1),
+                      invoice_eligible=True, status='invoice_eligible')
+        _db.session.add(m)
+        _db.session.commit()
+    with TestClient(create_asgi_app(app)) as http:
+        assert http.get('/api/health').json() == {'status': 'ok', 'database': True}
+        assert http.get('/dashboard', follow_redirects=False).headers['location'].endswith('/login')
+        assert http.get('/api/changes').status_code == 401
+        # Login is a Flask (WSGI) route; its cookie authenticates the async views.
+        http.post('/login', data={'username': 'testuser', 'password': 'password'})
+        page = http.get('/dashboard')
+        assert page.status_code == 200 and 'Project Alpha' in page.text
+        assert 'Project Alpha' in http.get('/contracts').text
+        assert http.get('/clients').status_code == 200
+        assert http.get('/api/changes?since=x').status_code == 400
+        assert http.get('/dashboard?as_of=bad').status_code == 400
+        pdf = http.get(f'/contracts/{contract}/statement')
+        assert pdf.headers['content-type'] == 'application/pdf' and pdf.content.startswith(b'%PDF')
+        assert http.get('/contracts/9999/statement').status_code == 404
+        assert 'Project Alpha' in http.get(f'/contracts/{contract}').text
+
+
+def test_pdf_pool_timeout_crash_and_error_isolation(app, auth_client, contract, monkeypatch):
+    """Pool workers render PDFs; a hung or crashed worker is replaced, errors are not fatal."""
+    import time
+    from aura.pdf_pool import PdfPoolUnavailable, PdfRenderError, pdf_pool
+    from aura.pdf_render import render_statement
+    pool = pdf_pool(app)
+    app.config.update(PDF_POOL_SIZE=1, PDF_RENDER_TIMEOUT_SECONDS=60)
+    try:
+        pool.start()
+        assert pool.render(render_statement, 'Acme', 'All contracts', [], {},
+                           date(2024, 1, 1)).startswith(b'%PDF')
+        with pytest.raises(PdfRenderError, match='ValueError'):
+            pool.render(int, 'not a number')
+        assert pool.snapshot()['restarts'] == 0
+
+        app.config['PDF_RENDER_TIMEOUT_SECONDS'] = 0.5
+        with pytest.raises(PdfPoolUnavailable, match='timed out'):
+            pool.render(time.sleep, 30)
+        app.config['PDF_RENDER_TIMEOUT_SECONDS'] = 60
+        with pytest.raises(PdfPoolUnavailable, match='exited'):
+            pool.render(os._exit, 3)
+        assert pool.render(render_statement, 'Acme', 'All contracts', [], {},
+                           date(2024, 1, 1)).startswith(b'%PDF')
+        stats = auth_client.get('/api/metrics').get_json()['pdf_pool']
+        assert stats['started'] and stats['size'] == 1 and stats['idle'] == 1
+        assert (stats['jobs'], stats['errors'], stats['timeouts'], stats['crashes'],
+                stats['restarts'], stats['queue_depth']) == (5, 1, 1, 1, 2, 0)
+    finally:
+        pool.close()
+
+    def unavailable(fn, *args):
+        raise PdfPoolUnavailable('PDF render timed out')
+    monkeypatch.setattr(pool, 'render', unavailable)
+    with app.app_context():
+        m = Milestone(contract_id=contract, name='M', payment_amount=5.0,
+                      planned_delivery_date=date(2024, 2, 1))
+        _db.session.add(m)
+        _db.session.commit()
+        mid = m.id
+    assert auth_client.get(f'/milestones/{mid}/pdf').status_code == 503
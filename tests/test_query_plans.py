@@ -0,0 +1,184 @@
+"""Index-usage regression tests for the hot queries.
+
+Each test seeds a realistic dataset, asks the database how it would run a
+statement the app issues (``EXPLAIN QUERY PLAN`` on SQLite, ``EXPLAIN`` on
+PostgreSQL) and fails if a hot table is scanned or not reached through one
+of its intended indexes.
+
+PostgreSQL runs only when ``AURA_TEST_POSTGRES_URL`` points at a scratch
+database; its tables are created and dropped by the test.  Sequential scans
+are disabled there, because on a small dataset they are cheaper and the
+planner would rightly pick them.
+"""
+import os
+import re
+from datetime import date, timedelta
+import pytest
+import sqlalchemy as sa
+from aura import create_app
+from aura.extensions import db
+from aura.models import Client, Contract, Milestone, Payment, User
+from aura.reporting import client_rollups_select, contract_breakdown_select
+
+USERS, CONTRACTS_PER_USER, MILESTONES_PER_CONTRACT = 20, 50, 10
+AS_OF = date(2024, 6, 1)
+POSTGRES_URL = os.environ.get('AURA_TEST_POSTGRES_URL')
+
+# Any index whose leading column is the filtered one is acceptable; 'pk' is
+# the primary key.  Unique constraints get backend-specific names.
+CONTRACTS_BY_USER = {'ix_contracts_user_id', 'ix_contracts_user_id_created_at',
+                     'ix_contracts_user_id_archived_created_at'}
+MILESTONES_BY_CONTRACT = {'ix_milestones_contract_id', 'ix_milestones_contract_id_status',
+                          'ix_milestones_contract_id_actual_delivery_date'}
+PAYMENTS_BY_MILESTONE = {'sqlite_autoindex_payments_1', 'payments_milestone_id_key'}
+
+
+def _hot_queries():
+    """(id, statement builder, {table: allowed indexes}) for every hot query."""
+    from aura.blueprints.pdf_bp import outstanding_milestones_select
+    return [
+        ('dashboard_breakdown',
+         lambda: contract_breakdown_select(7, AS_OF, {'INR': 1.0}),
+         {'contracts': CONTRACTS_BY_USER, 'milestones': MILESTONES_BY_CONTRACT,
+          'payments': PAYMENTS_BY_MILESTONE}),
+        ('client_rollups',
+         lambda: client_rollups_select(7, AS_OF),
+         {'contracts': CONTRACTS_BY_USER, 'milestones': MILESTONES_BY_CONTRACT,
+          'payments': PAYMENTS_BY_MILESTONE, 'clients': {'pk'}}),
+        ('contract_list',
+         lambda: Contract.query.filter_by(user_id=7, archived=False)
+         .order_by(Contract.created_at.desc()).statement,
+         {'contracts': CONTRACTS_BY_USER}),
+        ('contract_ownership',
+         lambda: Contract.query.filter_by(id=123, user_id=7).statement,
+         {'contracts': {'pk'} | CONTRACTS_BY_USER}),
+        ('milestone_ownership_join',
+         lambda: Milestone.query.join(Contract)
+         .filter(Milestone.id == 1234, Contract.user_id == 7).statement,
+         {'milestones': {'pk'}, 'contracts': {'pk'} | CONTRACTS_BY_USER}),
+        ('statement_milestones',
+         lambda: outstanding_milestones_select(7, AS_OF, contract_id=127),
+         {'contracts': {'pk'} | CONTRACTS_BY_USER, 'milestones': MILESTONES_BY_CONTRACT,
+          'payments': PAYMENTS_BY_MILESTONE}),
+        ('login_by_username',
+         lambda: User.query.filter_by(username='user7').statement,
+         {'users': {'ix_users_username', 'users_username_key'}}),
+    ]
+
+
+def _seed(engine):
+    day = timedelta(days=1)
+    contracts, milestones, payments = [], [], []
+    for contract_id in range(1, USERS * CONTRACTS_PER_USER + 1):
+        user_id = contract_id % USERS + 1
+        contracts.append({
+            'id': contract_id, 'user_id': user_id, 'client_id': user_id,
+            'client_name': f'Client {user_id}', 'contract_name': f'Contract {contract_id}',
+            'start_date': date(2024, 1, 1), 'total_value': 10000.0, 'payment_term_days': 30,
+            'currency': 'INR', 'archived': contract_id % 10 == 0,
+        })
+        for i in range(MILESTONES_PER_CONTRACT):
+            milestone_id = (contract_id - 1) * MILESTONES_PER_CONTRACT + i + 1
+            planned = date(2024, 1, 1) + 30 * i * day
+            delivered, paid = i < 6, i < 4
+            milestones.append({
+                'id': milestone_id, 'contract_id': contract_id, 'name': f'M{i}',
+                'planned_delivery_date': planned, 'payment_amount': 1000.0,
+                'actual_delivery_date': planned if delivered else None,
+                'invoice_eligible': delivered, 'penalty_enabled': False,
+                'penalty_rate_percent': 0.0, 'penalty_unit': 'day',
+                'status': 'paid' if paid else 'invoice_eligible' if delivered else 'pending',
+            })
+            if paid:
+                payments.append({'milestone_id': milestone_id, 'received_date': planned + 10 * day,
+                                 'amount_received': 1000.0})
+    with engine.begin() as conn:
+        conn.execute(sa.insert(User), [
+            {'id': u, 'username': f'user{u}', 'password_hash': 'x', 'salt': 's'}
+            for u in range(1, USERS + 1)])
+        conn.execute(sa.insert(Client), [
+            {'id': u, 'user_id': u, 'name': f'Client {u}', 'name_key': f'client {u}'}
+            for u in range(1, USERS + 1)])
+        conn.execute(sa.insert(Contract), contracts)
+        conn.execute(sa.insert(Milestone), milestones)
+        conn.execute(sa.insert(Payment), payments)
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.exec_driver_sql('ANALYZE')
+
+
+@pytest.fixture(scope='module')
+def app():
+    application = create_app('testing')
+    with application.app_context():
+        yield application
+
+
+@pytest.fixture(scope='module', params=['sqlite', 'postgresql'])
+def engine(request, tmp_path_factory):
+    if request.param == 'sqlite':
+        engine = sa.create_engine(f'sqlite:///{tmp_path_factory.mktemp("plans") / "plans.db"}')
+    elif not POSTGRES_URL:
+        pytest.skip('AURA_TEST_POSTGRES_URL not set')
+    else:
+        engine = sa.create_engine(POSTGRES_URL)
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+    _seed(engine)
+    yield engine
+    db.metadata.drop_all(engine)
+    engine.dispose()
+
+
+def _sql(engine, stmt):
+    return str(stmt.compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True}))
+
+
+def _sqlite_access(engine, stmt):
+    """Return [(table, index or 'pk' or None)]; None means a full scan."""
+    with engine.connect() as conn:
+        plan = [row[3] for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + _sql(engine, stmt))]
+    access = []
+    for detail in plan:
+        match = re.match(r'(SCAN|SEARCH) (\w+)(?: USING (?:COVERING )?INDEX (\w+)'
+                         r'| USING INTEGER PRIMARY KEY)?', detail)
+        if match:
+            kind, table, index = match.groups()
+            access.append((table, None if kind == 'SCAN' else index or 'pk'))
+    return access, plan
+
+
+def _index_tables(engine):
+    """{index or constraint name: (table, index name or 'pk')} from the live schema."""
+    inspector = sa.inspect(engine)
+    names = {}
+    for table in inspector.get_table_names():
+        names[inspector.get_pk_constraint(table)['name']] = (table, 'pk')
+        for item in inspector.get_indexes(table) + inspector.get_unique_constraints(table):
+            names[item['name']] = (table, item['name'])
+    return names
+
+
+def _postgres_access(engine, stmt):
+    with engine.connect() as conn:
+        conn.exec_driver_sql('SET enable_seqscan = off')
+        plan = [row[0] for row in conn.exec_driver_sql('EXPLAIN ' + _sql(engine, stmt))]
+    text = '\n'.join(plan)
+    indexes = _index_tables(engine)
+    access = [(table, None) for table in re.findall(r'Seq Scan on (\w+)', text)]
+    used = re.findall(r'Index (?:Only )?Scan (?:Backward )?using (\w+)', text)
+    used += re.findall(r'Bitmap Index Scan on (\w+)', text)
+    access += [indexes[index] for index in used]
+    return access, plan
+
+
+@pytest.mark.parametrize('name', [q[0] for q in _hot_queries()])
+def test_hot_query_uses_intended_indexes(app, engine, name):
+    _, build, expected = next(q for q in _hot_queries() if q[0] == name)
+    explain = _sqlite_access if engine.dialect.name == 'sqlite' else _postgres_access
+    access, plan = explain(engine, build())
+    plan_text = '\n'.join(plan)
+    for table, allowed in expected.items():
+        used = {index for t, index in access if t == table}
+        assert used, f'{name}: {table} not in plan:\n{plan_text}'
+        assert None not in used, f'{name}: full scan of {table}:\n{plan_text}'
+        assert used <= allowed, f'{name}: {table} via {used - allowed}, expected one of {allowed}:\n{plan_text}'